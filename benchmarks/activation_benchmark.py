@@ -0,0 +1,60 @@
+'''全結合層と活性化関数を別々のノードで計算する場合と、1つのノード（F.linear(..., activation=...)）で計算する場合を比較する
+
+学習（順伝播と逆伝播）の時間と計算グラフのノード数、推論時のinplace=Trueの効果を表示する
+
+python benchmarks/activation_benchmark.py [バッチサイズ] [隠れ層の大きさ] [層の数]
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import graph
+from dezero import no_grad
+import dezero.functions as F
+
+def separate(x, params, name, inplace=False):
+    for W, b in params:
+        x = getattr(F, name)(F.linear(x, W, b), inplace=inplace)
+    return F.sum(x)
+
+def fused(x, params, name):
+    for W, b in params:
+        x = F.linear(x, W, b, activation=name)
+    return F.sum(x)
+
+def bench(stmt, number=10):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+if __name__ == '__main__':
+    batch = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    hidden = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+    np.random.seed(0)
+    x = np.random.randn(batch, hidden).astype(np.float32)
+    params = [(Variable((np.random.randn(hidden, hidden) / np.sqrt(hidden)).astype(np.float32)),
+               Variable(np.zeros(hidden, dtype=np.float32))) for _ in range(depth)]
+
+    def train(f, name):
+        def step():
+            for W, b in params:
+                W.cleargradient()
+                b.cleargradient()
+            f(Variable(x), params, name).backward()
+        return step
+
+    print('batch {}, hidden {}, {} layers'.format(batch, hidden, depth))
+    print('{:<10} {:>10} {:>10} {:>12} {:>12} {:>14}'.format(
+        'activation', 'nodes', 'fused', 'train ms', 'fused ms', 'no_grad ms (copy / inplace)'))
+    for name in ('relu', 'sigmoid', 'gelu', 'softplus'):
+        n_separate = len(graph.trace(lambda v: separate(v, params, name), x))
+        n_fused = len(graph.trace(lambda v: fused(v, params, name), x))
+        t_separate = bench(train(separate, name))
+        t_fused = bench(train(fused, name))
+        with no_grad():
+            t_copy = bench(lambda: separate(Variable(x), params, name))
+            t_inplace = bench(lambda: separate(Variable(x), params, name, inplace=True))
+        print('{:<10} {:>10} {:>10} {:>12.3f} {:>12.3f} {:>6.3f} / {:.3f}'.format(
+            name, n_separate, n_fused, t_separate, t_fused, t_copy, t_inplace))
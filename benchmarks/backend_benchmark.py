@@ -0,0 +1,44 @@
+'''ThreadedBackendのスレッド数による要素ごとの演算の速度を計測する
+
+python benchmarks/backend_benchmark.py [要素数]
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import backend
+from dezero.backend import ThreadedBackend
+import dezero.functions as F
+
+def bench(stmt, number=5):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+def step(x):
+    y = F.tanh(F.sin(x) * x + x ** 2)
+    y.backward()
+    x.cleargradient()
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 23
+    np.random.seed(0)
+    a = np.random.rand(n).astype(np.float32)
+    b = np.random.rand(n).astype(np.float32)
+    x = Variable(a)
+
+    cpu = os.cpu_count() or 1
+    workers = sorted({1, 2, 4, 8, cpu} & set(range(1, cpu + 1))) or [1]
+    print('{} elements, {} cores'.format(n, cpu))
+    print('{:<12} {:>10} {:>10} {:>10} {:>16}'.format('backend', 'add ms', 'mul ms', 'tanh ms', 'graph fwd+bwd ms'))
+    print('{:<12} {:>10.2f} {:>10.2f} {:>10.2f} {:>16.2f}'.format(
+        'numpy', bench(lambda: np.add(a, b)), bench(lambda: np.multiply(a, b)),
+        bench(lambda: np.tanh(a)), bench(lambda: step(x))))
+    for w in workers:
+        xp = ThreadedBackend(num_workers=w, threshold=0)
+        with backend.using_backend(xp):
+            print('{:<12} {:>10.2f} {:>10.2f} {:>10.2f} {:>16.2f}'.format(
+                'threads={}'.format(w), bench(lambda: xp.add(a, b)), bench(lambda: xp.multiply(a, b)),
+                bench(lambda: xp.tanh(a)), bench(lambda: step(x))))
+        xp.shutdown()
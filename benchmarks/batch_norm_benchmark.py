@@ -0,0 +1,49 @@
+'''バッチ正規化を1つの関数（F.batch_norm）で計算する場合と、基本的な関数の組み合わせで書く場合を比較する
+
+計算グラフのノード数と、順伝播と逆伝播の1回あたりの時間を表示する
+
+python benchmarks/batch_norm_benchmark.py [バッチサイズ] [チャネル数] [画像の高さと幅]
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import graph
+import dezero.functions as F
+
+def composed(x, gamma, beta, eps=2e-5):
+    axes = (0,) + tuple(range(2, x.ndim))
+    shape = (1, -1) + (1,) * (x.ndim - 2)
+    mean = F.mean(x, axis=axes, keepdims=True)
+    xc = x - mean
+    var = F.mean(xc ** 2, axis=axes, keepdims=True)
+    return F.reshape(gamma, shape) * (xc / (var + eps) ** 0.5) + F.reshape(beta, shape)
+
+def fused(x, gamma, beta):
+    C = x.shape[1]
+    return F.batch_norm(x, gamma, beta, np.zeros(C), np.ones(C))
+
+def step(f, x, gamma, beta):
+    vs = [Variable(a) for a in (x, gamma, beta)]
+    y = f(*vs)
+    y.backward()
+    return vs[0].gradient.data
+
+if __name__ == '__main__':
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    C = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    H = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    np.random.seed(0)
+    x = np.random.randn(N, C, H, H).astype(np.float32)
+    gamma, beta = np.random.rand(C).astype(np.float32), np.random.rand(C).astype(np.float32)
+    assert np.allclose(step(composed, x, gamma, beta), step(fused, x, gamma, beta), atol=1e-4)
+
+    print('input {}'.format(x.shape))
+    print('{:<10} {:>8} {:>12}'.format('mode', 'nodes', 'ms / step'))
+    for label, f in (('composed', composed), ('fused', fused)):
+        nodes = len(graph.trace(f, x, gamma, beta))
+        t = min(timeit.repeat(lambda: step(f, x, gamma, beta), number=10, repeat=3)) / 10 * 1e3
+        print('{:<10} {:>8} {:>12.3f}'.format(label, nodes, t))
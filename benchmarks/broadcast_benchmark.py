@@ -0,0 +1,86 @@
+'''バイアス加算を多用する計算で、ブロードキャストの計画を使うsum_toと元の実装を比較する
+
+python benchmarks/broadcast_benchmark.py
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import Function
+from dezero import utils
+from dezero.core import BinaryFunction
+from dezero.functions import broadcast_to
+
+def sum_to_original(x, shape):
+    '毎回lead_axisとaxisを作り直す元の実装'
+    ndim = len(shape)
+    lead = x.ndim - ndim
+    lead_axis = tuple(range(lead))
+    axis = tuple([i + lead for i, sx in enumerate(shape) if sx == 1])
+    y = x.sum(lead_axis + axis, keepdims=True)
+    if lead > 0:
+        y = y.squeeze(lead_axis)
+    return y
+
+def record_shapes_original(self, x0, x1):
+    self.x0_shape, self.x1_shape = x0.shape, x1.shape
+
+def reduce_original(self, gx0, gx1):
+    if self.x0_shape != self.x1_shape:
+        if gx0.shape != self.x0_shape:
+            gx0 = SumTo(self.x0_shape)(gx0)
+        if gx1.shape != self.x1_shape:
+            gx1 = SumTo(self.x1_shape)(gx1)
+    return gx0, gx1
+
+class SumTo(Function):
+    def __init__(self, shape):
+        self.shape = shape
+
+    def forward(self, x):
+        self.x_shape = x.shape
+        return sum_to_original(x, self.shape)
+
+    def backward(self, gy):
+        return broadcast_to(gy, self.x_shape)
+
+def bias_add_step(x, bs):
+    '小さいバッチにバイアスを何度も足して逆伝播する'
+    y = x
+    for b in bs:
+        y = y * 0.5 + b
+    y.backward()
+
+def bench(stmt, number=20):
+    return min(timeit.repeat(stmt, number=number, repeat=10)) / number * 1e3
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    cases = [((16, 8, 32), (32,)), ((7, 11), (11,)), ((16, 8, 32), (8, 1)), ((16, 8, 32), (16, 1, 32))]
+    print('{:<30} {:>10} {:>10} {:>10}'.format('sum_to', 'original', 'no plan', 'plan'))
+    for x_shape, shape in cases:
+        gy = np.random.randn(*x_shape)
+        axis = utils.sum_to_axis(x_shape, shape)
+        assert np.allclose(sum_to_original(gy, shape), utils.sum_to(gy, shape, axis))
+        print('{:<30} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+            '{} -> {}'.format(x_shape, shape),
+            bench(lambda: sum_to_original(gy, shape), 10000) * 1e3,
+            bench(lambda: utils.sum_to(gy, shape), 10000) * 1e3,
+            bench(lambda: utils.sum_to(gy, shape, axis), 10000) * 1e3))
+
+    x = Variable(np.random.randn(16, 8, 32))
+    bs = [Variable(np.random.randn(32)) for _ in range(50)]
+    print('{:<40} {:>10}'.format('50 x (mul + bias add), fwd + bwd', 'ms'))
+    print('{:<40} {:>10.3f}'.format('with plan', bench(lambda: bias_add_step(x, bs))))
+    info = utils.broadcast_plan.cache_info()
+    print('broadcast_plan cache: {} hits, {} misses'.format(info.hits, info.misses))
+
+    # 順伝播では形状だけを記録し、逆伝播で元の実装のsum_toを呼ぶ（計画を使う前のやり方）
+    record, reduce = BinaryFunction._record_shapes, BinaryFunction._sum_to
+    BinaryFunction._record_shapes = record_shapes_original
+    BinaryFunction._sum_to = reduce_original
+    print('{:<40} {:>10.3f}'.format('original sum_to', bench(lambda: bias_add_step(x, bs))))
+    BinaryFunction._record_shapes, BinaryFunction._sum_to = record, reduce
@@ -0,0 +1,61 @@
+'''im2col（ストライド付きビュー + 1回の行列積）の畳み込み・プーリングと、画素ごとにループする実装を比較する
+
+python benchmarks/conv_benchmark.py
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+import dezero.functions as F
+
+def naive_conv2d(x, W, stride, pad):
+    N, C, H, W_ = x.shape
+    OC, _, KH, KW = W.shape
+    x = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)))
+    OH = (H + 2 * pad - KH) // stride + 1
+    OW = (W_ + 2 * pad - KW) // stride + 1
+    y = np.zeros((N, OC, OH, OW), dtype=x.dtype)
+    for i in range(OH):
+        for j in range(OW):
+            window = x[:, :, i * stride:i * stride + KH, j * stride:j * stride + KW]
+            y[:, :, i, j] = np.tensordot(window, W, ((1, 2, 3), (1, 2, 3)))
+    return y
+
+def naive_max_pooling(x, k, stride):
+    N, C, H, W = x.shape
+    OH, OW = (H - k) // stride + 1, (W - k) // stride + 1
+    y = np.zeros((N, C, OH, OW), dtype=x.dtype)
+    for i in range(OH):
+        for j in range(OW):
+            y[:, :, i, j] = x[:, :, i * stride:i * stride + k, j * stride:j * stride + k].max(axis=(2, 3))
+    return y
+
+def bench(stmt, number=5):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    x = np.random.randn(32, 16, 32, 32).astype(np.float32)
+    W = np.random.randn(32, 16, 3, 3).astype(np.float32)
+
+    def conv_step():
+        xv, Wv = Variable(x), Variable(W)
+        y = F.conv2d(xv, Wv, pad=1)
+        y.backward()
+
+    def pool_step():
+        xv = Variable(x)
+        y = F.max_pooling(xv, 2, 2)
+        y.backward()
+
+    print('{:<28} {:>10}'.format('case', 'ms'))
+    print('{:<28} {:>10.2f}'.format('naive conv2d forward', bench(lambda: naive_conv2d(x, W, 1, 1))))
+    print('{:<28} {:>10.2f}'.format('conv2d forward', bench(lambda: F.conv2d(x, W, pad=1))))
+    print('{:<28} {:>10.2f}'.format('conv2d forward + backward', bench(conv_step)))
+    print('{:<28} {:>10.2f}'.format('naive max_pooling forward', bench(lambda: naive_max_pooling(x, 2, 2))))
+    print('{:<28} {:>10.2f}'.format('max_pooling forward', bench(lambda: F.max_pooling(x, 2, 2))))
+    print('{:<28} {:>10.2f}'.format('max_pooling fwd + bwd', bench(pool_step)))
+    print('{:<28} {:>10.2f}'.format('average_pooling forward', bench(lambda: F.average_pooling(x, 2, 2))))
@@ -0,0 +1,56 @@
+'''ドロップアウトを、float64の乱数から毎回確保したfloatのマスクを作って保持する素朴な書き方とF.dropoutで比較する
+
+学習時の順伝播と逆伝播の時間、逆伝播のために保持するマスクのバイト数、推論時の時間を表示する
+
+python benchmarks/dropout_benchmark.py [行数] [列数]
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import Function
+from dezero.core import Configuration
+from dezero import test_mode
+import dezero.functions as F
+
+class NaiveDropout(Function):
+    def __init__(self, ratio):
+        self.ratio = ratio
+
+    def forward(self, x):
+        self.mask = (np.random.rand(*x.shape) > self.ratio).astype(x.dtype) / (1 - self.ratio)
+        return x * self.mask
+
+    def backward(self, gy):
+        return gy * self.mask
+
+def naive_dropout(x, ratio=0.5):
+    if not Configuration.train:
+        return x * 1.0
+    return NaiveDropout(ratio)(x)
+
+def bench(stmt, number=20):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    cols = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    x = np.random.rand(rows, cols).astype(np.float32)
+
+    def step(f):
+        v = Variable(x)
+        y = f(v, 0.5)
+        y.backward()
+        return y
+
+    print('input {} float32'.format(x.shape))
+    print('{:<10} {:>12} {:>12} {:>14}'.format('mode', 'train ms', 'mask bytes', 'test mode ms'))
+    for label, f in (('naive', naive_dropout), ('F.dropout', F.dropout)):
+        mask = step(f).creator.mask
+        t_train = bench(lambda: step(f))
+        with test_mode():
+            t_test = bench(lambda: f(Variable(x), 0.5), number=1000)
+        print('{:<10} {:>12.3f} {:>12} {:>14.4f}'.format(label, t_train, mask.nbytes, t_test))
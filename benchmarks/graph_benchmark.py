@@ -0,0 +1,60 @@
+'''記録した計算グラフの最適化（定数の畳み込みと共通部分式の削除）によるノード数と速度の変化を計測する
+
+テイラー展開のsinを、係数をVariableの定数で作り、x ** kを毎回掛け算でやり直す素朴な書き方で計算する
+
+python benchmarks/graph_benchmark.py [項の数] [要素数]
+'''
+import os
+import sys
+import math
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import graph
+
+def naive_sin(x, n):
+    y = 0
+    for i in range(n):
+        c = Variable(np.array(-1.0)) ** i / Variable(np.array(float(math.factorial(2 * i + 1))))
+        t = x
+        for _ in range(2 * i):
+            t = t * x
+        y = y + c * t
+    return y
+
+def bench(stmt, number=20):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    x = np.random.rand(size)
+
+    def eager():
+        v = Variable(x)
+        y = naive_sin(v, n)
+        y.backward()
+
+    g = graph.trace(lambda v: naive_sin(v, n), x)
+    opt = graph.trace(lambda v: naive_sin(v, n), x)
+    stats = opt.optimize()
+    print('{} terms, {} elements'.format(n, size))
+    print('nodes: {} -> {} ({} folded, {} merged)'.format(
+        stats['nodes_before'], stats['nodes_after'], stats['folded'], stats['merged']))
+
+    y = g(x)
+    y.backward()
+    z = opt(x)
+    z.backward()
+    assert np.allclose(y.data, z.data) and np.allclose(g.inputs[0].gradient.data, opt.inputs[0].gradient.data)
+
+    print('{:<20} {:>12} {:>12}'.format('mode', 'forward ms', 'backward ms'))
+    print('{:<20} {:>12.3f} {:>12}'.format('eager', bench(lambda: naive_sin(Variable(x), n)), '-'))
+    print('{:<20} {:>12} {:>12.3f}'.format('eager fwd+bwd', '-', bench(eager)))
+    for label, graph_ in (('traced', g), ('traced, optimized', opt)):
+        def backward():
+            graph_.inputs[0].cleargradient()
+            graph_.outputs[0].backward()
+        print('{:<20} {:>12.3f} {:>12.3f}'.format(label, bench(lambda: graph_(x)), bench(backward)))
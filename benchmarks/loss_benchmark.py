@@ -0,0 +1,75 @@
+'''損失関数を1つのノード（F.mean_squared_errorなど）で計算する場合と、基本的な関数の組み合わせで書く場合を比較する
+
+計算グラフのノード数と、損失と逆伝播の1回あたりの時間を表示する
+
+python benchmarks/loss_benchmark.py [バッチサイズ] [出力の大きさ]
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import graph
+import dezero.functions as F
+
+def composed_mse(y, t):
+    return F.sum((y - t) ** 2) / len(y)
+
+def composed_mae(y, t):
+    # 絶対値の関数はないので二乗の平方根で書く
+    return F.sum(((y - t) ** 2) ** 0.5) / len(y)
+
+def composed_bce(p, t):
+    return -F.sum(t * F.log(p) + (1 - t) * F.log(1 - p)) / len(p)
+
+def composed_bce_logits(x, t):
+    return composed_bce(F.sigmoid(x), t)
+
+def bench(stmt, number=20):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+if __name__ == '__main__':
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    M = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    np.random.seed(0)
+    y = np.random.randn(N, M).astype(np.float32)
+    # 目標値はVariableにしておく（ndarrayのままだと関数の呼び出しでコピーされる）
+    t = Variable(np.random.randn(N, M).astype(np.float32))
+    p = 1 / (1 + np.exp(-y))
+    labels = Variable((np.random.rand(N, M) > 0.5).astype(np.float32))
+
+    cases = [
+        ('mse', composed_mse, F.mean_squared_error, y, t),
+        ('mae', composed_mae, F.mean_absolute_error, y, t),
+        ('huber', None, F.huber_loss, y, t),
+        ('bce', composed_bce, F.binary_cross_entropy, p, labels),
+        ('bce logits', composed_bce_logits, lambda x, t: F.binary_cross_entropy(x, t, from_logits=True), y, labels),
+    ]
+
+    def step(f, a, b):
+        v = Variable(a)
+        loss = f(v, b)
+        loss.backward()
+        return loss.data, v.gradient.data
+
+    print('input ({}, {}) float32, loss + backward'.format(N, M))
+    print('{:<12} {:>8} {:>8} {:>14} {:>12}'.format('loss', 'nodes', 'fused', 'composed ms', 'fused ms'))
+    for name, composed, fused, a, b in cases:
+        n_fused = len(graph.trace(fused, a, b.data))
+        t_fused = bench(lambda: step(fused, a, b))
+        if composed is None:
+            print('{:<12} {:>8} {:>8} {:>14} {:>12.3f}'.format(name, '-', n_fused, '-', t_fused))
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = step(composed, a, b)
+        got = step(fused, a, b)
+        # 組み合わせたmaeは差が0の要素で勾配がnanになるので、有限の要素だけ比べる
+        finite = np.isfinite(expected[1])
+        assert np.allclose(expected[0], got[0], rtol=1e-4)
+        assert np.allclose(expected[1][finite], got[1][finite], rtol=1e-3, atol=1e-6)
+        n_composed = len(graph.trace(composed, a, b.data))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_composed = bench(lambda: step(composed, a, b))
+        print('{:<12} {:>8} {:>8} {:>14.3f} {:>12.3f}'.format(name, n_composed, n_fused, t_composed, t_fused))
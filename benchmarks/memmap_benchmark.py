@@ -0,0 +1,62 @@
+'''np.memmapのデータで線形モデルの勾配を計算し、メモリに読み込んだ場合と時間・最大確保量を比較する
+
+最大確保量はtracemallocで計測するnumpyの確保量で、np.memmapのページキャッシュは含まない
+
+python benchmarks/memmap_benchmark.py [行数] [特徴量の数]
+'''
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import backend
+from dezero.backend import MemmapBackend
+import dezero.functions as F
+
+def gradient(x, t, w):
+    '平均二乗誤差の勾配を求める'
+    w = Variable(w.copy())
+    x = Variable(x)
+    loss = F.sum((F.matmul(x, w) - t) ** 2) / len(t)
+    loss.backward()
+    return w.gradient.data
+
+def measure(f):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = f()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1e3, peak / 2 ** 20, result
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 21
+    d = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    np.random.seed(0)
+    w = np.random.rand(d, 1).astype(np.float32)
+    t = np.random.rand(n, 1).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as dir:
+        x = np.memmap(os.path.join(dir, 'x.dat'), dtype=np.float32, mode='w+', shape=(n, d))
+        for i in range(0, n, 1 << 16):
+            x[i:i + (1 << 16)] = np.random.rand(min(1 << 16, n - i), d)
+        x.flush()
+        print('{} x {} float32 ({:.0f} MB on disk)'.format(n, d, x.nbytes / 2 ** 20))
+        print('{:<28} {:>10} {:>12}'.format('mode', 'ms', 'peak MB'))
+
+        t_ram, peak_ram, g_ram = measure(lambda: gradient(np.array(x), t, w))
+        print('{:<28} {:>10.1f} {:>12.1f}'.format('in memory', t_ram, peak_ram))
+        t_auto, peak_auto, g_auto = measure(lambda: gradient(x, t, w))
+        print('{:<28} {:>10.1f} {:>12.1f}'.format('memmap input', t_auto, peak_auto))
+        # 入力と同じ大きさの勾配（xの勾配）も一時ファイルに書き込む
+        xp = MemmapBackend(dir=dir, threshold=1 << 20)
+        with backend.using_backend(xp):
+            t_all, peak_all, g_all = measure(lambda: gradient(x, t, w))
+        print('{:<28} {:>10.1f} {:>12.1f}'.format('memmap input + gradients', t_all, peak_all))
+        assert np.allclose(g_ram, g_auto, rtol=1e-3) and np.allclose(g_ram, g_all, rtol=1e-3)
+        del x
@@ -0,0 +1,95 @@
+'''大きな配列を持つVariableをProcessPoolExecutorで並列に処理する時の受け渡しの速度を計測する
+
+通常のpickle（protocol 4、配列はバイト列にコピーされる）で渡す場合と、
+pickle protocol 5のバッファを共有メモリに置いてpickleのバイト列だけを渡す場合を比較する
+
+python benchmarks/pickle_benchmark.py [要素数] [変数の数]
+'''
+import os
+import sys
+import time
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import utils
+import dezero.functions as F
+
+def work(x):
+    '受け取った計算グラフの続きを計算して逆伝播し、損失を返す'
+    y = F.sum(F.tanh(x) * x)
+    y.backward()
+    return float(y.data)
+
+def to_shared(x):
+    'Variableをpickleのバイト列と共有メモリに置いたバッファに分ける'
+    data, buffers = utils.dumps(x)
+    blocks = []
+    for b in buffers:
+        raw = b.raw()
+        shm = shared_memory.SharedMemory(create=True, size=max(1, raw.nbytes))
+        shm.buf[:raw.nbytes] = raw
+        blocks.append((shm, raw.nbytes))
+    return data, blocks
+
+def work_shared(args):
+    data, names = args
+    shms = [shared_memory.SharedMemory(name=name) for name, _ in names]
+    for shm in shms:
+        # 共有メモリの破棄は親プロセスが行う
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    x = utils.loads(data, [shm.buf[:size] for shm, (_, size) in zip(shms, names)])
+    loss = work(x)
+    del x
+    for shm in shms:
+        shm.close()
+    return loss
+
+def measure(f):
+    start = time.perf_counter()
+    result = f()
+    return (time.perf_counter() - start) * 1e3, result
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 22
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    np.random.seed(0)
+    # 途中まで計算したグラフ（入力→sin→*2）を送る
+    xs = [F.sin(Variable(np.random.rand(n))) * 2.0 for _ in range(count)]
+    print('{} variables x {} elements ({:.1f} MB each)'.format(count, n, xs[0].data.nbytes / 2 ** 20))
+
+    # pickleだけの比較
+    t4, data4 = measure(lambda: pickle.dumps(xs[0], protocol=4))
+    t5, (data5, buffers) = measure(lambda: utils.dumps(xs[0]))
+    print('{:<28} {:>10} {:>12}'.format('pickle', 'dumps ms', 'payload B'))
+    print('{:<28} {:>10.2f} {:>12}'.format('protocol 4', t4, len(data4)))
+    print('{:<28} {:>10.2f} {:>12}'.format('protocol 5 out-of-band', t5, len(data5)))
+
+    workers = min(4, os.cpu_count() or 1)
+    # 逆伝播で元の変数に勾配が付かないように、直列の場合も複製したグラフで計算する
+    t_serial, serial = measure(lambda: [work(pickle.loads(pickle.dumps(x))) for x in xs])
+    with ProcessPoolExecutor(workers) as pool:
+        list(pool.map(work, xs[:workers]))
+        t_pool, pooled = measure(lambda: list(pool.map(work, xs)))
+
+        def run_shared():
+            shared = [to_shared(x) for x in xs]
+            try:
+                return list(pool.map(work_shared, [(data, [(shm.name, size) for shm, size in blocks])
+                                                   for data, blocks in shared]))
+            finally:
+                for _, blocks in shared:
+                    for shm, _ in blocks:
+                        shm.close()
+                        shm.unlink()
+        t_shared, shared = measure(run_shared)
+
+    assert np.allclose(serial, pooled) and np.allclose(serial, shared)
+    print('{:<28} {:>10}'.format('map ({} workers)'.format(workers), 'total ms'))
+    print('{:<28} {:>10.2f}'.format('serial', t_serial))
+    print('{:<28} {:>10.2f}'.format('pool, pickle', t_pool))
+    print('{:<28} {:>10.2f}'.format('pool, shared memory', t_shared))
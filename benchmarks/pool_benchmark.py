@@ -0,0 +1,57 @@
+'''学習のループで、中間の配列を毎回確保する場合とメモリプール（dezero.pool）で使い回す場合を比較する
+
+python benchmarks/pool_benchmark.py [反復回数] [バッチサイズ] [隠れ層の大きさ]
+'''
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import pool
+import dezero.functions as F
+import dezero.layers as L
+
+def train(layers, x, t, iters, lr=1e-4):
+    for _ in range(iters):
+        h = Variable(x)
+        for layer in layers[:-1]:
+            h = F.tanh(layer(h))
+        loss = F.sum((layers[-1](h) - t) ** 2)
+        for layer in layers:
+            layer.cleargradients()
+        loss.backward()
+        for layer in layers:
+            for p in layer.params():
+                p.data -= lr * p.gradient.data
+    return float(loss.data)
+
+def measure(layers, x, t, iters):
+    start = time.perf_counter()
+    loss = train(layers, x, t, iters)
+    return (time.perf_counter() - start) / iters * 1e3, loss
+
+if __name__ == '__main__':
+    iters = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    hidden = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    np.random.seed(0)
+    x = np.random.randn(batch, hidden)
+    t = np.random.rand(batch, 1)
+
+    print('{} iterations, batch {}, hidden {}'.format(iters, batch, hidden))
+    print('{:<10} {:>12} {:>10} {:>12}'.format('mode', 'ms / iter', 'hit rate', 'pooled MB'))
+    for label in ('numpy', 'pool'):
+        np.random.seed(1)
+        layers = [L.Linear(hidden, in_size=hidden) for _ in range(3)] + [L.Linear(1, in_size=hidden)]
+        if label == 'pool':
+            p = pool.MemoryPool()
+            with pool.using_pool(p):
+                elapsed, loss = measure(layers, x, t, iters)
+            s = p.stats()
+            print('{:<10} {:>12.3f} {:>10.3f} {:>12.1f}   loss {:.6f}'.format(
+                label, elapsed, s['hit_rate'], s['bytes_pooled'] / 2 ** 20, loss))
+        else:
+            elapsed, loss = measure(layers, x, t, iters)
+            print('{:<10} {:>12.3f} {:>10} {:>12}   loss {:.6f}'.format(label, elapsed, '-', '-', loss))
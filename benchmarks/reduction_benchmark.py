@@ -0,0 +1,46 @@
+'''大きな配列に対するsum/mean/max/minの順伝播 + 逆伝播の時間を計測する
+
+maxの逆伝播は、勾配をxの形状に展開してからマスクを掛ける方法とも比較する。
+
+python benchmarks/reduction_benchmark.py
+'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+import dezero.functions as F
+
+def bench(stmt, number=5):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+def max_backward_materialised(x, y, gy, axis):
+    '勾配とyをxの形状のコピーに展開してからマスクを掛ける方法'
+    gy_full = np.broadcast_to(np.expand_dims(gy, axis), x.shape).copy()
+    y_full = np.broadcast_to(np.expand_dims(y, axis), x.shape).copy()
+    return gy_full * (x == y_full)
+
+def max_backward_broadcast(x, y, gy, axis):
+    'ブロードキャストで比較と掛け算を行う方法（F.maxの逆伝播と同じ）'
+    return np.expand_dims(gy, axis) * (x == np.expand_dims(y, axis))
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    x = np.random.randn(2000, 2000).astype(np.float32)
+
+    print('{:<36} {:>10}'.format('case (2000 x 2000, float32)', 'ms'))
+    for name in ['sum', 'mean', 'max', 'min']:
+        func = getattr(F, name)
+        for axis in [None, 0, 1]:
+            def step():
+                v = Variable(x)
+                y = func(v, axis=axis)
+                y.backward()
+            print('{:<36} {:>10.2f}'.format('{}(axis={}) fwd + bwd'.format(name, axis), bench(step)))
+
+    y = x.max(axis=1)
+    gy = np.ones_like(y)
+    print('{:<36} {:>10.2f}'.format('max backward, materialised', bench(lambda: max_backward_materialised(x, y, gy, 1))))
+    print('{:<36} {:>10.2f}'.format('max backward, broadcast mask', bench(lambda: max_backward_broadcast(x, y, gy, 1))))
@@ -0,0 +1,51 @@
+'''系列長に対するRNNの学習時間とメモリ使用量を計測する
+
+python benchmarks/rnn_benchmark.py
+'''
+import os
+import sys
+import time
+import tracemalloc
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import dezero.layers as L
+import dezero.optimizers as optimizers
+from dezero.utils import truncated_bptt
+
+class Model(L.Layer):
+    def __init__(self, hidden_size):
+        super().__init__()
+        self.rnn = L.LSTM(hidden_size)
+        self.fc = L.Linear(1)
+
+    def forward(self, x):
+        return self.fc(self.rnn(x))
+
+def loss_func(y, t):
+    return (y - t) ** 2
+
+def run(seq_len, bptt_length, batch_size=32, hidden_size=64):
+    'bptt_length=Noneの場合は系列全体で逆伝播する'
+    np.random.seed(0)
+    seq = np.sin(np.linspace(0, seq_len / 10, seq_len + 1, dtype=np.float32))
+    seq = np.tile(seq.reshape(-1, 1, 1), (1, batch_size, 1))
+    xs, ts = seq[:-1], seq[1:]
+    model = Model(hidden_size)
+    optimizer = optimizers.SGD(lr=1e-4).setup(model)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    truncated_bptt(model, optimizer, xs, ts, loss_func, bptt_length or seq_len)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / seq_len * 1e3, peak / 2 ** 20
+
+if __name__ == '__main__':
+    print('{:>8} {:>10} {:>14} {:>12}'.format('seq_len', 'bptt', 'ms / step', 'peak MiB'))
+    for seq_len in [100, 400, 1600]:
+        for bptt_length in [None, 32]:
+            ms, mib = run(seq_len, bptt_length)
+            print('{:>8} {:>10} {:>14.3f} {:>12.2f}'.format(
+                seq_len, 'full' if bptt_length is None else bptt_length, ms, mib))
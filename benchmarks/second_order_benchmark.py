@@ -0,0 +1,53 @@
+'''rosenbrockの最小化で、勾配降下法・ニュートン法・L-BFGS法の収束までの反復回数と時間を比較する
+
+2変数のrosenbrockと、2要素ずつ独立なrosenbrockを並べたn変数の問題（extended rosenbrock）を解く
+
+python benchmarks/second_order_benchmark.py [n] [許容誤差]
+'''
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import optimizers
+from dezero.core import rosenbrock
+import dezero.functions as F
+
+def f2(x):
+    return rosenbrock(x[0], x[1])
+
+def extended(x):
+    return F.sum(rosenbrock(x[::2], x[1::2]))
+
+def gradient_descent(f, x, lr=1e-3, max_iter=200000, tol=1e-6):
+    x = Variable(np.array(x, dtype=np.float64))
+    for i in range(max_iter):
+        y = f(x)
+        x.cleargradient()
+        y.backward()
+        g = x.gradient.data
+        if np.linalg.norm(g) < tol:
+            return optimizers.OptimizeResult(x.data, True, i)
+        x.data -= lr * g
+    return optimizers.OptimizeResult(x.data, False, max_iter)
+
+def run(name, f, x0, tol):
+    print(name)
+    print('{:<10} {:>10} {:>10} {:>12} {:>10}'.format('method', 'converged', 'iters', 'ms', 'max|x-1|'))
+    methods = [('GD', gradient_descent), ('L-BFGS', optimizers.lbfgs)]
+    if x0.size <= 100:
+        methods.insert(1, ('Newton', optimizers.newton))
+    for label, method in methods:
+        start = time.perf_counter()
+        r = method(f, x0, tol=tol)
+        elapsed = (time.perf_counter() - start) * 1e3
+        print('{:<10} {:>10} {:>10} {:>12.1f} {:>10.2e}'.format(
+            label, str(r.converged), r.iterations, elapsed, np.abs(r.x - 1).max()))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tol = float(sys.argv[2]) if len(sys.argv) > 2 else 1e-4
+    run('rosenbrock (2 variables), tol={}'.format(tol), f2, np.array([-1.2, 1.0]), tol)
+    run('extended rosenbrock ({} variables), tol={}'.format(n, tol), extended, np.tile([-1.2, 1.0], n // 2), tol)
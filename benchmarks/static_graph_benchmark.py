@@ -0,0 +1,78 @@
+'''学習のループで、毎回計算グラフを作る場合と静的なグラフ（dezero.graph.static）を使い回す場合を比較する
+
+1回の反復の時間と、1回の反復で生成するFunctionの数を表示する
+
+python benchmarks/static_graph_benchmark.py [反復回数] [バッチサイズ]
+'''
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Function
+from dezero import graph
+import dezero.functions as F
+import dezero.layers as L
+
+class MLP(L.Layer):
+    def __init__(self, sizes):
+        super().__init__()
+        self.layers = []
+        for i, size in enumerate(sizes):
+            layer = L.Linear(size)
+            setattr(self, 'l' + str(i), layer)
+            self.layers.append(layer)
+
+    def forward(self, x):
+        for layer in self.layers[:-1]:
+            x = F.tanh(layer(x))
+        return self.layers[-1](x)
+
+def train(step, model, x, t, iters, lr=1e-3):
+    for _ in range(iters):
+        loss = step(x, t)
+        model.cleargradients()
+        loss.backward()
+        for p in model.params():
+            p.data -= lr * p.gradient.data
+    return float(loss.data)
+
+def count_functions(step, model, x, t, iters=10):
+    'iters回の反復で生成したFunctionの数（1回あたり）'
+    created = [0]
+    init = Function.__init__
+    def counting_init(self, *args, **kwargs):
+        created[0] += 1
+        init(self, *args, **kwargs)
+    Function.__init__ = counting_init
+    try:
+        train(step, model, x, t, iters)
+    finally:
+        Function.__init__ = init
+    return created[0] / iters
+
+def measure(step, model, x, t, iters):
+    # 最初の1回（静的なグラフの記録）は時間に含めない
+    train(step, model, x, t, 1)
+    start = time.perf_counter()
+    loss = train(step, model, x, t, iters)
+    elapsed = (time.perf_counter() - start) / iters * 1e3
+    return elapsed, count_functions(step, model, x, t), loss
+
+if __name__ == '__main__':
+    iters = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    np.random.seed(0)
+    x = np.random.rand(batch, 10).astype(np.float32)
+    t = np.random.rand(batch, 1).astype(np.float32)
+
+    print('{} iterations, batch {}, 6 layers'.format(iters, batch))
+    print('{:<10} {:>14} {:>18} {:>12}'.format('mode', 'ms / iter', 'functions / iter', 'loss'))
+    for label in ('eager', 'static'):
+        np.random.seed(1)
+        model = MLP([16] * 5 + [1])
+        loss = lambda x, t: F.sum((model(x) - t) ** 2)
+        step = graph.static(loss) if label == 'static' else loss
+        elapsed, functions, value = measure(step, model, x, t, iters)
+        print('{:<10} {:>14.3f} {:>18.0f} {:>12.6f}'.format(label, elapsed, functions, value))
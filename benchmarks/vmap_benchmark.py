@@ -0,0 +1,65 @@
+'''初期値の異なる多数のrosenbrockを、問題ごとに計算グラフを作る場合とvmapでまとめて計算する場合で比較する
+
+python benchmarks/vmap_benchmark.py [問題の数] [反復回数]
+'''
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from dezero import Variable
+from dezero import batch
+from dezero.core import rosenbrock
+
+def loop(x0s, x1s, lr, iters):
+    '問題ごとに計算グラフを作って逆伝播する'
+    results = []
+    for a, b in zip(x0s, x1s):
+        x0, x1 = Variable(np.array(a)), Variable(np.array(b))
+        for _ in range(iters):
+            y = rosenbrock(x0, x1)
+            x0.cleargradient()
+            x1.cleargradient()
+            y.backward()
+            x0.data -= lr * x0.gradient.data
+            x1.data -= lr * x1.gradient.data
+        results.append((float(x0.data), float(x1.data)))
+    return np.array(results).T
+
+def measure(f, repeat=3):
+    '最も速かった回の時間（ミリ秒）と結果'
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        times.append((time.perf_counter() - start) * 1e3)
+    return min(times), result
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    iters = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    lr = 1e-3
+    np.random.seed(0)
+    x0s = np.random.uniform(-2, 2, n)
+    x1s = np.random.uniform(-1, 3, n)
+
+    # 同じ反復回数での比較（収束判定なし）
+    t_loop, r_loop = measure(lambda: loop(x0s, x1s, lr, iters), repeat=1)
+    t_vmap, r_vmap = measure(lambda: batch.minimize(rosenbrock, x0s, x1s, lr=lr, max_iter=iters, tol=0))
+    assert np.allclose(r_loop, r_vmap.x)
+    print('{} problems x {} iterations'.format(n, iters))
+    print('{:<32} {:>10}'.format('mode', 'ms'))
+    print('{:<32} {:>10.1f}'.format('graph per problem', t_loop))
+    print('{:<32} {:>10.1f}'.format('vmap', t_vmap))
+
+    # 収束するまで解く。収束した問題を外す場合と、最も遅い問題に合わせて全て計算し続ける場合
+    t_mask, r = measure(lambda: batch.minimize(rosenbrock, x0s, x1s, lr=lr, max_iter=100000, tol=1e-4))
+    slowest = int(r.iterations.max())
+    t_full, _ = measure(lambda: batch.minimize(rosenbrock, x0s, x1s, lr=lr, max_iter=slowest, tol=0))
+    print('to convergence (tol=1e-4, {}/{} converged, mean {:.0f} / max {} iterations)'.format(
+        int(r.converged.sum()), n, r.iterations.mean(), slowest))
+    # 外した問題の要素ごとの演算は省けるが、反復ごとのグラフ作成の手間は最も遅い問題の反復回数だけかかる
+    print('elementwise work saved by masking: at most {:.0%}'.format(1 - r.iterations.mean() / slowest))
+    print('{:<32} {:>10.1f}'.format('vmap, convergence masking', t_mask))
+    print('{:<32} {:>10.1f}'.format('vmap, all until slowest', t_full))
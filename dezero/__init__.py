@@ -11,16 +11,33 @@ if is_simple_core:
     from dezero.core_simple import setup_variable
 else:
     from dezero.core import Variable
+    from dezero.core import Parameter
+    from dezero.core import SparseRowGradient
     from dezero.core import Function
     from dezero.core import using_config
     from dezero.core import no_grad
+    from dezero.core import test_mode
     from dezero.core import as_array
     from dezero.core import as_variable
     from dezero.core import setup_variable
 
+import dezero.backend
+
 # テストのために追加
 from dezero.utils import get_dot_graph
 from dezero.utils import plot_dot_graph
 import dezero.functions as F
+import dezero.memory
+import dezero.layers as L
+import dezero.optimizers
+import dezero.mixed_precision
+import dezero.cache
+import dezero.batch
+import dezero.graph
+import dezero.pool
+
+setup_variable()
 
-setup_variable()
\ No newline at end of file
+# from dezero import *でtest_modeがテストのモジュールに入ると、pytestがテスト関数として集めてしまう。
+# testで始まる名前はimport *の対象にしない（dezero.test_modeとして使う）
+__all__ = [name for name in dir() if not name.startswith(('_', 'test'))]
@@ -0,0 +1,226 @@
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dezero.core import Configuration
+from dezero.core import using_config
+
+# =============================================================================
+# Backend dispatch
+# =============================================================================
+# 関数の順伝播はnumpyを直接呼ばずに、get_array_moduleが返す配列モジュールのufunc
+# （xp.add, xp.multiply, xp.sin ...）を使う。既定はnumpyそのもの。
+# 配列モジュールはnumpyと同じ名前の関数を持つオブジェクトなら何でもよい。
+def get_array_module(*xs):
+    '''現在有効な配列モジュールを返却する
+
+    配列モジュールがnumpyのままで、入力にnp.memmapが含まれる時はMemmapBackendを返却する'''
+    xp = Configuration.array_module
+    if xp is np and any(isinstance(x, np.memmap) for x in xs):
+        return memmap_backend()
+    return xp
+
+def set_backend(xp):
+    '配列モジュールを全体に設定する。Noneでnumpyに戻す'
+    Configuration.array_module = np if xp is None else xp
+
+def using_backend(xp):
+    '''with文の中だけ配列モジュールを切り替える
+
+    with using_backend(ThreadedBackend()):
+        y = F.tanh(x)'''
+    return using_config('array_module', xp)
+
+class ThreadedBackend:
+    '''大きな配列の要素ごとの演算をブロックに分け、スレッドプールで並列に計算する配列モジュール
+
+    numpyのufuncは計算中にGILを解放するので、スレッドでも複数のコアを使える。
+    出力は最初に1回だけ確保し、各ブロックはout=でその一部に直接書き込む。
+    要素数がthresholdより小さい配列はスレッドの切り替えの方が高くつくので、そのままnumpyで計算する。
+    対応していない関数はnumpyのものをそのまま返す'''
+
+    # ブロックに分けて計算するufunc
+    ufuncs = ('add', 'subtract', 'multiply', 'divide', 'true_divide', 'negative', 'power',
+              'sin', 'cos', 'tanh', 'exp', 'log', 'sqrt', 'square')
+
+    def __init__(self, num_workers=None, block_size=1 << 16, threshold=1 << 18):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        # 1ブロックの要素数。float32で256KBとなり、L2キャッシュに収まる大きさ
+        self.block_size = block_size
+        # この要素数未満の計算はnumpyにそのまま任せる
+        self.threshold = threshold
+        self._pool = None
+
+    def __repr__(self):
+        return 'ThreadedBackend(num_workers={})'.format(self.num_workers)
+
+    def __getattr__(self, name):
+        ufunc = getattr(np, name)
+        if name in self.ufuncs:
+            def blocked(*args, **kwargs):
+                return self._apply(ufunc, *args, **kwargs)
+            blocked.__name__ = name
+            # 次回からは__getattr__を経由しないようにキャッシュする
+            self.__dict__[name] = blocked
+            return blocked
+        return ufunc
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.num_workers)
+        return self._pool
+
+    def shutdown(self):
+        'スレッドプールを終了する'
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _use_blocks(self, args, size):
+        'ブロックに分けて計算するかどうか'
+        return self.num_workers > 1 and size >= self.threshold
+
+    def _empty(self, shape, dtype):
+        'ブロックに分けて計算する時の出力を確保する'
+        return np.empty(shape, dtype=dtype)
+
+    def _map(self, run, starts):
+        'ブロックの先頭の位置ごとにrunを呼ぶ'
+        if self.num_workers == 1:
+            for i in starts:
+                run(i)
+        else:
+            for _ in self.pool.map(run, starts):
+                pass
+
+    def _apply(self, ufunc, *args, out=None, **kwargs):
+        shape = np.broadcast_shapes(*[np.shape(a) for a in args])
+        size = int(np.prod(shape))
+        if kwargs or shape == () or not self._use_blocks(args, size):
+            return ufunc(*args, out=out, **kwargs) if out is not None else ufunc(*args, **kwargs)
+
+        if out is None:
+            # Pythonのスカラは型を持たない値として扱い、numpyと同じ型の出力を確保する
+            # （np.float32などのnumpyのスカラは型を持つ。np.float64はfloatの子クラスなのでtypeで比べる）
+            dtypes = tuple(type(a) if type(a) in (bool, int, float, complex) else np.asarray(a).dtype
+                           for a in args)
+            out = self._empty(shape, ufunc.resolve_dtypes(dtypes + (None,))[-1])
+
+        if out.flags.c_contiguous and all(np.ndim(a) == 0 or (a.shape == shape and a.flags.c_contiguous)
+                                          for a in args):
+            # 同じ形状で連続している配列は1次元のビューにして均等に分ける
+            xs = [a if np.ndim(a) == 0 else a.reshape(-1) for a in args]
+            y = out.reshape(-1)
+            step, n = self.block_size, size
+        else:
+            # ブロードキャストを伴う場合は先頭の軸で分ける
+            xs = [a if np.ndim(a) == 0 else np.broadcast_to(a, shape) for a in args]
+            y = out
+            step, n = max(1, self.block_size // max(1, size // shape[0])), shape[0]
+
+        def run(i):
+            b = slice(i, i + step)
+            ufunc(*[x if np.ndim(x) == 0 else x[b] for x in xs], out=y[b])
+
+        self._map(run, range(0, n, step))
+        return out
+
+class MemmapBackend(ThreadedBackend):
+    '''np.memmapの配列をメモリに全て読み込まずに、先頭の軸に沿ったブロックごとに計算する配列モジュール
+
+    入力にnp.memmapが含まれる要素ごとの演算・sum・mean・dotは、ブロックごとにファイルから読んで計算し、
+    大きな出力は一時ファイルのnp.memmapに書き込む。get_array_moduleはnp.memmapの入力に対して自動でこれを使う。
+    using_backend(MemmapBackend(threshold=...))で明示的に使うと、要素数がthreshold以上の出力（勾配など）も
+    np.memmapになるので、メモリに収まらない大きさの勾配も計算できる
+
+    dir: 一時ファイルを作るディレクトリ。Noneのときはtempfileの既定のディレクトリ
+    block_size: 1ブロックの要素数
+    threshold: この要素数以上の演算はnp.memmapの入力がなくてもブロックごとに計算する。Noneのときはnp.memmapの入力がある時だけ'''
+
+    def __init__(self, dir=None, num_workers=1, block_size=1 << 22, threshold=None):
+        super().__init__(num_workers, block_size, threshold)
+        self.dir = dir
+
+    def __repr__(self):
+        return 'MemmapBackend(dir={!r}, threshold={})'.format(self.dir, self.threshold)
+
+    def _use_blocks(self, args, size):
+        return (any(isinstance(a, np.memmap) for a in args)
+                or (self.threshold is not None and size >= self.threshold))
+
+    def _empty(self, shape, dtype):
+        if int(np.prod(shape)) == 0:
+            return np.empty(shape, dtype=dtype)
+        # 名前のない一時ファイルに書き込む。ファイルを閉じてもマップは残り、配列が破棄されるとファイルも消える
+        with tempfile.TemporaryFile(dir=self.dir) as f:
+            return np.memmap(f, dtype=dtype, mode='w+', shape=shape)
+
+    def _rows(self, a):
+        '先頭の軸で何行ずつ計算するか'
+        return max(1, self.block_size // max(1, a.size // a.shape[0]))
+
+    def sum(self, a, axis=None, keepdims=False, **kwargs):
+        if kwargs or np.size(a) == 0 or np.ndim(a) == 0 or not self._use_blocks((a,), np.size(a)):
+            return np.sum(a, axis=axis, keepdims=keepdims, **kwargs)
+        ndim = a.ndim
+        if axis is None:
+            axes = tuple(range(ndim))
+        else:
+            axes = tuple(sorted(x % ndim for x in (axis if isinstance(axis, tuple) else (axis,))))
+        out_shape = tuple(n for i, n in enumerate(a.shape) if i not in axes)
+        step = self._rows(a)
+        if 0 in axes:
+            # 先頭の軸も縮約する時はブロックごとの部分和を足し合わせる
+            y = None
+            for i in range(0, a.shape[0], step):
+                part = np.sum(a[i:i + step], axis=axes, keepdims=True)
+                if y is None:
+                    y = np.asarray(part)
+                else:
+                    y += part
+        else:
+            # 先頭の軸が残る時はブロックごとの結果を出力の一部に書き込む
+            keep_shape = tuple(1 if i in axes else n for i, n in enumerate(a.shape))
+            y = self._empty(keep_shape, np.sum(a[:1], axis=axes).dtype)
+            for i in range(0, a.shape[0], step):
+                np.sum(a[i:i + step], axis=axes, keepdims=True, out=y[i:i + step])
+        return y if keepdims else y.reshape(out_shape)
+
+    def mean(self, a, axis=None, keepdims=False, **kwargs):
+        if kwargs or np.size(a) == 0 or np.ndim(a) == 0 or not self._use_blocks((a,), np.size(a)):
+            return np.mean(a, axis=axis, keepdims=keepdims, **kwargs)
+        y = self.sum(a, axis, keepdims)
+        if a.dtype.kind not in 'fc':
+            y = y.astype(np.float64)
+        return self.true_divide(y, a.size // max(1, np.size(y)))
+
+    def dot(self, a, b, **kwargs):
+        if kwargs or np.ndim(a) != 2 or np.ndim(b) != 2 or \
+                not self._use_blocks((a, b), a.shape[0] * b.shape[1]):
+            return np.dot(a, b, **kwargs)
+        (M, K), N = a.shape, b.shape[1]
+        if M >= K:
+            # aの行ごとに計算して出力の行に書き込む
+            y = self._empty((M, N), np.result_type(a, b))
+            step = self._rows(a)
+            for i in range(0, M, step):
+                np.dot(a[i:i + step], b, out=y[i:i + step])
+            return y
+        # 縮約する軸の方が長い時（x.T @ gyなど）は、縮約する軸に沿って部分積を足し合わせる
+        y = np.zeros((M, N), np.result_type(a, b))
+        step = max(1, self.block_size // max(1, M))
+        for k in range(0, K, step):
+            y += np.dot(a[:, k:k + step], b[k:k + step])
+        return y
+
+    matmul = dot
+
+_memmap_backend = None
+
+def memmap_backend():
+    'np.memmapの入力に対してget_array_moduleが返す既定のMemmapBackend'
+    global _memmap_backend
+    if _memmap_backend is None:
+        _memmap_backend = MemmapBackend()
+    return _memmap_backend
@@ -0,0 +1,82 @@
+from collections import namedtuple
+import numpy as np
+from dezero.core import Variable
+
+# minimizeの結果。x: 問題ごとの解（入力と同じ並び）、converged: 収束したか、iterations: 更新した回数
+MinimizeResult = namedtuple('MinimizeResult', ['x', 'converged', 'iterations'])
+
+def vmap(f):
+    '''1つの問題の目的関数fから、先頭の軸に並べた複数の問題を一度に計算する関数を作る
+
+    返却する関数は、先頭の軸の長さが問題の数Nの配列を受け取り、1回の順伝播と1回の逆伝播で
+    問題ごとの値（形状(N, ...)）と各入力の勾配（入力と同じ形状）を返却する。
+    fの中の演算は要素ごと（rosenbrockのような形）であること。問題どうしは独立しているので、
+    全ての値の和を逆伝播すると問題ごとの勾配が得られる。先頭の軸を縮約するとValueErrorとなる
+
+    value_and_grad = vmap(rosenbrock)
+    y, (g0, g1) = value_and_grad(x0, x1)'''
+    def value_and_grad(*xs):
+        vs = [Variable(np.asarray(x)) for x in xs]
+        n = len(vs[0])
+        y = f(*vs)
+        if y.shape[:1] != (n,):
+            raise ValueError('the instance axis was reduced: {} -> {}'.format(vs[0].shape, y.shape))
+        y.backward()
+        grads = [np.zeros_like(v.data) if v.gradient is None else v.gradient.data for v in vs]
+        return y.data, grads
+    return value_and_grad
+
+def minimize(f, *xs, lr=1e-3, max_iter=10000, tol=1e-6, compact=0.5):
+    '''先頭の軸に並べた独立な問題を勾配降下法でまとめて最小化する
+
+    1回の反復で作業用の配列に並べた問題をまとめて1回の順伝播と逆伝播で計算する。
+    勾配のノルムがtol未満になった問題はその時点の値で固定し、以降は更新しない。
+    収束した問題はactiveのマスクで外すだけにして、未収束の問題の割合がcompact未満になった時だけ
+    作業用の配列を詰め直す（毎回詰め直すとコピーの方が高くつく）
+
+    f: 1つの問題の目的関数（vmapを参照）
+    xs: 問題ごとの初期値。先頭の軸の長さは問題の数
+    compact: 作業用の配列を詰め直す、未収束の問題の割合'''
+    xs = [np.array(x, dtype=np.float64) for x in xs]
+    n = len(xs[0])
+    value_and_grad = vmap(f)
+    converged = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=np.int64)
+    # 作業用の配列に並べた問題の番号、その値、更新回数と、未収束かどうかのマスク
+    index = np.arange(n)
+    current = [x.copy() for x in xs]
+    steps = np.zeros(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+    count = n
+    for _ in range(max_iter):
+        if count == 0:
+            break
+        _, grads = value_and_grad(*current)
+        norm2 = sum((g ** 2).reshape(len(index), -1).sum(axis=1) for g in grads)
+        done = norm2 < tol ** 2
+        done &= active
+        if done.any():
+            # 収束した問題はその時点の値で固定し、以降は更新しない
+            converged[index[done]] = True
+            for x, c in zip(xs, current):
+                x[index[done]] = c[done]
+            active &= ~done
+            count -= int(done.sum())
+            if count < compact * len(index):
+                iterations[index] = steps
+                index, steps = index[active], steps[active]
+                current = [c[active] for c in current]
+                grads = [g[active] for g in grads]
+                active = np.ones(count, dtype=bool)
+        if count == len(index):
+            for c, g in zip(current, grads):
+                c -= lr * g
+            steps += 1
+        else:
+            for c, g in zip(current, grads):
+                np.subtract(c, lr * g, out=c, where=active.reshape((-1,) + (1,) * (c.ndim - 1)))
+            steps += active
+    iterations[index] = steps
+    for x, c in zip(xs, current):
+        x[index[active]] = c[active]
+    return MinimizeResult(xs, converged, iterations)
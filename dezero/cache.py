@@ -0,0 +1,157 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from dezero.core import Configuration
+from dezero.core import Function
+from dezero.core import Variable
+from dezero.core import as_array
+from dezero.core import using_config
+
+def _array_key(x):
+    'ndarrayの内容から作るキー。型と形状も含める'
+    if x.dtype.hasobject:
+        raise TypeError('object arrays cannot be hashed')
+    digest = hashlib.blake2b(np.ascontiguousarray(x), digest_size=16).digest()
+    return x.dtype.str, x.shape, digest
+
+def _value_key(value):
+    '''入力や関数のパラメータ（axis, shapeなど）から作るキー
+
+    キーにできない値の時はTypeErrorが発生する'''
+    if isinstance(value, Variable):
+        value = value.data
+    if isinstance(value, np.ndarray):
+        return _array_key(value)
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(_value_key(v) for v in value)
+    hash(value)
+    return value
+
+class InferenceCache:
+    '''推論時の計算結果を入力の内容ごとに記憶しておくLRUキャッシュ
+
+    同じ入力（内容が同じ配列）と同じパラメータで同じ関数を呼んだ時は、順伝播を行わずに記憶した結果を返す。
+    逆伝播を記録している時（enable_backdrop=True）と逆伝播の計算中は使われない。
+    記憶するのは出力の書き込み禁止のコピーで、計算した時の出力はそのまま書き換えられる。
+    記憶した結果を返した時（ヒットした時）の配列は書き込み禁止なので、その場で書き換えることはできない。
+    入力と記憶を共有する出力（reshapeなどのビュー）は計算が軽いので記憶しない。
+    乱数や内部の状態を使う関数（cacheable=FalseのFunction。dropout、学習時のbatch_normなど）も記憶しない
+
+    max_entries: 記憶する結果の最大数
+    max_bytes: 記憶する結果の配列の合計バイト数の上限
+
+    with cache.using_cache(InferenceCache()), no_grad():
+        y = model(x)'''
+
+    def __init__(self, max_entries=1024, max_bytes=1 << 28):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # キーと出力の配列のタプル。最後に使われたものほど後ろにある
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, func, xs):
+        '''関数と入力からキーを作る。キーを作れない時はNoneを返却する
+
+        func: Functionのインスタンス（パラメータはインスタンス変数から取り出す）、またはモデルなどの呼び出し可能なオブジェクト'''
+        if isinstance(func, Function) and not func.cacheable:
+            return None
+        try:
+            if isinstance(func, Function):
+                head = type(func), _value_key(tuple(sorted(func.__dict__.items())))
+            else:
+                head = func
+            return head, tuple(_value_key(x) for x in xs)
+        except TypeError:
+            return None
+
+    def get(self, key):
+        '記憶した出力の配列のタプルを返却する。記憶していない時はNone'
+        ys = self._entries.get(key)
+        if ys is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return ys
+
+    def put(self, key, ys, xs=()):
+        '''出力の配列の書き込み禁止のコピーを記憶する
+
+        入力とメモリを共有する出力を含む場合と、1つでmax_bytesを超える場合は記憶しない'''
+        ys = tuple(as_array(y) for y in ys)
+        nbytes = sum(y.nbytes for y in ys)
+        if nbytes > self.max_bytes or self.max_entries <= 0:
+            return
+        if any(np.may_share_memory(y, x) for y in ys for x in xs if isinstance(x, np.ndarray)):
+            return
+        # 呼び出し元は出力を書き換えるかもしれないので、記憶するのはコピー
+        ys = tuple(y.copy() for y in ys)
+        for y in ys:
+            y.flags.writeable = False
+        if key in self._entries:
+            self.nbytes -= sum(y.nbytes for y in self._entries.pop(key))
+        self._entries[key] = ys
+        self.nbytes += nbytes
+        # 古いものから上限に収まるまで破棄する
+        while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= sum(y.nbytes for y in old)
+            self.evictions += 1
+
+    def clear(self):
+        '記憶した結果を全て破棄する（カウンタはそのまま）'
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def wrap(self, model):
+        '''モデル（Layerや関数）全体の結果を記憶する関数を返却する
+
+        推論時は入力の内容が同じなら、モデルを呼ばずに前回の出力を返す。
+        パラメータはキーに含まれないので、パラメータを更新した時はclear()を呼ぶこと'''
+        # モデルの出力がタプルかどうか（最初に計算した時に決まる）
+        single = True
+
+        def cached(*inputs):
+            nonlocal single
+            if Configuration.enable_backdrop:
+                return model(*inputs)
+            xs = [x.data if isinstance(x, Variable) else x for x in inputs]
+            key = self.key(model, xs)
+            ys = self.get(key) if key is not None else None
+            if ys is not None:
+                outputs = [Variable(y) for y in ys]
+                return outputs[0] if single else tuple(outputs)
+            outputs = model(*inputs)
+            if key is not None:
+                single = not isinstance(outputs, (list, tuple))
+                ys = [outputs] if single else outputs
+                self.put(key, [y.data if isinstance(y, Variable) else y for y in ys], xs)
+            return outputs
+        return cached
+
+def using_cache(cache):
+    '''with文の中だけ推論キャッシュを有効にする。逆伝播を記録しない時（no_grad）だけ使われる
+
+    with using_cache(InferenceCache()), no_grad():
+        y = model(x)'''
+    return using_config('inference_cache', cache)
+
+def set_cache(cache):
+    '推論キャッシュを全体に設定する。Noneで解除する'
+    Configuration.inference_cache = cache
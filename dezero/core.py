@@ -8,12 +8,28 @@ class Configuration:
     '逆伝播を行うかの設定'
     # True:逆伝播を実施する（学習モード）、False:逆伝播は行わない（推論モード）
     enable_backdrop = True
+    # True:Variable/Functionの生存数と使用メモリを記録する（dezero.memory.traceで有効になる）
+    trace_memory = False
+    # 計算とグラフに保持する値の型の方針（dezero.mixed_precision.Policy）。Noneのときは入力の型のまま計算する
+    dtype_policy = None
+    # 関数の順伝播で使う配列モジュール（dezero.backend.get_array_moduleが返す）。既定はnumpy
+    array_module = np
+    # 推論時に同じ入力の計算結果を再利用するキャッシュ（dezero.cache.InferenceCache）。逆伝播を記録しない時だけ使われる
+    inference_cache = None
+    # True:学習時の動作、False:推論時の動作（batch_normの統計量などで使い分ける。test_modeで切り替える）
+    train = True
+    # 関数の出力を確保するメモリプール（dezero.pool.MemoryPool）。Noneのときは毎回numpyが確保する
+    memory_pool = None
+
+# register_hookで登録された、勾配が確定した時に呼ぶ関数（変数ごとのリスト）
+# 変数の属性にしないので、フックはpickleされず、変数が破棄されると一緒に消える
+_gradient_hooks = weakref.WeakKeyDictionary()
 
 class Variable:
     '変数を保持するクラス'
 
-    # 演算の優先順位
-    __array__priority__ = 200
+    # 演算の優先順位（__array_ufunc__を持つので、ndarrayとの演算でもVariable側の処理が使われる）
+    __array_priority__ = 200
 
     def __init__(self, data, name = None):
         '初期化を行う'
@@ -31,6 +47,25 @@ class Variable:
         self.generation = 0
         # 変数の名前
         self.name = name
+        # メモリ計測中の場合は変数を記録する
+        if Configuration.trace_memory:
+            dezero.memory.get_tracker().add_variable(self)
+
+    def __reduce_ex__(self, protocol):
+        '''pickleで保存する時に呼ばれる
+
+        生みの親を持つ変数は、その前の計算グラフを平坦なリストにして保存する（_flatten_graph）。
+        変数と関数を順に辿って保存すると、深いグラフでpickleの再帰の上限に達するため。
+        dataはndarrayのまま保存されるので、protocol 5ではbuffer_callbackで配列をコピーせずに受け渡せる'''
+        if self.creator is None:
+            return super().__reduce_ex__(protocol)
+        return _restore_graph, _flatten_graph(self)
+
+    def __setstate__(self, state):
+        'pickleから復元する時に呼ばれる'
+        self.__dict__.update(state)
+        if Configuration.trace_memory:
+            dezero.memory.get_tracker().add_variable(self)
 
     def __len__(self):
         '要素数を求める'
@@ -56,6 +91,10 @@ class Variable:
             # self.gradient = np.ones_like(self.data)
             self.gradient = Variable(np.ones_like(self.data))
 
+        # メモリ計測中の場合は逆伝播中の最大使用量を記録する
+        tracker = dezero.memory.get_tracker() if Configuration.trace_memory else None
+        if tracker is not None:
+            tracker.begin_backward()
         # 関数（生みの親）を取得しながら、世代の実行順を計算する
         funcs = [] # 世代順に並び替えられた生みの親のリスト
         seen_set = set() # 生みの親の重複を排除するための集合。集合の初期化にはset()を用いる。a = {}ってやると辞書になる
@@ -71,14 +110,32 @@ class Variable:
                 funcs.sort(key=lambda x: x.generation)
         # 今の出力（順伝播時の）の生みの親を設定する
         add_func(self.creator)
+        # フックが登録されている場合は、変数ごとに勾配を渡してくる関数（消費者）の数を数えておき、
+        # 全ての消費者の逆伝播が終わった時点（勾配が確定した時点）でフックを呼ぶ
+        pending = None
+        if _gradient_hooks:
+            pending = _count_consumers(self.creator)
+            self._call_hooks()
 
         # 生みの親に対して逆伝播を行う
         while funcs:
             # 生みの親を取得
             f = funcs.pop()
+            # unchain_backwardで入力を切り離された関数は逆伝播しない
+            if not f.inputs:
+                continue
             # 出力値を取得（逆伝播で見たら入力値）。outputsの要素は弱参照なのでoutput()じゃないとだめ
-            gys = [output().gradient for output in f.outputs]
-            with using_config('enable_backdrop', create_graph):
+            # 複数出力の関数では使われなかった出力が既に破棄されていることがあるので、その勾配はNoneとする
+            gys = []
+            for output in f.outputs:
+                y = output()
+                gy = y.gradient if y is not None else None
+                # 疎な勾配は途中の関数の逆伝播には渡せないので密な勾配に戻す
+                if isinstance(gy, SparseRowGradient):
+                    gy = Variable(gy.to_dense())
+                gys.append(gy)
+            # 逆伝播の計算は推論キャッシュの対象にしない
+            with using_config('enable_backdrop', create_graph), using_config('inference_cache', None):
                 # 逆伝播実施
                 gxs = f.backward(*gys)
                 # 上記の結果がタプルでない場合はタプルに変換する
@@ -90,20 +147,74 @@ class Variable:
                     # 関数への入力値に微分が設定されていない場合は微分を設定する
                     if x.gradient is None:
                         x.gradient = gx
+                    # 疎な勾配を足す場合は疎な勾配側で和を求める
+                    elif isinstance(gx, SparseRowGradient):
+                        x.gradient = gx + x.gradient
                     # 既に微分が設定されている場合は足算を行う
                     else:
                         x.gradient = x.gradient + gx
                     # 生みの親の入力にさらに生みの親が存在する場合は逆伝播対象として追加する
                     if x.creator is not None:
                         add_func(x.creator)
+            if pending is not None:
+                for x in f.inputs:
+                    pending[id(x)] -= 1
+                    if pending[id(x)] == 0:
+                        x._call_hooks()
             # retain_gradient = Falseのとき、中間の変数は微分を保持しない
             if not retain_gradient:
                 for y in f.outputs:
-                    y().gradient = None
+                    if y() is not None:
+                        y().gradient = None
+
+        if tracker is not None:
+            tracker.end_backward()
 
     def cleargradient(self):
         self.gradient = None
 
+    def register_hook(self, fn):
+        '''勾配が確定した時に呼ばれる関数fn(variable)を登録する
+
+        backwardの途中で、この変数に勾配を渡す全ての関数の逆伝播が終わった時点で呼ばれる。
+        入力やパラメータの変数では、fnの中で勾配を使い終わったらgradientをNoneにしてその場でメモリを解放してもよい'''
+        _gradient_hooks.setdefault(self, []).append(fn)
+        return fn
+
+    def remove_hook(self, fn):
+        'register_hookで登録した関数を取り除く'
+        hooks = _gradient_hooks.get(self, [])
+        hooks.remove(fn)
+        if not hooks:
+            del _gradient_hooks[self]
+
+    def _call_hooks(self):
+        for hook in list(_gradient_hooks.get(self, ())):
+            hook(self)
+
+    def unchain(self):
+        '生みの親との繋がりを切る'
+        self.creator = None
+
+    def unchain_backward(self):
+        '''この変数より前の計算グラフを切り離す
+
+        再帰を使わずに生みの親を辿るので、深いグラフでも再帰の上限に達しない。
+        関数が保持している入力も手放すため、切り離した部分のメモリはその場で解放される'''
+        if self.creator is None:
+            return
+        funcs = [self.creator]
+        self.unchain()
+        while funcs:
+            f = funcs.pop()
+            for x in f.inputs:
+                # unchainで生みの親を消してから追加するので、同じ関数を2回辿ることはない
+                if x.creator is not None:
+                    funcs.append(x.creator)
+                    x.unchain()
+            # 入力への参照を手放す
+            f.inputs = []
+
     def reshape(self, *shape):
         if len(shape) == 1 and isinstance(shape[0], (list, tuple)):
             shape = shape[0]
@@ -115,6 +226,37 @@ class Variable:
     def sum(self, axis=None, keepdims=False):
         return dezero.functions.sum(self, axis, keepdims)
 
+    def mean(self, axis=None, keepdims=False):
+        return dezero.functions.mean(self, axis, keepdims)
+
+    def max(self, axis=None, keepdims=False):
+        return dezero.functions.max(self, axis, keepdims)
+
+    def min(self, axis=None, keepdims=False):
+        return dezero.functions.min(self, axis, keepdims)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        '''numpyのufunc（np.add, np.sinなど）にVariableが渡された時に呼ばれる
+
+        対応するdezeroの関数がある場合はそれで計算し、計算グラフを作る。
+        対応していない場合はno_gradの中でndarrayに対して計算し、結果をVariableで返却する'''
+        if method == '__call__' and not kwargs:
+            func = _array_ufuncs().get(ufunc)
+            if func is not None:
+                result = func(*inputs)
+                if result is not NotImplemented:
+                    return result
+        return _numpy_fallback(getattr(ufunc, method), inputs, kwargs)
+
+    def __array_function__(self, func, types, args, kwargs):
+        'numpyの関数（np.sum, np.concatenateなど）にVariableが渡された時に呼ばれる'
+        handler = _array_functions().get(func)
+        if handler is not None:
+            result = handler(*args, **kwargs)
+            if result is not NotImplemented:
+                return result
+        return _numpy_fallback(func, args, kwargs)
+
     @property
     def shape(self):
         '''形状
@@ -147,8 +289,65 @@ class Variable:
 
         return dezero.functions.transpose(self)
 
+class Parameter(Variable):
+    '学習で更新されるパラメータ。Variableと同じ機能を持つが、Layerが区別して管理する'
+    pass
+
+class SparseRowGradient:
+    '''行単位の疎な勾配
+
+    埋め込み表のように、大きなパラメータの一部の行だけに勾配がある場合に使う。
+    勾配が0でない行の番号（indices）とその値（values）のみを保持し、表全体の大きさの勾配は作らない。
+    同じ行が複数回現れてもよく、その場合は和が勾配になる'''
+
+    def __init__(self, indices, values, shape):
+        # 行番号（1次元の整数配列）。負の番号（-1は最後の行）は同じ行の番号とみなせるよう0以上にそろえる
+        if indices.size and indices.min() < 0:
+            indices = indices % shape[0]
+        self.indices = indices
+        # 各行の勾配。形状は(len(indices),) + shape[1:]
+        self.values = values
+        # 密な勾配にした時の形状
+        self.shape = shape
+
+    def __repr__(self):
+        return 'sparse_row_gradient(rows={}, shape={})'.format(len(self.indices), self.shape)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.values.nbytes
+
+    def coalesce(self):
+        '同じ行の勾配をまとめ、行番号を重複なしの昇順にする'
+        indices, values = dezero.utils.sum_rows(self.indices, self.values)
+        return SparseRowGradient(indices, values, self.shape)
+
+    def to_dense(self):
+        '密な勾配（ndarray）に変換する'
+        g = self.coalesce()
+        gx = np.zeros(self.shape, dtype=self.dtype)
+        gx[g.indices] = g.values
+        return gx
+
+    def __add__(self, other):
+        if isinstance(other, SparseRowGradient):
+            # 疎な勾配同士の和は行を連結するだけ
+            return SparseRowGradient(np.concatenate((self.indices, other.indices)),
+                                     np.concatenate((self.values, other.values)), self.shape)
+        # 密な勾配との和は密な勾配になる
+        return other + Variable(self.to_dense())
+
+    __radd__ = __add__
+
 class Function:
     '関数の親クラス'
+    # 同じ入力なら同じ出力を返し、内部の状態も変えない関数か。Falseの関数は推論キャッシュの対象にしない
+    cacheable = True
+
     def __call__(self, *inputs):
         '''
         __call__はPythonの特殊メソッド
@@ -158,11 +357,27 @@ class Function:
         inputs = [as_variable(x) for x in inputs]
         # 入力値を全て取り出し配列に保持する
         xs = [x.data for x in inputs]
-        # 入力された値を用いて計算を行う
-        ys = self.forward(*xs)
-        # 上の返却値がタプルではない時はタプルに変換する
-        if not isinstance(ys, tuple):
-            ys = (ys,)
+        # 型の方針が設定されている場合は浮動小数点の入力を計算用の型に変換する
+        policy = Configuration.dtype_policy
+        if policy is not None:
+            xs = [policy.to_compute(x) for x in xs]
+        # 推論キャッシュが設定されていて逆伝播を記録しない時は、同じ入力の計算結果を再利用する
+        cache = Configuration.inference_cache
+        key = None
+        if cache is not None and not Configuration.enable_backdrop:
+            key = cache.key(self, xs)
+        ys = cache.get(key) if key is not None else None
+        if ys is None:
+            # 入力された値を用いて計算を行う
+            ys = self.forward(*xs)
+            # 上の返却値がタプルではない時はタプルに変換する
+            if not isinstance(ys, tuple):
+                ys = (ys,)
+            if key is not None:
+                cache.put(key, ys, xs)
+        # 逆伝播のためにグラフに保持される出力は保存用の型に変換する
+        if policy is not None and Configuration.enable_backdrop:
+            ys = tuple(policy.to_storage(y) for y in ys)
         # 出力値をVariable型への変換。スカラ値を考慮しながら（as_arrayにて）出力値を設定する
         outputs = [Variable(as_array(y)) for y in ys]
         # メモリの効率的使用のため、逆伝播の利用に応じて変数の設定を行う
@@ -179,6 +394,9 @@ class Function:
             # 弱参照とは参照カウントを増やさずに参照を行う機能（CPythonの場合）
             # 参照カウントはメモリ管理に使われる数字で格オブジェクトに割り振られる。参照カウントが1から0になったときにそのオブジェクトを削除しメモリを開放する
             self.outputs = [weakref.ref(output) for output in outputs]
+            # メモリ計測中の場合は関数を記録する
+            if Configuration.trace_memory:
+                dezero.memory.get_tracker().add_function(self)
         # 計算結果を返却する。返却値のタプルのサイズが1より大きくない場合は最初の要素のみ返却する
         return outputs if len(outputs) > 1 else outputs[0]
 
@@ -196,57 +414,164 @@ class Function:
         '''
         raise NotImplementedError()
 
-class Add(Function):
-    def forward(self, x0, x1):
+def _count_consumers(func):
+    'funcより前の計算グラフで、変数ごとにその変数を入力とする関数の数（同じ関数の重複を含む）を数える'
+    counts = {}
+    seen = {func}
+    stack = [func]
+    while stack:
+        f = stack.pop()
+        for x in f.inputs:
+            counts[id(x)] = counts.get(id(x), 0) + 1
+            if x.creator is not None and x.creator not in seen:
+                seen.add(x.creator)
+                stack.append(x.creator)
+    return counts
+
+# =============================================================================
+# Pickle support
+# =============================================================================
+def _dead_output():
+    '復元時に破棄済みだった出力を表す。弱参照と同じく呼び出すとNoneを返す'
+    return None
+
+def _flatten_graph(root):
+    '''rootより前の計算グラフを(途中の変数の状態のリスト, 関数のリスト, rootの番号)に変換する
+
+    生みの親を持つ変数（途中の変数）は番号で表し、持たない変数（入力やパラメータ）はそのまま保存する。
+    関数は世代の昇順に並べるので、復元の時には関数の入力が必ず先に作られている。
+    途中の変数はpickleの中で共有されないので、1つのpickleに同じグラフの変数を複数入れると別々のグラフとして復元される'''
+    funcs = []
+    seen = {root.creator}
+    stack = [root.creator]
+    while stack:
+        f = stack.pop()
+        funcs.append(f)
+        for x in f.inputs:
+            if x.creator is not None and x.creator not in seen:
+                seen.add(x.creator)
+                stack.append(x.creator)
+    funcs.sort(key=lambda f: f.generation)
+
+    index = {}
+    variables = []
+    functions = []
+    for f in funcs:
+        inputs = [x if x.creator is None else index[id(x)] for x in f.inputs]
+        outputs = []
+        for output in f.outputs:
+            y = output()
+            if y is None:
+                outputs.append(None)
+                continue
+            index[id(y)] = len(variables)
+            outputs.append(len(variables))
+            state = y.__dict__.copy()
+            del state['creator']
+            variables.append(state)
+        state = {k: v for k, v in f.__dict__.items() if k not in ('inputs', 'outputs')}
+        functions.append((type(f), state, inputs, outputs))
+    return variables, functions, index[id(root)]
+
+def _restore_graph(variables, functions, root):
+    '_flatten_graphで変換した計算グラフを復元し、rootの変数を返却する'
+    vs = []
+    for state in variables:
+        v = Variable.__new__(Variable)
+        v.__setstate__(dict(state, creator=None))
+        vs.append(v)
+    for cls, state, inputs, outputs in functions:
+        f = cls.__new__(cls)
+        f.__dict__.update(state)
+        f.inputs = [vs[x] if isinstance(x, int) else x for x in inputs]
+        f.outputs = [_dead_output if i is None else weakref.ref(vs[i]) for i in outputs]
+        for i in outputs:
+            if i is not None:
+                vs[i].creator = f
+        if Configuration.trace_memory:
+            dezero.memory.get_tracker().add_function(f)
+    # 他の関数の入力にもrootにもなっていない途中の変数は、ここで破棄される
+    return vs[root]
+
+class BinaryFunction(Function):
+    '''ブロードキャストを伴う2項演算の親クラス
+
+    順伝播の時に入力の形状から勾配を縮約する軸（ブロードキャストの計画）を求めておき、
+    逆伝播ではその軸でsumを1回呼ぶだけにする。計画はutils.broadcast_planで形状の組ごとにキャッシュされる'''
+
+    def _record_shapes(self, x0, x1):
         self.x0_shape, self.x1_shape = x0.shape, x1.shape
-        y = x0 + x1
+        if x0.shape == x1.shape:
+            self.plan = None
+        else:
+            self.plan = dezero.utils.broadcast_plan(x0.shape, x1.shape)
+
+    def _sum_to(self, gx0, gx1):
+        '勾配をそれぞれの入力の形状に縮約する'
+        if self.plan is not None:
+            axis0, axis1 = self.plan
+            if axis0 is not None:
+                gx0 = dezero.functions.sum_to(gx0, self.x0_shape, axis0)
+            if axis1 is not None:
+                gx1 = dezero.functions.sum_to(gx1, self.x1_shape, axis1)
+        return gx0, gx1
+
+class Add(BinaryFunction):
+    def forward(self, x0, x1):
+        self._record_shapes(x0, x1)
+        xp = dezero.backend.get_array_module(x0, x1)
+        y = xp.add(x0, x1, out=dezero.pool.out(x0, x1))
         return y
 
     def backward(self, gy):
-        gx0, gx1 = gy, gy
-        if self.x0_shape != self.x1_shape:
-            gx0 = dezero.functions.sum_to(gx0, self.x0_shape)
-            gx1 = dezero.functions.sum_to(gx0, self.x1_shape)
-        return gx0, gx1
+        return self._sum_to(gy, gy)
 
-class Mul(Function):
+class Mul(BinaryFunction):
     def forward(self, x0, x1):
-        return x0 * x1
+        self._record_shapes(x0, x1)
+        xp = dezero.backend.get_array_module(x0, x1)
+        return xp.multiply(x0, x1, out=dezero.pool.out(x0, x1))
     
     def backward(self, gy):
         x0, x1 = self.inputs
-        return x1 * gy, x0 * gy
+        return self._sum_to(x1 * gy, x0 * gy)
 
 class Neg(Function):
     def forward(self, x):
-        return -x
+        xp = dezero.backend.get_array_module(x)
+        return xp.negative(x, out=dezero.pool.out(x))
     
     def backward(self, gy):
         return -gy
 
-class Sub(Function):
+class Sub(BinaryFunction):
     def forward(self, x0, x1):
-        return x0 - x1
+        self._record_shapes(x0, x1)
+        xp = dezero.backend.get_array_module(x0, x1)
+        return xp.subtract(x0, x1, out=dezero.pool.out(x0, x1))
     
     def backward(self, gy):
-        return gy, -gy
+        return self._sum_to(gy, -gy)
 
-class Div(Function):
+class Div(BinaryFunction):
     def forward(self, x0, x1):
-        return x0 / x1
+        self._record_shapes(x0, x1)
+        xp = dezero.backend.get_array_module(x0, x1)
+        return xp.true_divide(x0, x1, out=dezero.pool.out(x0, x1, floating=True))
     
     def backward(self, gy):
         x0, x1 = self.inputs
         gx0 = gy / x1
         gx1 = gy * (-x0 / x1 ** 2)
-        return gx0, gx1
+        return self._sum_to(gx0, gx1)
 
 class Pow(Function):
     def __init__(self, c):
         self.c = c
 
     def forward(self, x):
-        return x ** self.c
+        xp = dezero.backend.get_array_module(x)
+        return xp.power(x, self.c, out=dezero.pool.out(x, self.c))
     
     def backward(self, gy):
         x = self.inputs[0]
@@ -266,38 +591,204 @@ def using_config(name, value):
 def no_grad():
     return using_config('enable_backdrop', False)
 
-def as_array(x):
+def test_mode():
+    return using_config('train', False)
+
+def as_array(x, dtype=None):
     if np.isscalar(x):
-        return np.array(x)
+        return np.array(x, dtype=dtype)
     return x
 
+def _scalar_dtype(x):
+    '''スカラの相手に合わせる型。浮動小数点のVariableの時はその型、それ以外はNone
+
+    x * 2.0のようなスカラがfloat64の配列になり、float32の計算がfloat64に変わってしまうのを防ぐ'''
+    if x.data.dtype.kind == 'f':
+        return x.data.dtype
+    return None
+
+def to_storage(x):
+    '''関数が逆伝播のために保持する配列（出力以外）を、型の方針の保存用の型にする
+
+    Function.__call__が出力に行う変換と同じ。型の方針がない時と逆伝播を記録しない時はそのまま'''
+    policy = Configuration.dtype_policy
+    if policy is None or not Configuration.enable_backdrop:
+        return x
+    return policy.to_storage(x)
+
 def as_variable(obj):
     if isinstance(obj, Variable):
         return obj
     return Variable(np.array(obj))
 
+# =============================================================================
+# NumPy interop
+# =============================================================================
+def _unwrap(obj):
+    'Variableをndarrayに置き換える（リストとタプルの中も置き換える）'
+    if isinstance(obj, Variable):
+        return obj.data
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_unwrap(x) for x in obj)
+    return obj
+
+def _numpy_fallback(func, args, kwargs):
+    '''dezeroの関数がないnumpyの処理はndarrayで計算する
+
+    計算グラフは作らず、ndarrayの結果はVariableにして返却する。out=にVariableが指定された場合はそのVariableを返却する'''
+    with no_grad():
+        result = func(*_unwrap(args), **{k: _unwrap(v) for k, v in kwargs.items()})
+    out = kwargs.get('out')
+    if out is not None:
+        return out[0] if isinstance(out, tuple) and len(out) == 1 else out
+    if isinstance(result, np.ndarray):
+        return Variable(result)
+    if isinstance(result, (list, tuple)) and all(isinstance(r, np.ndarray) for r in result):
+        return type(result)(Variable(r) for r in result)
+    return result
+
+def _as_operand(x, other):
+    '''ufuncの入力をdezeroの関数に渡せる形にする。スカラは相手のVariableの型に合わせる
+
+    ndarrayはas_variableのようにnp.arrayでコピーせず、そのままVariableで包む'''
+    if isinstance(x, Variable):
+        return x
+    if np.isscalar(x):
+        x = as_array(x, _scalar_dtype(other) if isinstance(other, Variable) else None)
+    return Variable(np.asarray(x))
+
+def _binary(cls):
+    def f(x0, x1):
+        return cls()(_as_operand(x0, x1), _as_operand(x1, x0))
+    return f
+
+def _power(x, c):
+    # 指数が定数の場合のみ対応する
+    if isinstance(x, Variable) and np.isscalar(c):
+        return Pow(c)(x)
+    return NotImplemented
+
+def _matmul(a, b):
+    '''np.matmul, np.dotをF.matmulで計算する
+
+    F.matmulは2次元どうしの行列積なので、1次元の入力は行列に直してから計算し、結果の形状を戻す。
+    3次元以上（バッチの行列積）とスカラはNotImplemented（numpyでそのまま計算する）'''
+    F = dezero.functions
+    da, db = np.ndim(a), np.ndim(b)
+    if da not in (1, 2) or db not in (1, 2):
+        return NotImplemented
+    if da == 2 and db == 2:
+        return F.matmul(a, b)
+    shape = a.shape[:1] if da == 2 else ()
+    shape += b.shape[1:] if db == 2 else ()
+    a = F.reshape(a, (1, a.shape[0])) if da == 1 else a
+    b = F.reshape(b, (b.shape[0], 1)) if db == 1 else b
+    return F.reshape(F.matmul(a, b), shape)
+
+# numpyの関数で、指定されたらdezeroの関数では計算できない引数の既定値（どの値とも一致しない）
+_REJECT = object()
+
+def _only(func, names, nargs=1, **defaults):
+    '''引数がdezeroの関数で扱える場合だけdezeroの関数で計算する
+
+    names: numpyの関数の引数の名前（位置引数の順番）。先頭のnargs個は位置引数、残りは名前付きでfuncに渡す
+    defaults: funcにない引数と、その引数で受け付ける値（_REJECTは値によらず受け付けない）。
+    namesにない引数、受け付けない値、多すぎる位置引数の時はNotImplemented（numpyでそのまま計算する）'''
+    def f(*args, **kwargs):
+        if len(args) > len(names):
+            return NotImplemented
+        bound = dict(zip(names, args))
+        for k, v in kwargs.items():
+            if k not in names or k in bound:
+                return NotImplemented
+            bound[k] = v
+        for k, d in defaults.items():
+            if k in bound:
+                v = bound.pop(k)
+                if not (v is d or (type(v) is type(d) and v == d)):
+                    return NotImplemented
+        if any(n not in bound for n in names[:nargs]):
+            return NotImplemented
+        return func(*[bound.pop(n) for n in names[:nargs]], **bound)
+    return f
+
+_ufunc_table = None
+_function_table = None
+# np.max, np.minの引数
+_extrema = ('a', 'axis', 'out', 'keepdims', 'initial', 'where')
+
+def _array_ufuncs():
+    'ufuncと、それに対応するdezeroの関数の表'
+    global _ufunc_table
+    if _ufunc_table is None:
+        F = dezero.functions
+        _ufunc_table = {
+            np.add: _binary(Add),
+            np.subtract: _binary(Sub),
+            np.multiply: _binary(Mul),
+            np.true_divide: _binary(Div),
+            np.negative: neg,
+            np.power: _power,
+            np.square: lambda x: Pow(2)(x),
+            np.sqrt: lambda x: Pow(0.5)(x),
+            np.sin: F.sin,
+            np.cos: F.cos,
+            np.tanh: F.tanh,
+            np.exp: F.exp,
+            np.log: F.log,
+            np.matmul: _matmul,
+        }
+    return _ufunc_table
+
+def _array_functions():
+    'numpyの関数と、それに対応するdezeroの関数の表'
+    global _function_table
+    if _function_table is None:
+        F = dezero.functions
+        _function_table = {
+            np.sum: _only(F.sum, ('a', 'axis', 'dtype', 'out', 'keepdims', 'initial', 'where'),
+                          dtype=None, out=None, initial=_REJECT, where=True),
+            np.mean: _only(F.mean, ('a', 'axis', 'dtype', 'out', 'keepdims', 'where'),
+                           dtype=None, out=None, where=True),
+            np.max: _only(F.max, _extrema, out=None, initial=_REJECT, where=True),
+            np.amax: _only(F.max, _extrema, out=None, initial=_REJECT, where=True),
+            np.min: _only(F.min, _extrema, out=None, initial=_REJECT, where=True),
+            np.amin: _only(F.min, _extrema, out=None, initial=_REJECT, where=True),
+            np.reshape: _only(lambda a, shape: F.reshape(a, tuple(np.atleast_1d(shape))), ('a', 'shape', 'order', 'copy'),
+                              nargs=2, order='C', copy=None),
+            np.transpose: _only(F.transpose, ('a', 'axes'), axes=None),
+            np.dot: _only(_matmul, ('a', 'b', 'out'), nargs=2, out=None),
+            np.broadcast_to: _only(lambda array, shape: F.broadcast_to(array, tuple(np.atleast_1d(shape))),
+                                   ('array', 'shape', 'subok'), nargs=2, subok=False),
+            np.concatenate: _only(lambda arrays, axis=0: F.concat(arrays, axis),
+                                  ('arrays', 'axis', 'out', 'dtype', 'casting'), out=None, dtype=None, casting='same_kind'),
+            np.split: _only(lambda ary, indices_or_sections, axis=0: list(F.split(ary, indices_or_sections, axis)),
+                            ('ary', 'indices_or_sections', 'axis'), nargs=2),
+        }
+    return _function_table
+
 def add(x0, x1):
-    x1 = as_array(x1)
+    x1 = as_array(x1, _scalar_dtype(x0))
     return Add()(x0, x1)
 
 def mul(x0, x1):
-    x1 = as_array(x1)
+    x1 = as_array(x1, _scalar_dtype(x0))
     return Mul()(x0, x1)
 
 def sub(x0, x1):
-    x1 = as_array(x1)
+    x1 = as_array(x1, _scalar_dtype(x0))
     return Sub()(x0, x1)
 
 def rsub(x0, x1):
-    x1 = as_array(x1)
+    x1 = as_array(x1, _scalar_dtype(x0))
     return Sub()(x1, x0)
 
 def div(x0, x1):
-    x1 = as_array(x1)
+    x1 = as_array(x1, _scalar_dtype(x0))
     return Div()(x0, x1)
 
 def rdiv(x0, x1):
-    x1 = as_array(x1)
+    x1 = as_array(x1, _scalar_dtype(x0))
     return Div()(x1, x0)
 
 def pow(x, c):
@@ -317,6 +808,7 @@ def setup_variable():
     Variable.__truediv__ = div
     Variable.__rtruediv__ = rdiv
     Variable.__pow__ = pow
+    Variable.__getitem__ = dezero.functions.get_item
 
 
 # Stage3
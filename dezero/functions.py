@@ -1,12 +1,20 @@
+import threading
 from dezero import utils
+from dezero import backend
+from dezero import pool
 import numpy as np
 from numpy.core.fromnumeric import reshape
+from dezero.core import Configuration
 from dezero.core import Function
+from dezero.core import Variable
+from dezero.core import SparseRowGradient
 from dezero.core import as_variable 
+from dezero.core import to_storage
 
 class Sin(Function):
     def forward(self, x):
-        return np.sin(x)
+        xp = backend.get_array_module(x)
+        return xp.sin(x, out=pool.out(x, floating=True))
     
     def backward(self, gy):
         x = self.inputs[0]
@@ -17,7 +25,8 @@ def sin(x):
 
 class Cos(Function):
     def forward(self, x):
-        return np.cos(x)
+        xp = backend.get_array_module(x)
+        return xp.cos(x, out=pool.out(x, floating=True))
     
     def backward(self, gy):
         x = self.inputs[0]
@@ -28,7 +37,8 @@ def cos(x):
 
 class Tanh(Function):
     def forward(self, x):
-        return np.tanh(x)
+        xp = backend.get_array_module(x)
+        return xp.tanh(x, out=pool.out(x, floating=True))
     
     def backward(self, gy):
         return (1 - self.outputs[0]() ** 2) * gy
@@ -36,6 +46,164 @@ class Tanh(Function):
 def tanh(x):
     return Tanh()(x)
 
+class Exp(Function):
+    def forward(self, x):
+        xp = backend.get_array_module(x)
+        return xp.exp(x, out=pool.out(x, floating=True))
+
+    def backward(self, gy):
+        y = self.outputs[0]()
+        return gy * y
+
+def exp(x):
+    return Exp()(x)
+
+class Log(Function):
+    def forward(self, x):
+        xp = backend.get_array_module(x)
+        return xp.log(x, out=pool.out(x, floating=True))
+
+    def backward(self, gy):
+        x, = self.inputs
+        return gy / x
+
+def log(x):
+    return Log()(x)
+
+# =============================================================================
+# Activation
+# =============================================================================
+# 順伝播はnumpyの関数をout=に書き込む形で実装し、融合した全結合層（LinearActivation）と共有する。
+# inplace=Trueを指定すると、逆伝播を記録していない時（推論時）だけ入力の配列に結果を上書きする
+def _activation_out(x, inplace, floating=True):
+    '''活性化関数の出力先
+
+    inplaceで推論時なら入力の配列そのもの。書き込み禁止の配列（推論キャッシュの結果など）、
+    numpyの配列でないもの、浮動小数点数でないものは上書きせずに新しく確保する'''
+    if (inplace and not Configuration.enable_backdrop and type(x) is np.ndarray
+            and x.flags.writeable and x.dtype.kind == 'f'):
+        return x
+    return pool.out(x, floating=floating)
+
+def _empty_float(x):
+    '途中の計算に使う配列（0次元の入力でもスカラではなく配列にする）'
+    return np.empty(np.shape(x), dtype=np.result_type(x, 1.0))
+
+def _sigmoid(x, out=None):
+    # 1 / (1 + exp(-x))はxが大きな負の値の時にオーバーフローするのでtanhで計算する
+    y = np.multiply(x, 0.5, out=_empty_float(x) if out is None else out)
+    np.tanh(y, out=y)
+    y *= 0.5
+    y += 0.5
+    return y
+
+def _relu(x, out=None):
+    return np.maximum(x, 0, out=out)
+
+# GELUはtanhによる近似式（numpyには誤差関数がないため）
+_GELU_C = np.sqrt(2 / np.pi)
+
+def _gelu(x, out=None):
+    t = np.multiply(x, x, out=_empty_float(x))
+    t *= 0.044715 * x
+    t += x
+    t *= _GELU_C
+    np.tanh(t, out=t)
+    t += 1
+    t *= 0.5
+    return np.multiply(x, t, out=out)
+
+def _gelu_grad(x):
+    x2 = x * x
+    t = np.tanh(_GELU_C * (x + 0.044715 * x2 * x))
+    return 0.5 * (1 + t) + 0.5 * x * (1 - t * t) * _GELU_C * (1 + 3 * 0.044715 * x2)
+
+def _softplus(x, out=None):
+    # log(1 + exp(x)) = max(x, 0) + log(1 + exp(-|x|))。オーバーフローせず、np.logaddexpより速い
+    m = np.maximum(x, 0)
+    y = np.abs(x, out=_empty_float(x) if out is None else out)
+    np.negative(y, out=y)
+    np.exp(y, out=y)
+    np.log1p(y, out=y)
+    y += m
+    return y
+
+class ReLU(Function):
+    def __init__(self, inplace=False):
+        self.inplace = inplace
+
+    def forward(self, x):
+        return _relu(x, out=_activation_out(x, self.inplace, floating=False))
+
+    def backward(self, gy):
+        x, = self.inputs
+        return gy * (x.data > 0)
+
+def relu(x, inplace=False):
+    return ReLU(inplace)(x)
+
+class Sigmoid(Function):
+    def __init__(self, inplace=False):
+        self.inplace = inplace
+
+    def forward(self, x):
+        return _sigmoid(x, out=_activation_out(x, self.inplace))
+
+    def backward(self, gy):
+        y = self.outputs[0]()
+        return gy * y * (1 - y)
+
+def sigmoid(x, inplace=False):
+    return Sigmoid(inplace)(x)
+
+class LeakyReLU(Function):
+    def __init__(self, slope=0.2, inplace=False):
+        self.slope = slope
+        self.inplace = inplace
+
+    def forward(self, x):
+        out = _activation_out(x, self.inplace, floating=False)
+        if out is x:
+            np.multiply(x, self.slope, out=x, where=x < 0)
+            return x
+        return np.where(x > 0, x, x * self.slope)
+
+    def backward(self, gy):
+        x, = self.inputs
+        return gy * np.where(x.data > 0, 1, self.slope).astype(x.dtype)
+
+def leaky_relu(x, slope=0.2, inplace=False):
+    return LeakyReLU(slope, inplace)(x)
+
+class GELU(Function):
+    def __init__(self, inplace=False):
+        self.inplace = inplace
+
+    def forward(self, x):
+        return _gelu(x, out=_activation_out(x, self.inplace))
+
+    def backward(self, gy):
+        # 導関数はnumpyで直接求めるので、create_graph=Trueによる高階微分には対応しない
+        x, = self.inputs
+        return gy * _gelu_grad(x.data)
+
+def gelu(x, inplace=False):
+    return GELU(inplace)(x)
+
+class Softplus(Function):
+    def __init__(self, inplace=False):
+        self.inplace = inplace
+
+    def forward(self, x):
+        return _softplus(x, out=_activation_out(x, self.inplace))
+
+    def backward(self, gy):
+        x, = self.inputs
+        return gy * sigmoid(x)
+
+def softplus(x, inplace=False):
+    return Softplus(inplace)(x)
+
 class Reshape(Function):
     def __init__(self, shape) :
         self.shape = shape
@@ -71,23 +239,72 @@ class Sum(Function):
 
     def forward(self, x):
         self.x_shape = x.shape
-        y = x.sum(axis=self.axis, keepdims=self.keepdims)
+        xp = backend.get_array_module(x)
+        y = xp.sum(x, axis=self.axis, keepdims=self.keepdims)
         return y
 
     def backward(self, gy):
-        gy = utils.reshape_sum_backward(gy, self.shape, self.axis, self.keepdims)
-        gx = np.broadcast_to(gy, self.x_shape)
+        gy = utils.reshape_sum_backward(gy, self.x_shape, self.axis, self.keepdims)
+        gx = broadcast_to(gy, self.x_shape)
         return gx
 
 def sum(x, axis=None, keepdims=False):
     return Sum(axis, keepdims)(x)
 
+class Mean(Sum):
+    def forward(self, x):
+        self.x_shape = x.shape
+        xp = backend.get_array_module(x)
+        y = xp.mean(x, axis=self.axis, keepdims=self.keepdims)
+        return y
+
+    def backward(self, gy):
+        gy = utils.reshape_sum_backward(gy, self.x_shape, self.axis, self.keepdims)
+        # 縮約前の小さい形状のまま割ってから、ビューとしてブロードキャストする
+        scale = np.array(gy.size / np.prod(self.x_shape), dtype=gy.dtype)
+        gx = broadcast_to(gy * scale, self.x_shape)
+        return gx
+
+def mean(x, axis=None, keepdims=False):
+    return Mean(axis, keepdims)(x)
+
+class Max(Function):
+    def __init__(self, axis=None, keepdims=False):
+        self.axis = axis
+        self.keepdims = keepdims
+
+    def forward(self, x):
+        y = x.max(axis=self.axis, keepdims=self.keepdims)
+        return y
+
+    def backward(self, gy):
+        x = self.inputs[0]
+        y = self.outputs[0]()
+        shape = tuple(utils.max_backward_shape(x, self.axis))
+        # yとgyは縮約した軸を1にしたビューにして、xとの比較と掛け算はブロードキャストで行う
+        # （gyをxの形状に展開したコピーは作らない）
+        cond = x.data == y.data.reshape(shape)
+        gx = reshape(gy, shape) * cond
+        return gx
+
+def max(x, axis=None, keepdims=False):
+    return Max(axis, keepdims)(x)
+
+class Min(Max):
+    def forward(self, x):
+        y = x.min(axis=self.axis, keepdims=self.keepdims)
+        return y
+
+def min(x, axis=None, keepdims=False):
+    return Min(axis, keepdims)(x)
+
 class BroadcastTo(Function):
     def __init__(self, shape):
         self.shape = shape
 
     def forward(self, x):
         self.x_shape = x.shape
+        # ビューを返すので、np.memmapの入力でもメモリ上にコピーは作られない
         y = np.broadcast_to(x, self.shape)
         return y
 
@@ -101,19 +318,684 @@ def broadcast_to(x, shape):
     return BroadcastTo(shape)(x) 
 
 class SumTo(Function):
-    def __init__(self, shape):
+    def __init__(self, shape, axis=None):
         self.shape = shape
+        self.axis = axis
 
     def forward(self, x):
         self.x_shape = x.shape
-        y = utils.sum_to(x, self.shape)
+        y = utils.sum_to(x, self.shape, self.axis)
         return y
 
     def backward(self, gy):
         gx = broadcast_to(gy, self.x_shape)
         return gx
 
-def sum_to(x, shape):
+def sum_to(x, shape, axis=None):
     if x.shape == shape:
         return as_variable(x)
-    return SumTo(shape)(x)
\ No newline at end of file
+    return SumTo(shape, axis)(x)
+
+# =============================================================================
+# Indexing / concat / split
+# =============================================================================
+class GetItem(Function):
+    def __init__(self, slices):
+        self.slices = slices
+
+    def forward(self, x):
+        # スライスなどの基本的なインデックスではnumpyがビューを返すのでコピーは発生しない
+        y = x[self.slices]
+        return y
+
+    def backward(self, gy):
+        x, = self.inputs
+        f = GetItemGrad(self.slices, x.shape)
+        return f(gy)
+
+class GetItemGrad(Function):
+    def __init__(self, slices, in_shape):
+        self.slices = slices
+        self.in_shape = in_shape
+
+    def forward(self, gy):
+        gx = np.zeros(self.in_shape, dtype=gy.dtype)
+        slices = self.slices
+        if _is_basic_index(slices):
+            # 基本的なインデックスでは同じ要素を2回指すことはないので代入で済む
+            gx[slices] = gy
+        elif isinstance(slices, (list, np.ndarray)) and np.asarray(slices).dtype.kind in 'iu':
+            # 先頭の軸に対する整数配列は、並べ替えてから同じ行をまとめて足し込む
+            index = np.asarray(slices).ravel() % self.in_shape[0]
+            index, rows = utils.sum_rows(index, gy.reshape((index.size,) + self.in_shape[1:]))
+            gx[index] = rows
+        else:
+            np.add.at(gx, slices, gy)
+        return gx
+
+    def backward(self, ggx):
+        return get_item(ggx, self.slices)
+
+def _is_basic_index(slices):
+    '整数、スライス、None、Ellipsisだけからなるインデックスかどうか'
+    if not isinstance(slices, tuple):
+        slices = (slices,)
+    return all(s is None or s is Ellipsis or isinstance(s, (int, np.integer, slice)) for s in slices)
+
+def get_item(x, slices):
+    return GetItem(slices)(x)
+
+class Concat(Function):
+    def __init__(self, axis=0):
+        self.axis = axis
+
+    def forward(self, *xs):
+        y = np.concatenate(xs, axis=self.axis)
+        return y
+
+    def backward(self, gy):
+        # 勾配は連結した勾配のビューとして切り出す
+        indices = np.cumsum([x.shape[self.axis] for x in self.inputs[:-1]])
+        gxs = split(gy, indices, self.axis)
+        return gxs if isinstance(gxs, tuple) else (gxs,)
+
+def concat(xs, axis=0):
+    return Concat(axis)(*xs)
+
+class Split(Function):
+    def __init__(self, indices_or_sections, axis=0):
+        self.indices_or_sections = indices_or_sections
+        self.axis = axis
+
+    def forward(self, x):
+        # np.splitは入力のビューを返す
+        ys = np.split(x, self.indices_or_sections, axis=self.axis)
+        self.sizes = [y.shape[self.axis] for y in ys]
+        return tuple(ys)
+
+    def backward(self, *gys):
+        # 使われなかった出力の勾配は0とし、1回のconcatで1つの勾配配列に書き込む
+        gxs = []
+        for size, gy in zip(self.sizes, gys):
+            if gy is None:
+                shape = list(self.inputs[0].shape)
+                shape[self.axis] = size
+                gy = np.zeros(shape, dtype=self.inputs[0].dtype)
+            gxs.append(gy)
+        return concat(gxs, self.axis)
+
+def split(x, indices_or_sections, axis=0):
+    ys = Split(indices_or_sections, axis)(x)
+    return tuple(ys) if isinstance(ys, list) else ys
+
+class Embedding(Function):
+    def forward(self, W, x):
+        y = W[x]
+        return y
+
+    def backward(self, gy):
+        W, x = self.inputs
+        # 参照された行の勾配だけを持つ疎な勾配を返す（idの勾配は求めない）
+        indices = x.data.ravel()
+        values = gy.data.reshape((indices.size,) + W.shape[1:])
+        return SparseRowGradient(indices, values, W.shape)
+
+def embedding(x, W):
+    return Embedding()(W, x)
+
+def _dot(xp, x, W):
+    '行列積。2次元どうしの時はメモリプールが有効なら出力をプールから取り出す'
+    out = pool.out(x, W, shape=(x.shape[0], W.shape[1])) if x.ndim == 2 and W.ndim == 2 else None
+    return xp.dot(x, W) if out is None else xp.dot(x, W, out=out)
+
+class MatMul(Function):
+    def forward(self, x, W):
+        xp = backend.get_array_module(x, W)
+        y = _dot(xp, x, W)
+        return y
+
+    def backward(self, gy):
+        x, W = self.inputs
+        gx = matmul(gy, W.T)
+        gW = matmul(x.T, gy)
+        return gx, gW
+
+def matmul(x, W):
+    return MatMul()(x, W)
+
+class Linear(Function):
+    def forward(self, x, W, b=None):
+        xp = backend.get_array_module(x, W)
+        y = _dot(xp, x, W)
+        if b is not None:
+            y += b
+        return y
+
+    def backward(self, gy):
+        x, W = self.inputs[:2]
+        gx = matmul(gy, W.T)
+        gW = matmul(x.T, gy)
+        if len(self.inputs) == 2:
+            return gx, gW
+        gb = sum_to(gy, self.inputs[2].shape)
+        return gx, gW, gb
+
+# 融合できる活性化関数。順伝播と、活性化前の値zと出力yから求める導関数。
+# 導関数がyだけで決まるものはzを保持せず、行列積の出力にそのまま活性化関数を上書きする
+_FUSED_ACTIVATIONS = {
+    'relu': (_relu, lambda z, y: y > 0, False),
+    'sigmoid': (_sigmoid, lambda z, y: y * (1 - y), False),
+    'tanh': (lambda z, out=None: np.tanh(z, out=out), lambda z, y: 1 - y * y, False),
+    'gelu': (_gelu, lambda z, y: _gelu_grad(z), True),
+    'softplus': (_softplus, lambda z, y: _sigmoid(z), True),
+}
+
+class LinearActivation(Function):
+    '''全結合層と活性化関数を1つのノードで計算する
+
+    逆伝播は解析的に求めるので、create_graph=Trueによる高階微分には対応しない'''
+
+    def __init__(self, activation):
+        if activation not in _FUSED_ACTIVATIONS:
+            raise ValueError('unsupported activation: {}'.format(activation))
+        self.activation = activation
+
+    def forward(self, x, W, b=None):
+        xp = backend.get_array_module(x, W)
+        z = _dot(xp, x, W)
+        if b is not None:
+            z += b
+        activate, _, keep_z = _FUSED_ACTIVATIONS[self.activation]
+        if keep_z:
+            self.z = to_storage(z)
+            return activate(z, out=pool.out(z, floating=True))
+        self.z = None
+        return activate(z, out=z)
+
+    def backward(self, gy):
+        x, W = self.inputs[:2]
+        y = self.outputs[0]().data
+        gz = gy.data * _FUSED_ACTIVATIONS[self.activation][1](self.z, y)
+        gx = gz.dot(W.data.T)
+        gW = x.data.T.dot(gz)
+        if len(self.inputs) == 2:
+            return Variable(gx), Variable(gW)
+        gb = gz.sum(axis=0)
+        return Variable(gx), Variable(gW), Variable(gb)
+
+def linear(x, W, b=None, activation=None):
+    '''activation: 続けて計算する活性化関数の名前（'relu', 'sigmoid', 'tanh', 'gelu', 'softplus'）。
+    指定した時は全結合層と活性化関数を1つのノード（LinearActivation）で計算する'''
+    f = Linear() if activation is None else LinearActivation(activation)
+    if b is None:
+        return f(x, W)
+    return f(x, W, b)
+
+# =============================================================================
+# Recurrent cells
+# =============================================================================
+# 入力xと隠れ状態hを横に連結し、全てのゲートを1回の行列積で計算する。
+# Wの形状は(入力サイズ + 隠れ状態サイズ, ゲート数 * 隠れ状態サイズ)。
+# 1ステップを1つの関数（計算グラフの1ノード）として扱い、逆伝播は解析的に求める。
+# そのためcreate_graph=Trueによる高階微分には対応しない。
+class RNNCell(Function):
+    def forward(self, x, h, W, b):
+        xh = np.concatenate((x, h), axis=1)
+        h_new = np.tanh(xh.dot(W) + b)
+        return h_new
+
+    def backward(self, gh):
+        x, h, W, b = self.inputs
+        h_new = self.outputs[0]().data
+        xh = np.concatenate((x.data, h.data), axis=1)
+        gz = gh.data * (1 - h_new ** 2)
+        gxh = gz.dot(W.data.T)
+        gW = xh.T.dot(gz)
+        gb = gz.sum(axis=0)
+        in_size = x.shape[1]
+        return Variable(gxh[:, :in_size]), Variable(gxh[:, in_size:]), Variable(gW), Variable(gb)
+
+def rnn_cell(x, h, W, b):
+    return RNNCell()(x, h, W, b)
+
+class LSTMCell(Function):
+    def forward(self, x, h, c, W, b):
+        xh = np.concatenate((x, h), axis=1)
+        z = xh.dot(W)
+        z += b
+        H = h.shape[1]
+        # ゲートの順番は input, forget, output, 候補値
+        gates = _sigmoid(z[:, :3 * H])
+        g = np.tanh(z[:, 3 * H:])
+        i, f, o = gates[:, :H], gates[:, H:2 * H], gates[:, 2 * H:]
+        c_new = f * c + i * g
+        tc = np.tanh(c_new)
+        h_new = o * tc
+        # 逆伝播のために活性化後のゲートとtanh(c_new)のみ保持する
+        self.gates, self.g, self.tc = to_storage(gates), to_storage(g), to_storage(tc)
+        return h_new, c_new
+
+    def backward(self, gh, gc):
+        x, h, c, W, b = self.inputs
+        H = h.shape[1]
+        # 保持した値は保存用の型（float16など）のことがあるので、勾配の型に戻して計算する
+        dtype = (gh if gh is not None else gc).dtype
+        gates, g, tc = [a.astype(dtype, copy=False) for a in (self.gates, self.g, self.tc)]
+        i, f, o = gates[:, :H], gates[:, H:2 * H], gates[:, 2 * H:]
+
+        dc = np.zeros_like(tc) if gc is None else gc.data.copy()
+        if gh is not None:
+            dc += gh.data * o * (1 - tc ** 2)
+            do = gh.data * tc
+        else:
+            do = np.zeros_like(tc)
+
+        gz = np.empty((h.shape[0], 4 * H), dtype=tc.dtype)
+        gz[:, :H] = dc * g
+        gz[:, H:2 * H] = dc * c.data
+        gz[:, 2 * H:3 * H] = do
+        gz[:, :3 * H] *= gates * (1 - gates)
+        np.multiply(dc * i, 1 - g ** 2, out=gz[:, 3 * H:])
+
+        xh = np.concatenate((x.data, h.data), axis=1)
+        gxh = gz.dot(W.data.T)
+        gW = xh.T.dot(gz)
+        gb = gz.sum(axis=0)
+        in_size = x.shape[1]
+        return (Variable(gxh[:, :in_size]), Variable(gxh[:, in_size:]), Variable(dc * f),
+                Variable(gW), Variable(gb))
+
+def lstm_cell(x, h, c, W, b):
+    return LSTMCell()(x, h, c, W, b)
+
+# =============================================================================
+# Convolution / pooling
+# =============================================================================
+# 窓の切り出しはutils.im2col_arrayのストライド付きビュー（コピーなし）で行い、
+# 畳み込みは1回のtensordot（行列積）で計算する。ピクセル単位のPythonループは使わない。
+class Conv2d(Function):
+    def __init__(self, stride=1, pad=0):
+        self.stride = utils.pair(stride)
+        self.pad = utils.pair(pad)
+
+    def forward(self, x, W, b=None):
+        KH, KW = W.shape[2:]
+        col = utils.im2col_array(x, (KH, KW), self.stride, self.pad)
+        y = np.tensordot(col, W, ((1, 4, 5), (1, 2, 3)))
+        if b is not None:
+            y += b
+        y = np.rollaxis(y, 3, 1)
+        return y
+
+    def backward(self, gy):
+        x, W = self.inputs[:2]
+        KH, KW = W.shape[2:]
+        gy = gy.data
+        # 窓はforwardと同じビューを作り直すので、逆伝播のために展開した配列を保持しておく必要はない
+        col = utils.im2col_array(x.data, (KH, KW), self.stride, self.pad)
+        gW = np.tensordot(gy, col, ((0, 2, 3), (0, 2, 3)))
+        gcol = np.tensordot(W.data, gy, (0, 1)).transpose(3, 0, 4, 5, 1, 2)
+        gx = utils.col2im_array(gcol, x.shape, (KH, KW), self.stride, self.pad)
+        if len(self.inputs) == 2:
+            return Variable(gx), Variable(gW)
+        gb = gy.sum(axis=(0, 2, 3))
+        return Variable(gx), Variable(gW), Variable(gb)
+
+def conv2d(x, W, b=None, stride=1, pad=0):
+    if b is None:
+        return Conv2d(stride, pad)(x, W)
+    return Conv2d(stride, pad)(x, W, b)
+
+class MaxPooling(Function):
+    def __init__(self, kernel_size, stride=1, pad=0):
+        self.kernel_size = utils.pair(kernel_size)
+        self.stride = utils.pair(stride)
+        self.pad = utils.pair(pad)
+
+    def forward(self, x):
+        self.x_shape = x.shape
+        # パディングは最大値に選ばれない値にする（整数の配列には-infを入れられないのでその型の最小値）
+        pad_value = np.iinfo(x.dtype).min if x.dtype.kind in 'iu' else -np.inf
+        col = utils.im2col_array(x, self.kernel_size, self.stride, self.pad, pad_value=pad_value)
+        N, C, OH, OW, KH, KW = col.shape
+        col = col.reshape(N, C, OH, OW, KH * KW)
+        # 逆伝播では最大値の位置のみ使うので、窓全体ではなく位置だけを保持する
+        self.indexes = col.argmax(axis=4)
+        y = np.take_along_axis(col, self.indexes[..., np.newaxis], axis=4)
+        return y[..., 0]
+
+    def backward(self, gy):
+        KH, KW = self.kernel_size
+        N, C, OH, OW = gy.shape
+        gcol = np.zeros((N, C, OH, OW, KH * KW), dtype=gy.dtype)
+        np.put_along_axis(gcol, self.indexes[..., np.newaxis], gy.data[..., np.newaxis], axis=4)
+        gcol = gcol.reshape(N, C, OH, OW, KH, KW)
+        gx = utils.col2im_array(gcol, self.x_shape, self.kernel_size, self.stride, self.pad)
+        return Variable(gx)
+
+def max_pooling(x, kernel_size, stride=1, pad=0):
+    return MaxPooling(kernel_size, stride, pad)(x)
+
+class AveragePooling(Function):
+    def __init__(self, kernel_size, stride=1, pad=0):
+        self.kernel_size = utils.pair(kernel_size)
+        self.stride = utils.pair(stride)
+        self.pad = utils.pair(pad)
+
+    def forward(self, x):
+        self.x_shape = x.shape
+        col = utils.im2col_array(x, self.kernel_size, self.stride, self.pad)
+        y = col.mean(axis=(4, 5))
+        return y
+
+    def backward(self, gy):
+        KH, KW = self.kernel_size
+        g = gy.data / (KH * KW)
+        # 各窓に同じ値を配るだけなので、ブロードキャストしたビューをそのまま渡す
+        gcol = np.broadcast_to(g[..., np.newaxis, np.newaxis], g.shape + (KH, KW))
+        gx = utils.col2im_array(gcol, self.x_shape, self.kernel_size, self.stride, self.pad)
+        return Variable(gx)
+
+def average_pooling(x, kernel_size, stride=1, pad=0):
+    return AveragePooling(kernel_size, stride, pad)(x)
+
+# =============================================================================
+# Dropout
+# =============================================================================
+# マスクの元になる乱数は、numpyのGeneratorで1回の呼び出しでまとめて作る。
+# 乱数と比較結果を書き込む配列はスレッドごとに使い回し、逆伝播用のマスクは1要素1ビットに詰めて保持する。
+# Generatorは複数のスレッドから同時に使えないので、省略時のGeneratorもスレッドごとに作る
+_local = threading.local()
+
+def _generator():
+    '現在のスレッドで共有するGenerator'
+    rng = getattr(_local, 'rng', None)
+    if rng is None:
+        rng = _local.rng = np.random.default_rng()
+    return rng
+
+def _keep_mask(size, ratio, rng):
+    '''要素をratioの確率で落とすマスク（残す要素がTrue）
+
+    返却する配列はスレッドごとに使い回すバッファのビューなので、同じスレッドの次の呼び出しで上書きされる'''
+    uniform = getattr(_local, 'uniform', None)
+    if uniform is None or uniform.size < size:
+        uniform = _local.uniform = np.empty(size, dtype=np.float32)
+        _local.keep = np.empty(size, dtype=bool)
+    r = uniform[:size]
+    rng.random(dtype=np.float32, out=r)
+    return np.greater_equal(r, ratio, out=_local.keep[:size])
+
+class Dropout(Function):
+    # 呼ぶたびにマスクが変わるので推論キャッシュの対象にしない
+    cacheable = False
+
+    def __init__(self, ratio=0.5, rng=None):
+        if not 0 <= ratio < 1:
+            raise ValueError('ratio must be in [0, 1): {}'.format(ratio))
+        self.ratio = ratio
+        self.rng = _generator() if rng is None else rng
+
+    def forward(self, x):
+        keep = _keep_mask(x.size, self.ratio, self.rng).reshape(x.shape)
+        # 整数の入力は浮動小数点数にしてから掛ける。残した要素は1 / (1 - ratio)倍して期待値を保つ
+        y = np.multiply(x, keep, out=pool.out(x, floating=True), dtype=np.result_type(x, 1.0))
+        y *= 1 / (1 - self.ratio)
+        self.mask = np.packbits(keep)
+        return y
+
+    def backward(self, gy):
+        gy = gy.data
+        keep = np.unpackbits(self.mask, count=gy.size).reshape(gy.shape)
+        gx = gy * keep
+        gx *= 1 / (1 - self.ratio)
+        return Variable(gx)
+
+def dropout(x, ratio=0.5, rng=None):
+    '''学習時（Configuration.train）はratioの確率で要素を0にする
+
+    推論時（test_mode）は何もせず、ノードも作らずに入力のVariableをそのまま返却する
+    rng: マスクを作るnumpyのGenerator。省略時はスレッドごとに共有するもの'''
+    if not Configuration.train:
+        return as_variable(x)
+    return Dropout(ratio, rng)(x)
+
+# =============================================================================
+# Normalization
+# =============================================================================
+# チャネルの軸は1。それ以外の軸（バッチと空間方向）で平均と分散を求める。
+# 平均と分散は和と二乗和を1回ずつ求めて計算し（二乗した配列は作らない）、
+# 桁落ちを抑えるため和はfloat64で取る。逆伝播は保持した正規化後の値から解析的に求める
+def _channel_stats(x):
+    'チャネルごとの平均と分散（ともにfloat64、形状(C,)）'
+    axes = (0,) + tuple(range(2, x.ndim))
+    n = x.size // x.shape[1]
+    subscripts = 'abcdefgh'[:x.ndim]
+    total = x.sum(axis=axes, dtype=np.float64)
+    squares = np.einsum('{0},{0}->b'.format(subscripts), x, x, dtype=np.float64)
+    mean = total / n
+    var = np.maximum(squares / n - mean ** 2, 0)
+    return mean, var
+
+class BatchNorm(Function):
+    '''バッチ正規化
+
+    学習時（Configuration.train）はバッチの統計量で正規化し、移動平均mean, varをその場で更新する。
+    推論時は移動平均で正規化する'''
+
+    def __init__(self, mean, var, decay=0.9, eps=2e-5):
+        self.avg_mean = mean
+        self.avg_var = var
+        self.decay = decay
+        self.eps = eps
+        self.train = Configuration.train
+
+    @property
+    def cacheable(self):
+        # 学習時は移動平均を更新するので推論キャッシュの対象にしない
+        return not self.train
+
+    def forward(self, x, gamma, beta):
+        shape = (1, -1) + (1,) * (x.ndim - 2)
+        if self.train:
+            mean, var = _channel_stats(x)
+            n = x.size // x.shape[1]
+            adjust = n / (n - 1) if n > 1 else 1.0
+            self.avg_mean *= self.decay
+            self.avg_mean += (1 - self.decay) * mean
+            self.avg_var *= self.decay
+            self.avg_var += (1 - self.decay) * adjust * var
+        else:
+            mean, var = self.avg_mean, self.avg_var
+        inv_std = 1 / np.sqrt(var + self.eps)
+        xhat = x - mean.reshape(shape).astype(x.dtype)
+        xhat *= inv_std.reshape(shape).astype(x.dtype)
+        # 逆伝播のために正規化後の値とチャネルごとの1/標準偏差のみ保持する
+        self.xhat, self.inv_std = to_storage(xhat), inv_std.astype(x.dtype)
+        return gamma.reshape(shape) * xhat + beta.reshape(shape)
+
+    def backward(self, gy):
+        gamma = self.inputs[1].data
+        gy = gy.data
+        shape = (1, -1) + (1,) * (gy.ndim - 2)
+        axes = (0,) + tuple(range(2, gy.ndim))
+        gbeta = gy.sum(axis=axes)
+        ggamma = (self.xhat * gy).sum(axis=axes)
+        scale = (gamma * self.inv_std).reshape(shape)
+        if self.train:
+            n = gy.size // gy.shape[1]
+            gx = gy - (gbeta / n).reshape(shape)
+            gx -= self.xhat * (ggamma / n).reshape(shape)
+            gx *= scale
+        else:
+            # 推論時の統計量は定数なので、要素ごとの拡大縮小の逆伝播になる
+            gx = gy * scale
+        return Variable(gx), Variable(ggamma), Variable(gbeta)
+
+def batch_norm(x, gamma, beta, mean, var, decay=0.9, eps=2e-5):
+    '''x: 形状(N, C)または(N, C, H, W)などの入力
+    gamma, beta: 形状(C,)の拡大率と平行移動
+    mean, var: 形状(C,)の移動平均（ndarray）。学習時はその場で更新される'''
+    return BatchNorm(mean, var, decay, eps)(x, gamma, beta)
+
+# =============================================================================
+# Softmax / loss
+# =============================================================================
+class Softmax(Function):
+    def __init__(self, axis=1):
+        self.axis = axis
+
+    def forward(self, x):
+        y = x - x.max(axis=self.axis, keepdims=True)
+        np.exp(y, out=y)
+        y /= y.sum(axis=self.axis, keepdims=True)
+        return y
+
+    def backward(self, gy):
+        y = self.outputs[0]().data
+        gx = y * gy.data
+        sumdx = gx.sum(axis=self.axis, keepdims=True)
+        gx -= y * sumdx
+        return Variable(gx)
+
+def softmax(x, axis=1):
+    return Softmax(axis)(x)
+
+class LogSoftmax(Function):
+    def __init__(self, axis=1):
+        self.axis = axis
+
+    def forward(self, x):
+        log_z = utils.logsumexp(x, self.axis)
+        y = x - log_z
+        return y
+
+    def backward(self, gy):
+        y = self.outputs[0]().data
+        gx = np.exp(y)
+        gx *= -gy.data.sum(axis=self.axis, keepdims=True)
+        gx += gy.data
+        return Variable(gx)
+
+def log_softmax(x, axis=1):
+    return LogSoftmax(axis)(x)
+
+class SoftmaxCrossEntropy(Function):
+    def forward(self, x, t):
+        N = x.shape[0]
+        # 逆伝播で確率を作り直せるよう、保持するのは行ごとのlogsumexp（N, 1）のみ
+        self.log_z = utils.logsumexp(x, axis=1)
+        log_p = x[np.arange(N), t.ravel()] - self.log_z.ravel()
+        y = -log_p.sum() / N
+        return y
+
+    def backward(self, gy):
+        x, t = self.inputs
+        N = x.shape[0]
+        gx = x.data - self.log_z
+        np.exp(gx, out=gx)
+        gx[np.arange(N), t.data.ravel()] -= 1
+        gx *= gy.data / N
+        return Variable(gx)
+
+def softmax_cross_entropy(x, t):
+    return SoftmaxCrossEntropy()(x, t)
+
+# 回帰と二値分類の損失は1つのノードで計算し、逆伝播は保持した最小限の値から解析的に求める。
+# いずれも全要素の和をバッチサイズ（先頭の軸の長さ）で割った値を返す
+def _batch_size(x):
+    return len(x) if x.ndim > 0 else 1
+
+def _check_shapes(x0, x1):
+    '損失の2つの入力は同じ形状であること（ブロードキャストすると損失も勾配の形状も変わってしまう）'
+    if x0.shape != x1.shape:
+        raise ValueError('shape mismatch: {} and {}'.format(x0.shape, x1.shape))
+
+class MeanSquaredError(Function):
+    def forward(self, x0, x1):
+        _check_shapes(x0, x1)
+        diff = x0 - x1
+        self.diff = to_storage(diff)
+        flat = diff.ravel()
+        return np.asarray(np.dot(flat, flat) / _batch_size(diff))
+
+    def backward(self, gy):
+        gx0 = self.diff * (gy.data * 2 / _batch_size(self.diff))
+        return Variable(gx0), Variable(-gx0)
+
+def mean_squared_error(x0, x1):
+    return MeanSquaredError()(x0, x1)
+
+class MeanAbsoluteError(Function):
+    def forward(self, x0, x1):
+        _check_shapes(x0, x1)
+        diff = x0 - x1
+        # 逆伝播には符号だけあればよいのでint8で保持する
+        self.sign = np.sign(diff).astype(np.int8)
+        self.dtype = diff.dtype
+        return np.asarray(np.abs(diff, out=diff).sum() / _batch_size(diff))
+
+    def backward(self, gy):
+        gx0 = self.sign * (gy.data / _batch_size(self.sign))
+        gx0 = gx0.astype(self.dtype, copy=False)
+        return Variable(gx0), Variable(-gx0)
+
+def mean_absolute_error(x0, x1):
+    return MeanAbsoluteError()(x0, x1)
+
+class HuberLoss(Function):
+    def __init__(self, delta=1.0):
+        self.delta = delta
+
+    def forward(self, x0, x1):
+        _check_shapes(x0, x1)
+        diff = x0 - x1
+        # 差をdeltaで切り詰めた値cを使うと、損失は|c| * (|diff| - |c| / 2)、勾配はcになる
+        clipped = np.clip(diff, -self.delta, self.delta)
+        np.abs(diff, out=diff)
+        diff -= 0.5 * np.abs(clipped)
+        diff *= np.abs(clipped)
+        self.clipped = to_storage(clipped)
+        return np.asarray(diff.sum() / _batch_size(diff))
+
+    def backward(self, gy):
+        gx0 = self.clipped * (gy.data / _batch_size(self.clipped))
+        return Variable(gx0), Variable(-gx0)
+
+def huber_loss(x0, x1, delta=1.0):
+    return HuberLoss(delta)(x0, x1)
+
+class BinaryCrossEntropy(Function):
+    def __init__(self, from_logits=False, eps=1e-7):
+        self.from_logits = from_logits
+        self.eps = eps
+
+    def forward(self, x, t):
+        _check_shapes(x, t)
+        if self.from_logits:
+            # log(1 + exp(x)) - t * xをオーバーフローしない形で計算する
+            loss = _softplus(x)
+            loss -= t * x
+        else:
+            p = np.clip(x, self.eps, 1 - self.eps)
+            loss = np.log1p(-p)
+            loss *= t - 1
+            loss -= t * np.log(p)
+        return np.asarray(loss.sum() / _batch_size(x))
+
+    def backward(self, gy):
+        x, t = self.inputs
+        x, t = x.data, t.data
+        if self.from_logits:
+            gx = _sigmoid(x)
+            gx -= t
+        else:
+            p = np.clip(x, self.eps, 1 - self.eps)
+            gx = (p - t) / (p * (1 - p))
+        gx *= gy.data / _batch_size(x)
+        return Variable(gx)
+
+def binary_cross_entropy(x, t, from_logits=False):
+    '''x: 確率（from_logits=Trueの時はシグモイド関数を通す前の値）
+    t: 0か1のラベル（xと同じ形状）。tへの勾配は求めない'''
+    return BinaryCrossEntropy(from_logits)(x, t)
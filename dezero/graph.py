@@ -0,0 +1,231 @@
+from collections import OrderedDict
+import numpy as np
+import dezero.memory
+from dezero.core import Configuration
+from dezero.core import Parameter
+from dezero.core import Variable
+from dezero.core import as_array
+from dezero.cache import _value_key
+from dezero.pool import _Recorded
+
+class Graph:
+    '''関数を1回実行して記録した計算グラフ
+
+    記録した関数（ノード）を世代順に並べて保持し、別の入力の値で順伝播をやり直せる（__call__）。
+    やり直しではVariableとFunctionを作り直さないので、出力は毎回同じVariableで、そのままbackwardできる。
+    やり直しにもFunction.__call__と同じく型の方針（dtype_policy）とメモリ計測が効く。
+    推論キャッシュは逆伝播を記録しない時だけのものなので使わない（static()はその時fをそのまま実行する）。
+    型の方針がない時は、pool.out()で出力を確保する関数（四則演算、sin、exp、matmulなど）の途中の変数の配列を
+    out=でそのまま上書きする。入力、定数、パラメータのどれかの形状か型が記録した時と違う時は上書きしない。
+    optimize()で同じ計算の重複と定数だけの計算を取り除ける
+
+    graph = trace(f, x)
+    y = graph(x_new)
+    y.backward()'''
+
+    def __init__(self, inputs, outputs):
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        # 最後に順伝播した時の型の方針（記録した時と、やり直しの時）
+        self._last_policy = Configuration.dtype_policy
+        self._collect()
+
+    def _collect(self):
+        '出力から生みの親を辿ってノードを集め、世代順に並べる'
+        funcs, seen = [], set()
+        stack = [y.creator for y in self.outputs if y.creator is not None]
+        while stack:
+            f = stack.pop()
+            if f in seen or not f.inputs:
+                continue
+            seen.add(f)
+            funcs.append(f)
+            stack.extend(x.creator for x in f.inputs if x.creator is not None)
+        funcs.sort(key=lambda f: f.generation)
+        self.nodes = funcs
+        # 出力は弱参照なので、途中の変数はグラフが保持しておく
+        self._variables = [y() for f in funcs for y in f.outputs if y() is not None]
+        # やり直しで勾配をリセットする変数と、各ノードの（関数, 入力, 出力, 上書きする配列）はここで決めておく
+        self._resets = [v for v in self.variables() if not isinstance(v, Parameter)]
+        # 配列を上書きしてよいかは、生みの親を持たない変数の形状と型が記録した時と同じかで決める
+        self._leaves = [v for v in self.variables() if v.creator is None]
+        self._signature = [(v.data.shape, v.data.dtype) for v in self._leaves]
+        # 上書きする配列は型の方針を使わずに計算したものだけにする（方針があると計算用と保存用の型が違う）
+        self._array_policy = self._last_policy
+        # グラフの出力の配列は呼び出し側が持っているかもしれないので、それとメモリを共有する配列
+        # （出力がtransposeやreshapeで作ったビューの時の元の配列）は上書きしない。
+        # 他の配列のビューや読み取り専用の配列、入力と同じ配列にも書き込まない
+        held = [y.data for y in self.outputs if isinstance(y.data, np.ndarray)]
+        self._steps = []
+        for f in funcs:
+            outputs = [y() for y in f.outputs]
+            y = outputs[0].data if len(outputs) == 1 else None
+            if not (type(y) is np.ndarray and y.base is None and y.flags.writeable
+                    and all(y is not x.data for x in f.inputs)
+                    and not any(np.may_share_memory(y, h) for h in held)):
+                y = None
+            self._steps.append((f, f.inputs, outputs, y))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def variables(self):
+        'グラフに含まれる全ての変数（入力、定数、途中の変数）'
+        seen = {}
+        for f in self.nodes:
+            for x in f.inputs:
+                seen.setdefault(id(x), x)
+        for y in self._variables:
+            seen.setdefault(id(y), y)
+        return list(seen.values())
+
+    def __call__(self, *xs):
+        '''入力の値を入れ替えて順伝播をやり直す
+
+        パラメータ（Parameter）以外の変数の勾配はリセットする'''
+        for v, x in zip(self.inputs, xs):
+            v.data = x.data if isinstance(x, Variable) else as_array(x)
+        for v in self._resets:
+            v.gradient = None
+        policy = Configuration.dtype_policy
+        tracker = dezero.memory.get_tracker() if Configuration.trace_memory else None
+        pool = Configuration.memory_pool
+        recorded = None
+        if (policy is None and self._array_policy is None
+                and [(v.data.shape, v.data.dtype) for v in self._leaves] == self._signature):
+            recorded = _Recorded(pool)
+        try:
+            for f, inputs, outputs, array in self._steps:
+                xs = [x.data for x in inputs]
+                if policy is not None:
+                    xs = [policy.to_compute(x) for x in xs]
+                if array is not None and recorded is not None:
+                    recorded.array = array
+                    Configuration.memory_pool = recorded
+                    ys = f.forward(*xs)
+                    recorded.array = None
+                    Configuration.memory_pool = pool
+                else:
+                    ys = f.forward(*xs)
+                if not isinstance(ys, tuple):
+                    ys = (ys,)
+                if policy is not None:
+                    ys = tuple(policy.to_storage(y) for y in ys)
+                for output, y in zip(outputs, ys):
+                    if output is not None:
+                        output.data = as_array(y)
+                        if tracker is not None:
+                            tracker.add_variable(output)
+                if tracker is not None:
+                    tracker.add_function(f)
+        finally:
+            Configuration.memory_pool = pool
+        self._last_policy = policy
+        return self.outputs[0] if len(self.outputs) == 1 else self.outputs
+
+    def _is_constant(self, x, input_ids):
+        '入力でもパラメータでもない、生みの親を持たない変数は定数として扱う'
+        return x.creator is None and id(x) not in input_ids and not isinstance(x, Parameter)
+
+    def optimize(self):
+        '''グラフからノードを取り除く
+
+        定数の畳み込み: 入力が全て定数のノードは、出力をその値の定数にして取り除く
+        共通部分式の削除: 同じ関数・同じパラメータ・同じ入力のノードは最初の1つにまとめる（内容が同じ定数は同じ入力とみなす）
+        微分する変数はグラフの入力かParameterであること。それ以外の生みの親を持たない変数は定数として扱う
+        return: ノード数と取り除いたノード数'''
+        before = len(self.nodes)
+        input_ids = {id(x) for x in self.inputs}
+        # 置き換える変数（idから置き換え先）。元の変数はself._variablesが保持しているのでidは再利用されない
+        replace = {}
+        constants = {}
+        seen = {}
+        folded = merged = 0
+
+        def canonical(x):
+            x = replace.get(id(x), x)
+            if self._is_constant(x, input_ids):
+                try:
+                    x = constants.setdefault(_value_key(x.data), x)
+                except TypeError:
+                    pass
+            return x
+
+        for f in self.nodes:
+            f.inputs = [canonical(x) for x in f.inputs]
+            outputs = [y() for y in f.outputs]
+            if all(self._is_constant(x, input_ids) for x in f.inputs):
+                for y in outputs:
+                    if y is not None:
+                        y.unchain()
+                folded += 1
+                continue
+            try:
+                params = {k: v for k, v in f.__dict__.items() if k not in ('inputs', 'outputs', 'generation')}
+                key = type(f), _value_key(tuple(sorted(params.items()))), tuple(id(x) for x in f.inputs)
+            except TypeError:
+                key = f
+            other = seen.get(key)
+            if other is not None:
+                others = [y() for y in other.outputs]
+                if all(o is not None for y, o in zip(outputs, others) if y is not None):
+                    for y, o in zip(outputs, others):
+                        if y is not None:
+                            replace[id(y)] = o
+                    merged += 1
+                    continue
+            seen.setdefault(key, f)
+
+        self.outputs = [replace.get(id(y), y) for y in self.outputs]
+        self._collect()
+        return {
+            'nodes_before': before,
+            'nodes_after': len(self.nodes),
+            'folded': folded,
+            'merged': merged,
+        }
+
+def trace(f, *xs):
+    '''f(*xs)を1回実行して計算グラフを記録する
+
+    xs: 入力の値。グラフの入力となるVariableに包まれてfに渡される'''
+    inputs = [x if isinstance(x, Variable) else Variable(as_array(x)) for x in xs]
+    outputs = f(*inputs)
+    if not isinstance(outputs, (list, tuple)):
+        outputs = [outputs]
+    return Graph(inputs, outputs)
+
+def static(f, max_graphs=8):
+    '''fを静的なグラフとして実行する関数を作る
+
+    最初の呼び出しでグラフを記録し、以降は入力の形状と型が同じならその記録をやり直す（Graph.__call__）。
+    FunctionとVariableを毎回作らないので、学習のループで1回ごとの生成とガベージコレクションの負担がなくなる。
+    形状か型が変わった時は記録し直し、max_graphs個まで古い順に捨てながら保持する。
+    記録した時の処理の流れに固定されるので、fの中で値によって分岐したり乱数を引いたりしないこと。
+    逆伝播を記録しない時（no_grad）は毎回fをそのまま実行する（推論キャッシュはこの時に使われる）
+
+    step = static(lambda x, t: F.sum((model(x) - t) ** 2))
+    loss = step(x, t)
+    model.cleargradients()
+    loss.backward()
+
+    入力の勾配は記録したグラフの入力（step.graphs[key].inputs）に入る'''
+    graphs = OrderedDict()
+
+    def run(*xs):
+        if not Configuration.enable_backdrop:
+            return f(*xs)
+        arrays = [x.data if isinstance(x, Variable) else as_array(x) for x in xs]
+        key = tuple((x.shape, x.dtype.str) for x in arrays)
+        g = graphs.get(key)
+        if g is None:
+            g = graphs[key] = trace(f, *arrays)
+            if len(graphs) > max_graphs:
+                graphs.popitem(last=False)
+            outputs = g.outputs
+            return outputs[0] if len(outputs) == 1 else outputs
+        graphs.move_to_end(key)
+        return g(*arrays)
+
+    run.graphs = graphs
+    return run
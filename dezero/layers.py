@@ -0,0 +1,170 @@
+import numpy as np
+import dezero.functions as F
+from dezero.core import Parameter
+
+class Layer:
+    'パラメータを保持する層の親クラス'
+
+    def __init__(self):
+        # パラメータ（または子の層）を保持しているインスタンス変数の名前。順番を保つためリストで持つ
+        self._params = []
+
+    def __setattr__(self, name, value):
+        'ParameterとLayerのインスタンス変数は名前を記録しておく'
+        if isinstance(value, (Parameter, Layer)) and name not in self._params:
+            self._params.append(name)
+        super().__setattr__(name, value)
+
+    def __call__(self, *inputs):
+        outputs = self.forward(*inputs)
+        return outputs
+
+    def forward(self, *inputs):
+        '順伝播の計算。子クラスで実装する'
+        raise NotImplementedError()
+
+    def params(self):
+        '層が持つパラメータを順番に取り出す（子の層のパラメータも含む）'
+        for name in self._params:
+            obj = self.__dict__[name]
+            if isinstance(obj, Layer):
+                yield from obj.params()
+            else:
+                yield obj
+
+    def cleargradients(self):
+        '全てのパラメータの勾配をリセットする'
+        for param in self.params():
+            param.cleargradient()
+
+    def reset_state(self):
+        '子の層が持つ状態（RNNの隠れ状態など）をリセットする'
+        for name in self._params:
+            obj = self.__dict__[name]
+            if isinstance(obj, Layer):
+                obj.reset_state()
+
+class Linear(Layer):
+    '全結合層'
+
+    def __init__(self, out_size, nobias=False, dtype=np.float32, in_size=None, activation=None):
+        super().__init__()
+        self.in_size = in_size
+        self.out_size = out_size
+        self.dtype = dtype
+        # 続けて計算する活性化関数の名前（F.linearを参照）。Noneの時は全結合のみ
+        self.activation = activation
+
+        # in_sizeが指定されていない時は最初の入力に合わせて重みを初期化する
+        self.W = Parameter(None, name='W')
+        if self.in_size is not None:
+            self._init_W()
+
+        if nobias:
+            self.b = None
+        else:
+            self.b = Parameter(np.zeros(out_size, dtype=dtype), name='b')
+
+    def _init_W(self):
+        I, O = self.in_size, self.out_size
+        self.W.data = (np.random.randn(I, O) * np.sqrt(1 / I)).astype(self.dtype)
+
+    def forward(self, x):
+        if self.W.data is None:
+            self.in_size = x.shape[1]
+            self._init_W()
+        return F.linear(x, self.W, self.b, self.activation)
+
+class BatchNorm(Layer):
+    '''バッチ正規化層
+
+    拡大率gammaと平行移動betaはParameter、統計量の移動平均avg_mean, avg_varはndarrayで持ち、
+    最初の入力のチャネル数（軸1）に合わせて初期化する'''
+
+    def __init__(self, decay=0.9, eps=2e-5):
+        super().__init__()
+        self.decay = decay
+        self.eps = eps
+        self.gamma = Parameter(None, name='gamma')
+        self.beta = Parameter(None, name='beta')
+        self.avg_mean = None
+        self.avg_var = None
+
+    def _init_params(self, x):
+        C, dtype = x.shape[1], x.dtype
+        self.gamma.data = np.ones(C, dtype=dtype)
+        self.beta.data = np.zeros(C, dtype=dtype)
+        self.avg_mean = np.zeros(C, dtype=np.float64)
+        self.avg_var = np.ones(C, dtype=np.float64)
+
+    def forward(self, x):
+        if self.avg_mean is None:
+            self._init_params(x)
+        return F.batch_norm(x, self.gamma, self.beta, self.avg_mean, self.avg_var, self.decay, self.eps)
+
+class Embedding(Layer):
+    '''埋め込み層
+
+    重みの勾配は参照された行のみを持つSparseRowGradientになる'''
+
+    def __init__(self, in_size, out_size, dtype=np.float32):
+        super().__init__()
+        self.W = Parameter((np.random.randn(in_size, out_size) * 0.01).astype(dtype), name='W')
+
+    def forward(self, x):
+        return F.embedding(x, self.W)
+
+class RNN(Layer):
+    '''RNN層
+
+    入力と隠れ状態の重みを1つの行列にまとめて持ち、1ステップを1回の行列積で計算する'''
+
+    def __init__(self, hidden_size, in_size=None, dtype=np.float32):
+        super().__init__()
+        self.hidden_size = hidden_size
+        self.in_size = in_size
+        self.dtype = dtype
+        self.W = Parameter(None, name='W')
+        self.b = Parameter(np.zeros(hidden_size * self.num_gates, dtype=dtype), name='b')
+        if in_size is not None:
+            self._init_W()
+        self.reset_state()
+
+    # ゲート（行列積の出力をまとめる単位）の数
+    num_gates = 1
+
+    def _init_W(self):
+        I, H = self.in_size + self.hidden_size, self.hidden_size
+        self.W.data = (np.random.randn(I, H * self.num_gates) * np.sqrt(1 / I)).astype(self.dtype)
+
+    def reset_state(self):
+        self.h = None
+
+    def _prepare(self, x):
+        '重みの遅延初期化と隠れ状態の初期値の作成を行う'
+        if self.W.data is None:
+            self.in_size = x.shape[1]
+            self._init_W()
+        if self.h is None:
+            self.h = np.zeros((x.shape[0], self.hidden_size), dtype=self.dtype)
+
+    def forward(self, x):
+        self._prepare(x)
+        self.h = F.rnn_cell(x, self.h, self.W, self.b)
+        return self.h
+
+class LSTM(RNN):
+    'LSTM層。input, forget, outputゲートと候補値の4つを1回の行列積で計算する'
+
+    num_gates = 4
+
+    def reset_state(self):
+        self.h = None
+        self.c = None
+
+    def forward(self, x):
+        self._prepare(x)
+        if self.c is None:
+            self.c = np.zeros((x.shape[0], self.hidden_size), dtype=self.dtype)
+        self.h, self.c = F.lstm_cell(x, self.h, self.c, self.W, self.b)
+        return self.h
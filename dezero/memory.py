@@ -0,0 +1,163 @@
+import gc
+import weakref
+import warnings
+import contextlib
+from collections import namedtuple
+from dezero.core import using_config
+
+# ステップの境界を越えて生き残った計算グラフの情報
+# root: グラフを参照し続けている変数、step: グラフが作られたステップ
+GraphLeak = namedtuple('GraphLeak', ['root', 'step', 'num_functions', 'nbytes'])
+
+def _nbytes(x):
+    'ndarray（またはVariable）が保持しているバイト数を求める'
+    x = getattr(x, 'data', x)
+    if x is None:
+        return 0
+    return x.nbytes
+
+class MemoryTracker:
+    '生存しているVariable/Functionの数と使用メモリを記録するクラス'
+
+    def __init__(self, debug=False):
+        # Trueのときはステップの境界を越えたグラフを警告する
+        self.debug = debug
+        # 生存している変数と関数（弱参照なので計測がメモリを掴むことはない）
+        self.variables = weakref.WeakKeyDictionary()
+        self.functions = weakref.WeakKeyDictionary()
+        # 現在のステップ
+        self.step_count = 0
+        # 記録中の変数が保持しているバイト数（変数の生成・破棄のたびに更新する）
+        self.current_bytes = 0
+        # 逆伝播中の最大バイト数
+        self.peak_backward_bytes = 0
+        self._peak_bytes = 0
+        self._in_backward = 0
+
+    def add_variable(self, v):
+        '変数を記録する。記録済みの変数（記録したグラフのやり直しなど）は現在のステップに付け替える'
+        if v in self.variables:
+            self.variables[v] = self.step_count
+            return
+        nbytes = _nbytes(v.data)
+        self.variables[v] = self.step_count
+        self.current_bytes += nbytes
+        if self.current_bytes > self._peak_bytes:
+            self._peak_bytes = self.current_bytes
+        # 変数が破棄された時にバイト数を差し引く
+        weakref.finalize(v, self._release, nbytes)
+
+    def add_function(self, f):
+        '関数を記録する'
+        self.functions[f] = self.step_count
+
+    def _release(self, nbytes):
+        self.current_bytes -= nbytes
+
+    def begin_backward(self):
+        '逆伝播の開始時に呼ばれる'
+        if self._in_backward == 0:
+            self._peak_bytes = self.current_bytes
+        self._in_backward += 1
+
+    def end_backward(self):
+        '逆伝播の終了時に呼ばれる'
+        self._in_backward -= 1
+        if self._in_backward == 0:
+            self.peak_backward_bytes = max(self.peak_backward_bytes, self._peak_bytes)
+
+    def stats(self):
+        '''現在の使用状況を返却する
+
+        同じndarrayを複数の変数が共有している場合は1回だけ数える'''
+        variables = list(self.variables.keys())
+        grad_ids, grad_bytes = set(), 0
+        for v in variables:
+            g = getattr(v.gradient, 'data', v.gradient)
+            if g is not None and id(g) not in grad_ids:
+                grad_ids.add(id(g))
+                grad_bytes += g.nbytes
+        data_ids, data_bytes = set(grad_ids), 0
+        for v in variables:
+            if v.data is not None and id(v.data) not in data_ids:
+                data_ids.add(id(v.data))
+                data_bytes += v.data.nbytes
+        return {
+            'variables': len(variables),
+            'functions': len(self.functions),
+            'data_bytes': data_bytes,
+            'gradient_bytes': grad_bytes,
+            'peak_backward_bytes': self.peak_backward_bytes,
+        }
+
+    def find_leaks(self):
+        '前のステップ以前に作られて、まだ生き残っている計算グラフを探す'
+        stale = {id(f): s for f, s in self.functions.items() if s < self.step_count}
+        if not stale:
+            return []
+        # 他の関数の入力になっていない変数をグラフの根とみなす
+        consumed = set()
+        for f in list(self.functions.keys()):
+            consumed.update(id(x) for x in getattr(f, 'inputs', ()))
+
+        leaks = []
+        for v in list(self.variables.keys()):
+            if v.creator is None or id(v) in consumed:
+                continue
+            # 根から生みの親を辿り、古いステップの関数を数える
+            funcs, seen = [v.creator], {id(v.creator)}
+            steps, nbytes = [], 0
+            while funcs:
+                f = funcs.pop()
+                if id(f) in stale:
+                    steps.append(stale[id(f)])
+                    nbytes += sum(_nbytes(x) for x in f.inputs)
+                for x in f.inputs:
+                    if x.creator is not None and id(x.creator) not in seen:
+                        seen.add(id(x.creator))
+                        funcs.append(x.creator)
+            if steps:
+                leaks.append(GraphLeak(v, min(steps), len(steps), nbytes))
+        return leaks
+
+    def step(self):
+        '''ステップの境界を記録する
+
+        前のステップ以前の計算グラフが残っている場合はそれを返却する'''
+        if self.debug:
+            # 循環参照で残っているだけのものは先に回収しておく
+            gc.collect()
+        leaks = self.find_leaks()
+        if self.debug:
+            for leak in leaks:
+                root = leak.root.name if leak.root.name is not None else 'variable{}'.format(leak.root.shape)
+                warnings.warn('graph from step {} is still alive at step {}: {} keeps {} functions ({} bytes) alive'.format(
+                    leak.step, self.step_count, root, leak.num_functions, leak.nbytes), ResourceWarning)
+        self.step_count += 1
+        return leaks
+
+# 現在有効な計測器
+_tracker = None
+
+def get_tracker():
+    '現在有効な計測器を返却する。計測中でない時はNone'
+    return _tracker
+
+@contextlib.contextmanager
+def trace(debug=False):
+    '''with文の中で生成された変数と関数を計測する
+
+    with memory.trace(debug=True) as tracker:
+        for x in data:
+            loss = model(x)
+            loss.backward()
+            tracker.step()
+        print(tracker.stats())'''
+    global _tracker
+    old_tracker = _tracker
+    _tracker = MemoryTracker(debug)
+    try:
+        with using_config('trace_memory', True):
+            yield _tracker
+    finally:
+        _tracker = old_tracker
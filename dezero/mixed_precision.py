@@ -0,0 +1,106 @@
+import numpy as np
+from dezero.core import Configuration
+from dezero.core import Variable
+from dezero.core import SparseRowGradient
+from dezero.core import using_config
+
+class Policy:
+    '''計算と保存に使う浮動小数点の型の方針
+
+    compute_dtype: 関数の順伝播・逆伝播を計算する型。浮動小数点の入力はこの型に変換してから計算する
+    storage_dtype: 逆伝播のために計算グラフに保持される出力（活性）と、関数が保持する途中の値の型。
+        Noneのときはcompute_dtypeのまま。スカラ（損失など）はオーバーフローしないようcompute_dtypeのまま保持する
+
+    パラメータ（Parameter）は関数の出力ではないので変換されず、元の型（通常はfloat32）のまま更新される。
+    逆伝播で作られる勾配はグラフに保持されないので、compute_dtypeで計算される'''
+
+    def __init__(self, compute_dtype=np.float32, storage_dtype=None):
+        self.compute_dtype = np.dtype(compute_dtype)
+        self.storage_dtype = None if storage_dtype is None else np.dtype(storage_dtype)
+
+    def __repr__(self):
+        return 'Policy(compute_dtype={}, storage_dtype={})'.format(self.compute_dtype, self.storage_dtype)
+
+    def to_compute(self, x):
+        '浮動小数点の配列を計算用の型に変換する（同じ型の時はコピーしない）'
+        if x.dtype.kind == 'f' and x.dtype != self.compute_dtype:
+            return x.astype(self.compute_dtype)
+        return x
+
+    def to_storage(self, x):
+        '浮動小数点の配列を保存用の型に変換する（スカラはそのまま）'
+        if (self.storage_dtype is not None and x.dtype.kind == 'f' and x.dtype != self.storage_dtype
+                and np.ndim(x) > 0):
+            return np.asarray(x).astype(self.storage_dtype)
+        return x
+
+# float32で計算し、活性はfloat16で保持する
+mixed_float16 = Policy(np.float32, np.float16)
+
+def policy(p):
+    '''with文の中だけ型の方針を有効にする
+
+    with mixed_precision.policy(mixed_precision.mixed_float16):
+        loss = model(x)'''
+    return using_config('dtype_policy', p)
+
+def set_policy(p):
+    '型の方針を全体に設定する。Noneで解除する'
+    Configuration.dtype_policy = p
+
+class LossScaler:
+    '''float16の勾配がアンダーフローしないように損失を拡大して逆伝播する
+
+    勾配にinf/nanが現れた時はパラメータを更新せずに倍率を下げ、
+    growth_interval回続けて更新できた時は倍率を上げる（動的な損失スケーリング）
+
+    scaler = LossScaler()
+    model.cleargradients()
+    scaler.backward(loss)
+    scaler.step(optimizer)'''
+
+    def __init__(self, scale=2.0 ** 15, growth_factor=2.0, backoff_factor=0.5, growth_interval=2000):
+        self.scale = scale
+        self.growth_factor = growth_factor
+        self.backoff_factor = backoff_factor
+        self.growth_interval = growth_interval
+        # 続けて更新できた回数
+        self._good_steps = 0
+
+    def backward(self, loss, **kwargs):
+        '''損失をscale倍した値から逆伝播を行う
+
+        起点の勾配は型の方針がある時は計算用の型で作る（float16では65504を超える倍率がinfになる）'''
+        policy = Configuration.dtype_policy
+        dtype = loss.dtype if policy is None else policy.compute_dtype
+        loss.gradient = Variable(np.full(loss.shape, self.scale, dtype=dtype))
+        loss.backward(**kwargs)
+
+    def step(self, optimizer):
+        '''勾配をscaleで割り戻してパラメータを更新する
+
+        勾配が有限の値でない場合は更新を行わずにFalseを返却する'''
+        params = [p for p in optimizer.target.params() if p.gradient is not None]
+        grads = [p.gradient.values if isinstance(p.gradient, SparseRowGradient) else p.gradient.data
+                 for p in params]
+        if not all(np.isfinite(g).all() for g in grads):
+            self.scale *= self.backoff_factor
+            self._good_steps = 0
+            for p in params:
+                p.cleargradient()
+            return False
+
+        # パラメータの型（float32）で割り戻してから更新する
+        for p, g in zip(params, grads):
+            g = g.astype(p.dtype) / self.scale
+            if isinstance(p.gradient, SparseRowGradient):
+                p.gradient = SparseRowGradient(p.gradient.indices, g, p.gradient.shape)
+            else:
+                p.gradient = Variable(g)
+        optimizer.update()
+
+        self._good_steps += 1
+        if self._good_steps == self.growth_interval:
+            self.scale *= self.growth_factor
+            self._good_steps = 0
+        return True
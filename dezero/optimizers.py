@@ -0,0 +1,234 @@
+from collections import namedtuple
+import numpy as np
+import dezero.functions as F
+from dezero.core import SparseRowGradient
+from dezero.core import Variable
+from dezero.core import no_grad
+
+class Optimizer:
+    'パラメータを更新するクラスの親クラス'
+
+    def __init__(self):
+        # 更新対象（Layer）
+        self.target = None
+        # 更新前にパラメータに対して行う前処理（重み減衰など）
+        self.hooks = []
+
+    def setup(self, target):
+        '更新対象のLayerを設定する'
+        self.target = target
+        return self
+
+    def update(self):
+        '勾配が設定されているパラメータを全て更新する'
+        params = [p for p in self.target.params() if p.gradient is not None]
+
+        for f in self.hooks:
+            f(params)
+
+        for param in params:
+            self.update_one(param)
+
+    def update_one(self, param):
+        '1つのパラメータの更新。子クラスで実装する'
+        raise NotImplementedError()
+
+    def update_in_backward(self):
+        '''逆伝播の中でパラメータを更新するように設定する
+
+        パラメータごとにregister_hookでフックを登録し、勾配が確定した時点でそのパラメータだけを更新して勾配を捨てる。
+        全ての勾配を逆伝播の最後まで保持しないので、逆伝播中の最大使用メモリが減る。
+        この設定の後はbackwardを呼ぶだけで更新され、update()を呼ぶ必要はない（呼んでも何もしない）'''
+        for param in self.target.params():
+            param.register_hook(self._update_hook)
+        return self
+
+    def _update_hook(self, param):
+        if param.gradient is None:
+            return
+        for f in self.hooks:
+            f([param])
+        self.update_one(param)
+        param.cleargradient()
+
+    def add_hook(self, f):
+        self.hooks.append(f)
+
+class SGD(Optimizer):
+    '確率的勾配降下法'
+
+    def __init__(self, lr=0.01):
+        super().__init__()
+        self.lr = lr
+
+    def update_one(self, param):
+        if isinstance(param.gradient, SparseRowGradient):
+            # 勾配のある行だけを更新する
+            g = param.gradient.coalesce()
+            param.data[g.indices] -= self.lr * g.values
+        else:
+            param.data -= self.lr * param.gradient.data
+
+class MomentumSGD(Optimizer):
+    'モーメンタム付きの確率的勾配降下法'
+
+    def __init__(self, lr=0.01, momentum=0.9):
+        super().__init__()
+        self.lr = lr
+        self.momentum = momentum
+        # パラメータごとの速度
+        self.vs = {}
+
+    def update_one(self, param):
+        v_key = id(param)
+        if v_key not in self.vs:
+            self.vs[v_key] = np.zeros_like(param.data)
+
+        v = self.vs[v_key]
+        if isinstance(param.gradient, SparseRowGradient):
+            # 勾配のある行だけ速度を更新する（勾配のない行の速度は減衰させずに残す）
+            g = param.gradient.coalesce()
+            v_rows = v[g.indices] * self.momentum - self.lr * g.values
+            v[g.indices] = v_rows
+            param.data[g.indices] += v_rows
+        else:
+            v *= self.momentum
+            v -= self.lr * param.gradient.data
+            param.data += v
+
+# =============================================================================
+# Second-order methods
+# =============================================================================
+# newton, lbfgsの結果。x: 解、converged: 勾配のノルムがtol未満になったか、iterations: 反復回数
+OptimizeResult = namedtuple('OptimizeResult', ['x', 'converged', 'iterations'])
+
+def hessian_vector_product(f, x):
+    '''f(x)の値と勾配、およびヘッセ行列とベクトルの積を求める関数を返却する
+
+    勾配をcreate_graph=Trueで求めておき、hvp(v)では勾配とvの内積をもう一度逆伝播する（二階微分）。
+    ヘッセ行列そのものは作らないので、1回のhvpは勾配1回分程度の計算で済む
+    return: (値, 勾配のndarray, hvp)'''
+    x = Variable(np.array(x))
+    y = f(x)
+    y.backward(create_graph=True)
+    g = x.gradient
+    x.cleargradient()
+
+    def hvp(v):
+        gv = F.sum(g * Variable(np.asarray(v, dtype=g.dtype)))
+        gv.backward()
+        hv = x.gradient.data
+        x.cleargradient()
+        return hv
+    return float(y.data), g.data.copy(), hvp
+
+def _value(f, x):
+    '逆伝播を記録せずにf(x)の値を求める'
+    with no_grad():
+        return float(f(Variable(x)).data)
+
+def _line_search(f, x, y, g, p, c=1e-4, max_halvings=40):
+    'バックトラッキングで十分な減少（Armijo条件）を満たす歩幅を求める'
+    t, slope = 1.0, float(np.dot(g.ravel(), p.ravel()))
+    for _ in range(max_halvings):
+        if _value(f, x + t * p) <= y + c * t * slope:
+            break
+        t *= 0.5
+    return t
+
+def newton(f, x, max_iter=100, tol=1e-6):
+    '''ニュートン法（ニュートンCG法）で最小化する。小さい問題向け
+
+    ニュートン方向 H p = -g を、ヘッセ行列とベクトルの積だけを使う共役勾配法で解く（最大でxの要素数回）。
+    途中で負の曲率が見つかった場合はそこまでの方向（最初なら最急降下方向）を使う'''
+    x = np.array(x, dtype=np.float64)
+    for i in range(max_iter):
+        y, g, hvp = hessian_vector_product(f, x)
+        if np.linalg.norm(g) < tol:
+            return OptimizeResult(x, True, i)
+        # 共役勾配法でH p = -gを解く
+        p = np.zeros_like(g)
+        r = -g
+        d = r.copy()
+        rr = float(np.dot(r.ravel(), r.ravel()))
+        for _ in range(g.size):
+            hd = hvp(d)
+            dhd = float(np.dot(d.ravel(), hd.ravel()))
+            if dhd <= 0:
+                if not p.any():
+                    p = -g
+                break
+            alpha = rr / dhd
+            p += alpha * d
+            r -= alpha * hd
+            rr, rr_old = float(np.dot(r.ravel(), r.ravel())), rr
+            if np.sqrt(rr) < 1e-10:
+                break
+            d = r + (rr / rr_old) * d
+        x = x + _line_search(f, x, y, g, p) * p
+    y, g, _ = hessian_vector_product(f, x)
+    return OptimizeResult(x, bool(np.linalg.norm(g) < tol), max_iter)
+
+class _History:
+    '''L-BFGSの直近m組の(s, y)を保持するリングバッファ
+
+    配列は最初に確保し、古い組は新しい組で上書きする'''
+
+    def __init__(self, m, n, dtype):
+        self.m = m
+        self.s = np.zeros((m, n), dtype=dtype)
+        self.y = np.zeros((m, n), dtype=dtype)
+        self.rho = np.zeros(m, dtype=dtype)
+        self.alpha = np.zeros(m, dtype=dtype)
+        # 次に書き込む位置と保持している組の数
+        self.head = 0
+        self.size = 0
+
+    def push(self, s, y, sy):
+        k = self.head
+        self.s[k] = s
+        self.y[k] = y
+        self.rho[k] = 1.0 / sy
+        self.head = (k + 1) % self.m
+        self.size = min(self.size + 1, self.m)
+
+    def direction(self, g):
+        '2ループ再帰で -H^{-1} g の近似を求める'
+        q = g.copy()
+        order = [(self.head - 1 - i) % self.m for i in range(self.size)]
+        for k in order:
+            self.alpha[k] = self.rho[k] * np.dot(self.s[k], q)
+            q -= self.alpha[k] * self.y[k]
+        if self.size:
+            k = order[0]
+            q *= 1.0 / (self.rho[k] * np.dot(self.y[k], self.y[k]))
+        for k in reversed(order):
+            beta = self.rho[k] * np.dot(self.y[k], q)
+            q += (self.alpha[k] - beta) * self.s[k]
+        return -q
+
+def lbfgs(f, x, m=10, max_iter=1000, tol=1e-6):
+    '''L-BFGS法で最小化する。大きい問題向け
+
+    曲率の組(s, y)のyは勾配の差ではなく、更新後の点でのヘッセ行列とベクトルの積 y = H s で求める。
+    s^T y が正でない（負の曲率の）組は履歴に加えない。履歴はm組分のリングバッファ（_History）に保持する'''
+    x = np.array(x, dtype=np.float64)
+    shape = x.shape
+    history = _History(m, x.size, x.dtype)
+    y, g, hvp = hessian_vector_product(f, x)
+    for i in range(max_iter):
+        if np.linalg.norm(g) < tol:
+            return OptimizeResult(x, True, i)
+        p = history.direction(g.ravel()).reshape(shape)
+        if np.dot(p.ravel(), g.ravel()) >= 0:
+            # 降下方向でない時は履歴を捨てて最急降下方向にする
+            history.size = 0
+            p = -g
+        s = _line_search(f, x, y, g, p) * p
+        x = x + s
+        y, g, hvp = hessian_vector_product(f, x)
+        hs = hvp(s)
+        sy = float(np.dot(s.ravel(), hs.ravel()))
+        if sy > 1e-12:
+            history.push(s.ravel(), hs.ravel(), sy)
+    return OptimizeResult(x, bool(np.linalg.norm(g) < tol), max_iter)
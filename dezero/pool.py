@@ -0,0 +1,159 @@
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+from dezero.core import Configuration
+from dezero.core import using_config
+
+def _bucket(nbytes):
+    '''確保する大きさ（バイト数）の区分。2の累乗の間を8つに分けた大きさに切り上げる
+
+    同じ区分のバッファは使い回せる。切り上げによる無駄は要求の1/8以下'''
+    step = 1 << max((nbytes - 1).bit_length() - 4, 0)
+    return -(-nbytes // step) * step
+
+class MemoryPool:
+    '''大きさの区分ごとにバッファを使い回す配列のメモリプール
+
+    empty()が返す配列は、プールのバッファ（uint8の配列）のビュー。その配列と、そこから作った全てのビューが
+    破棄された時点（Variableが破棄された時やcleargradientで勾配を捨てた時）でバッファはプールに戻り、
+    次に同じ区分の大きさを要求された時に使い回される。
+    core.pyとfunctions.pyの関数は、プールが有効な時に出力をout=でプールの配列に書き込む（out()を参照）
+
+    max_bytes: プールに置いておく（使われていない）バッファの合計バイト数の上限。超えた分は古い区分から捨てる
+    min_bytes: これより小さい配列はプールを使わずにnp.emptyで確保する
+
+    with pool.using_pool(MemoryPool()):
+        loss = model(x)
+        loss.backward()'''
+
+    def __init__(self, max_bytes=1 << 30, min_bytes=1 << 12):
+        self.max_bytes = max_bytes
+        self.min_bytes = min_bytes
+        # 区分の大きさと、使われていないバッファのリスト。最後に使われた区分ほど後ろにある
+        self._free = OrderedDict()
+        # バッファは配列の破棄（別のスレッドのこともある）に合わせて戻ってくるのでロックで守る
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        # 貸し出し中のバッファの合計バイト数と、そのうち実際に要求されたバイト数
+        self.in_use = 0
+        self.requested = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def empty(self, shape, dtype=np.float64):
+        '初期化されていない配列をプールから取り出す'
+        dtype = np.dtype(dtype)
+        shape = tuple(shape) if isinstance(shape, (list, tuple)) else (shape,)
+        size = int(np.prod(shape))
+        nbytes = size * dtype.itemsize
+        if nbytes < self.min_bytes or dtype.hasobject:
+            return np.empty(shape, dtype=dtype)
+        bucket = _bucket(nbytes)
+        with self._lock:
+            buffers = self._free.get(bucket)
+            if buffers:
+                buffer = buffers.pop()
+                if not buffers:
+                    del self._free[bucket]
+                self.nbytes -= bucket
+                self.hits += 1
+            else:
+                buffer = None
+                self.misses += 1
+            self.in_use += bucket
+            self.requested += nbytes
+        if buffer is None:
+            buffer = np.empty(bucket, dtype=np.uint8)
+        flat = np.frombuffer(memoryview(buffer), dtype=dtype, count=size)
+        # 全てのビューはnumpyが保持するmemoryviewを参照するので、それが破棄された時にバッファを戻す
+        weakref.finalize(flat.base, self._release, buffer, nbytes).atexit = False
+        return flat.reshape(shape)
+
+    def _release(self, buffer, nbytes):
+        bucket = buffer.size
+        with self._lock:
+            self.in_use -= bucket
+            self.requested -= nbytes
+            if bucket > self.max_bytes:
+                self.evictions += 1
+                return
+            self._free.setdefault(bucket, []).append(buffer)
+            self._free.move_to_end(bucket)
+            self.nbytes += bucket
+            # 古い区分から上限に収まるまで捨てる
+            while self.nbytes > self.max_bytes:
+                old, buffers = next(iter(self._free.items()))
+                buffers.pop()
+                if not buffers:
+                    del self._free[old]
+                self.nbytes -= old
+                self.evictions += 1
+
+    def clear(self):
+        '使われていないバッファを全て捨てる（カウンタはそのまま）'
+        with self._lock:
+            self._free.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        '''hit_rate: 要求のうちバッファを使い回せた割合
+        fragmentation: 貸し出し中のバッファのうち、区分への切り上げで使われていないバイト数の割合'''
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'bytes_pooled': self.nbytes,
+            'bytes_in_use': self.in_use,
+            'fragmentation': 1 - self.requested / self.in_use if self.in_use else 0.0,
+            'evictions': self.evictions,
+        }
+
+class _Recorded:
+    '''Graphのやり直しの間、プールの代わりに設定して記録した出力の配列をout()に渡す
+
+    arrayは次の1回のout()だけに形状と型を確かめずに渡す（Graphが入力の形状と型が記録と同じことを確かめる）。
+    それ以外のout()は元のプールに任せる'''
+    __slots__ = ('pool', 'array')
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.array = None
+
+def out(*xs, shape=None, floating=False):
+    '''関数の順伝播で、xsの演算結果を書き込む配列を現在のメモリプールから取り出す
+
+    プールが無効な時、配列モジュールがnumpyでない時、入力にnumpyの配列（np.memmapを除く）とスカラ以外がある時はNone。
+    ufuncはout=Noneを渡すと新しく確保するので、xp.add(x0, x1, out=out(x0, x1))のように使う
+    shape: 出力の形状。省略時はxsをブロードキャストした形状
+    floating: 整数の入力でも浮動小数点数を返す演算（sin, true_divideなど）の時はTrue。
+        その時に浮動小数点数でない配列（numpyのスカラを含む）がある場合はNone。
+        出力の型はufuncごとに決まる（int8のsinはfloat16）ので、numpyに確保させる'''
+    pool = Configuration.memory_pool
+    if type(pool) is _Recorded:
+        array, pool.array = pool.array, None
+        if array is not None:
+            return array
+        pool = pool.pool
+    if pool is None or Configuration.array_module is not np:
+        return None
+    if not all(type(x) is np.ndarray or np.isscalar(x) for x in xs):
+        return None
+    if floating and any(isinstance(x, (np.ndarray, np.generic)) and x.dtype.kind != 'f' for x in xs):
+        return None
+    if shape is None:
+        shape = np.broadcast_shapes(*[np.shape(x) for x in xs])
+    return pool.empty(shape, np.result_type(*xs))
+
+def using_pool(pool):
+    '''with文の中だけメモリプールを有効にする
+
+    with using_pool(MemoryPool()):
+        y = model(x)'''
+    return using_config('memory_pool', pool)
+
+def set_pool(pool):
+    'メモリプールを全体に設定する。Noneで解除する'
+    Configuration.memory_pool = pool
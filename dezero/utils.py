@@ -1,5 +1,9 @@
 import os
+import pickle
+import functools
 import subprocess
+import numpy as np
+from dezero import backend
 
 def _dot_var(v, verbose=False):
     '変数用出力用のテキストを取得する'
@@ -89,30 +93,192 @@ def plot_dot_graph(output, verbose=True, to_file='dot/graph.png'):
     subprocess.run(cmd, shell=True)
 
 
+# =============================================================================
+# Training helpers
+# =============================================================================
+def truncated_bptt(model, optimizer, xs, ts, loss_func, bptt_length):
+    """Train a recurrent model with truncated backpropagation through time.
+
+    The losses of ``bptt_length`` consecutive steps are accumulated and
+    backpropagated at once. After each update the graph is cut with
+    ``unchain_backward``, which also detaches the hidden state held by the
+    model, so memory stays bounded by ``bptt_length`` instead of the
+    sequence length.
+
+    Args:
+        model (dezero.layers.Layer): Recurrent model called once per step.
+        optimizer (dezero.optimizers.Optimizer): Optimizer set up with the
+            model.
+        xs (iterable): Inputs of each time step.
+        ts (iterable): Targets of each time step.
+        loss_func (callable): ``loss_func(y, t)`` returning a Variable.
+        bptt_length (int): Number of steps to backpropagate through.
+
+    Returns:
+        list of float: Average loss of each truncated segment.
+    """
+    losses = []
+    loss, count = 0, 0
+    for x, t in zip(xs, ts):
+        y = model(x)
+        loss = loss + loss_func(y, t)
+        count += 1
+        if count == bptt_length:
+            losses.append(_truncated_update(model, optimizer, loss, count))
+            loss, count = 0, 0
+    if count > 0:
+        losses.append(_truncated_update(model, optimizer, loss, count))
+    return losses
+
+
+def _truncated_update(model, optimizer, loss, count):
+    model.cleargradients()
+    loss.backward()
+    loss.unchain_backward()
+    optimizer.update()
+    return float(loss.data.sum()) / count
+
+
+# =============================================================================
+# Serialization
+# =============================================================================
+def dumps(obj):
+    '''objをpickle protocol 5で変換する
+
+    ndarray（Variableのdataや勾配）の中身はpickleのバイト列にコピーせず、PickleBufferのリストとして別に返却する。
+    バッファは共有メモリなどに置き、loadsに渡せばコピーなしで配列が復元される
+    return: (pickleのバイト列, バッファのリスト)'''
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    return data, buffers
+
+def loads(data, buffers):
+    'dumpsで変換したオブジェクトを復元する。復元された配列はbuffersのメモリをそのまま使う'
+    return pickle.loads(data, buffers=buffers)
+
+# =============================================================================
+# Gradient check
+# =============================================================================
+def numerical_grad(f, x, eps=1e-6):
+    """Compute the gradient of ``sum(f(x))`` by central differences.
+
+    Args:
+        f (callable): Function taking an ndarray and returning an ndarray or
+            a Variable.
+        x (ndarray): Point at which the gradient is evaluated. It is
+            modified during the computation and restored afterwards.
+        eps (float): Step size.
+
+    Returns:
+        ndarray: Gradient with the same shape as ``x``.
+    """
+    def total(y):
+        return np.sum(getattr(y, 'data', y))
+
+    grad = np.zeros_like(x)
+    it = np.nditer(x, flags=['multi_index'])
+    for _ in it:
+        idx = it.multi_index
+        tmp = x[idx].copy()
+        x[idx] = tmp + eps
+        y1 = total(f(x))
+        x[idx] = tmp - eps
+        y2 = total(f(x))
+        x[idx] = tmp
+        grad[idx] = (y1 - y2) / (2 * eps)
+    return grad
+
+
 # =============================================================================
 # Utility functions for numpy (numpy magic)
 # =============================================================================
-def sum_to(x, shape):
+def sum_to(x, shape, axis=None):
     """Sum elements along axes to output an array of a given shape.
 
     Args:
         x (ndarray): Input array.
-        shape:
+        shape (tuple): Output shape.
+        axis (tuple): ``(lead_axis, axis)`` computed by ``sum_to_axis``.
+            Computed here when omitted.
 
     Returns:
         ndarray: Output array of the shape.
     """
-    ndim = len(shape)
-    lead = x.ndim - ndim
-    lead_axis = tuple(range(lead))
-
-    axis = tuple([i + lead for i, sx in enumerate(shape) if sx == 1])
+    if axis is None:
+        axis = sum_to_axis(x.shape, shape)
+    lead_axis, axis = axis
+    if not axis:
+        # 先頭の軸だけを縮約する場合（バイアスの勾配など）はkeepdimsもsqueezeも要らない
+        return x.sum(lead_axis)
     y = x.sum(lead_axis + axis, keepdims=True)
-    if lead > 0:
+    if lead_axis:
         y = y.squeeze(lead_axis)
     return y
 
 
+def sum_to_axis(x_shape, shape):
+    """Axes to reduce so that an array of ``x_shape`` becomes ``shape``.
+
+    ``lead_axis`` are the leading axes that ``shape`` does not have and are
+    dropped, ``axis`` are the axes of size 1 in ``shape`` that are kept with
+    ``keepdims``. Binary ops get the result through ``broadcast_plan``,
+    which keeps it in a small LRU cache.
+
+    Args:
+        x_shape (tuple): Shape of the array to reduce.
+        shape (tuple): Target shape. It must broadcast to ``x_shape``.
+
+    Returns:
+        tuple: ``(lead_axis, axis)``, both tuples of ints.
+    """
+    lead = len(x_shape) - len(shape)
+    lead_axis = tuple(range(lead))
+    axis = tuple([i + lead for i, sx in enumerate(shape)
+                  if sx == 1 and x_shape[i + lead] != 1])
+    return lead_axis, axis
+
+
+@functools.lru_cache(maxsize=128)
+def broadcast_plan(x0_shape, x1_shape):
+    """Reduction axes for the gradients of a broadcasting binary op.
+
+    Args:
+        x0_shape (tuple): Shape of the first operand.
+        x1_shape (tuple): Shape of the second operand.
+
+    Returns:
+        tuple: ``(axis0, axis1)``, the plans to pass to ``sum_to`` to bring
+        the output gradient back to each operand's shape. An entry is
+        ``None`` when the operand already has the output shape.
+    """
+    y_shape = np.broadcast_shapes(x0_shape, x1_shape)
+    axis0 = None if x0_shape == y_shape else sum_to_axis(y_shape, x0_shape)
+    axis1 = None if x1_shape == y_shape else sum_to_axis(y_shape, x1_shape)
+    return axis0, axis1
+
+
+def sum_rows(index, values):
+    """Sum rows of ``values`` that share the same index.
+
+    Rows are sorted by index and each run is reduced with one
+    ``np.add.reduceat`` call, which is much faster than ``np.add.at`` when
+    indices repeat.
+
+    Args:
+        index (ndarray): 1-D integer array of row indices.
+        values (ndarray): Array whose first axis matches ``index``.
+
+    Returns:
+        tuple: ``(unique_index, summed_values)``, sorted by index.
+    """
+    if index.size == 0:
+        return index, values
+    order = np.argsort(index, kind='stable')
+    index = index[order]
+    starts = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+    return index[starts], np.add.reduceat(values[order], starts, axis=0)
+
+
 def reshape_sum_backward(gy, x_shape, axis, keepdims):
     """Reshape gradient appropriately for dezero.functions.sum's backward.
 
@@ -146,9 +312,21 @@ def reshape_sum_backward(gy, x_shape, axis, keepdims):
 
 
 def logsumexp(x, axis=1):
-    xp = cuda.get_array_module(x)
+    """Compute ``log(sum(exp(x), axis))`` without overflow.
+
+    Only one temporary of the size of ``x`` is allocated; ``exp`` and
+    ``log`` are applied in place.
+
+    Args:
+        x (ndarray): Input array.
+        axis (int): Axis to reduce.
+
+    Returns:
+        ndarray: Result with ``keepdims=True``.
+    """
+    xp = backend.get_array_module(x)
     m = x.max(axis=axis, keepdims=True)
-    y = x - m
+    y = xp.subtract(x, m)
     xp.exp(y, out=y)
     s = y.sum(axis=axis, keepdims=True)
     xp.log(s, out=s)
@@ -160,9 +338,83 @@ def max_backward_shape(x, axis):
     if axis is None:
         axis = range(x.ndim)
     elif isinstance(axis, int):
-        axis = (axis,)
+        axis = (axis % x.ndim,)
     else:
-        axis = axis
+        axis = [a % x.ndim for a in axis]
 
     shape = [s if ax not in axis else 1 for ax, s in enumerate(x.shape)]
     return shape
+
+
+# =============================================================================
+# Convolution helpers
+# =============================================================================
+def pair(x):
+    if isinstance(x, int):
+        return (x, x)
+    elif isinstance(x, tuple):
+        assert len(x) == 2
+        return x
+    else:
+        raise ValueError
+
+
+def get_conv_outsize(input_size, kernel_size, stride, pad):
+    return (input_size + pad * 2 - kernel_size) // stride + 1
+
+
+def im2col_array(img, kernel_size, stride, pad, pad_value=0):
+    """Extract convolution windows as a strided view.
+
+    No data is copied apart from the padding: the windows are a
+    ``sliding_window_view`` of the (padded) image subsampled by ``stride``.
+
+    Args:
+        img (ndarray): Input image of shape (N, C, H, W).
+        kernel_size (int or (int, int)): Window size.
+        stride (int or (int, int)): Stride of the windows.
+        pad (int or (int, int)): Spatial padding width.
+        pad_value (float): Value used for padding.
+
+    Returns:
+        ndarray: Read-only view of shape (N, C, OH, OW, KH, KW).
+    """
+    KH, KW = pair(kernel_size)
+    SH, SW = pair(stride)
+    PH, PW = pair(pad)
+    if PH or PW:
+        img = np.pad(img, ((0, 0), (0, 0), (PH, PH), (PW, PW)),
+                     mode='constant', constant_values=(pad_value,))
+    col = np.lib.stride_tricks.sliding_window_view(img, (KH, KW), axis=(2, 3))
+    return col[:, :, ::SH, ::SW]
+
+
+def col2im_array(col, img_shape, kernel_size, stride, pad):
+    """Scatter-add windows back to an image (the adjoint of im2col_array).
+
+    The loop runs over the ``KH * KW`` kernel offsets only. Each iteration
+    adds a whole (N, C, OH, OW) slab through a strided slice of the output.
+
+    Args:
+        col (ndarray): Windows of shape (N, C, OH, OW, KH, KW). Any strides
+            (e.g. a broadcast or transposed view) are accepted.
+        img_shape (tuple): Shape (N, C, H, W) of the image to produce.
+        kernel_size (int or (int, int)): Window size.
+        stride (int or (int, int)): Stride of the windows.
+        pad (int or (int, int)): Spatial padding width.
+
+    Returns:
+        ndarray: Image of shape ``img_shape``.
+    """
+    N, C, H, W = img_shape
+    KH, KW = pair(kernel_size)
+    SH, SW = pair(stride)
+    PH, PW = pair(pad)
+    OH, OW = col.shape[2:4]
+    img = np.zeros((N, C, H + 2 * PH, W + 2 * PW), dtype=col.dtype)
+    for i in range(KH):
+        i_lim = i + SH * OH
+        for j in range(KW):
+            j_lim = j + SW * OW
+            img[:, :, i:i_lim:SH, j:j_lim:SW] += col[:, :, :, :, i, j]
+    return img[:, :, PH:H + PH, PW:W + PW]
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import unittest
+from dezero import *
+from dezero import backend
+from dezero import utils
+from dezero.backend import MemmapBackend
+from dezero.backend import ThreadedBackend
+import numpy as np
+import dezero.functions as F
+
+class ThreadedBackendTest(unittest.TestCase):
+    def setUp(self):
+        # 小さい配列でもブロックに分かれるように閾値とブロックを小さくする
+        self.xp = ThreadedBackend(num_workers=4, block_size=1000, threshold=0)
+
+    def tearDown(self):
+        self.xp.shutdown()
+
+    def test_ufuncs(self):
+        a = np.random.rand(37, 101).astype(np.float32)
+        b = np.random.rand(37, 101).astype(np.float32)
+        xp = self.xp
+        self.assertTrue(np.array_equal(np.add(a, b), xp.add(a, b)))
+        self.assertTrue(np.array_equal(np.multiply(a, b), xp.multiply(a, b)))
+        self.assertTrue(np.array_equal(np.sin(a), xp.sin(a)))
+        self.assertTrue(np.array_equal(np.tanh(a), xp.tanh(a)))
+        y = xp.power(a, 3)
+        self.assertEqual(np.float32, y.dtype)
+        self.assertTrue(np.array_equal(a ** 3, y))
+
+    def test_broadcast(self):
+        a, b = np.random.rand(50, 1, 40), np.random.rand(30, 1)
+        self.assertTrue(np.array_equal(a + b, self.xp.add(a, b)))
+        c = np.random.rand(40, 60).T
+        self.assertTrue(np.array_equal(c * 2.0, self.xp.multiply(c, 2.0)))
+
+    def test_numpy_scalar(self):
+        'numpyのスカラは型を持つ値として、numpyと同じ型の出力になる'
+        a = np.random.rand(37, 101).astype(np.float32)
+        for c in (np.float32(2), np.float64(2), np.int8(2), 2.0):
+            expected = np.power(a, c)
+            y = self.xp.power(a, c)
+            self.assertEqual(expected.dtype, y.dtype)
+            self.assertTrue(np.array_equal(expected, y))
+        x = Variable(a)
+        with backend.using_backend(self.xp):
+            y = x ** np.float32(2)
+        self.assertTrue(np.allclose(a ** 2, y.data))
+
+    def test_out(self):
+        a = np.random.rand(5000)
+        out = np.empty_like(a)
+        y = self.xp.exp(a, out=out)
+        self.assertIs(out, y)
+        self.assertTrue(np.array_equal(np.exp(a), out))
+
+    def test_fallback(self):
+        'ufunc以外の関数や閾値未満の配列はnumpyで計算する'
+        self.assertIs(np.concatenate, self.xp.concatenate)
+        xp = ThreadedBackend(num_workers=4, threshold=100)
+        self.assertTrue(np.array_equal(np.add([1.0], [2.0]), xp.add([1.0], [2.0])))
+
+    def test_using_backend(self):
+        x = Variable(np.random.randn(64, 64))
+        y0 = F.tanh(F.sin(x) * x + x ** 2)
+        y0.backward()
+        g0 = x.gradient.data
+        x.cleargradient()
+        with backend.using_backend(self.xp):
+            self.assertIs(self.xp, backend.get_array_module(x.data))
+            y1 = F.tanh(F.sin(x) * x + x ** 2)
+            y1.backward()
+        self.assertIs(np, backend.get_array_module(x.data))
+        self.assertTrue(np.allclose(y0.data, y1.data))
+        self.assertTrue(np.allclose(g0, x.gradient.data))
+
+class MemmapBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        np.random.seed(0)
+        self.a = np.random.rand(300, 7)
+        self.x = np.memmap(os.path.join(self.dir.name, 'x.dat'), dtype=np.float64, mode='w+', shape=(300, 7))
+        self.x[:] = self.a
+        # 小さい配列でもブロックに分かれるようにブロックを小さくする
+        self.xp = MemmapBackend(dir=self.dir.name, block_size=100)
+
+    def tearDown(self):
+        del self.x
+        self.dir.cleanup()
+
+    def test_auto(self):
+        'np.memmapの入力には自動でMemmapBackendが使われ、出力もnp.memmapになる'
+        self.assertIsInstance(backend.get_array_module(self.x), MemmapBackend)
+        self.assertIs(np, backend.get_array_module(self.a))
+        x = Variable(self.x)
+        y = x * 2.0 - x / 3.0
+        self.assertIsInstance(y.data, np.memmap)
+        self.assertTrue(np.allclose(self.a * 2.0 - self.a / 3.0, y.data))
+
+    def test_reductions(self):
+        xp, x, a = self.xp, self.x, self.a
+        for axis in (None, 0, 1, (0, 1), -1):
+            self.assertTrue(np.allclose(a.sum(axis), xp.sum(x, axis)))
+            self.assertTrue(np.allclose(a.mean(axis, keepdims=True), xp.mean(x, axis, keepdims=True)))
+        self.assertIsInstance(xp.sum(x, axis=1), np.memmap)
+        self.assertTrue(np.allclose(a.sum(0, keepdims=True), utils.sum_to(x, (1, 7))))
+
+    def test_dot(self):
+        xp, x, a = self.xp, self.x, self.a
+        w = np.random.rand(7, 3)
+        g = np.random.rand(300, 3)
+        self.assertIsInstance(xp.dot(x, w), np.memmap)
+        self.assertTrue(np.allclose(a.dot(w), xp.dot(x, w)))
+        self.assertTrue(np.allclose(a.T.dot(g), xp.dot(x.T, g)))
+
+    def test_linear_model_gradient(self):
+        '勾配もnp.memmapに書き込みながら計算できる'
+        t = np.random.rand(300, 1)
+        w0 = np.random.rand(7, 1)
+        def loss(x, w):
+            return F.sum((F.matmul(x, w) - t) ** 2) / len(t)
+        x0, w = Variable(self.a), Variable(w0.copy())
+        loss(x0, w).backward()
+        with backend.using_backend(MemmapBackend(dir=self.dir.name, block_size=100, threshold=1000)):
+            x1, w1 = Variable(self.x), Variable(w0.copy())
+            loss(x1, w1).backward()
+        self.assertIsInstance(x1.gradient.data, np.memmap)
+        self.assertTrue(np.allclose(w.gradient.data, w1.gradient.data))
+        self.assertTrue(np.allclose(x0.gradient.data, x1.gradient.data))
@@ -0,0 +1,61 @@
+import unittest
+from dezero import *
+from dezero import batch
+from dezero.core import rosenbrock
+import dezero.functions as F
+import numpy as np
+
+class VmapTest(unittest.TestCase):
+    def test_value_and_grad(self):
+        '問題ごとに計算した勾配と一致する'
+        x0s = np.array([0.0, -1.5, 2.0])
+        x1s = np.array([2.0, 1.0, -0.5])
+        y, (g0, g1) = batch.vmap(rosenbrock)(x0s, x1s)
+        for i in range(3):
+            x0, x1 = Variable(np.array(x0s[i])), Variable(np.array(x1s[i]))
+            yi = rosenbrock(x0, x1)
+            yi.backward()
+            self.assertAlmostEqual(float(yi.data), y[i])
+            self.assertAlmostEqual(float(x0.gradient.data), g0[i])
+            self.assertAlmostEqual(float(x1.gradient.data), g1[i])
+
+    def test_reduced(self):
+        '問題の軸を縮約する関数はエラーになる'
+        with self.assertRaises(ValueError):
+            batch.vmap(lambda x: F.sum(x))(np.ones(3))
+
+class MinimizeTest(unittest.TestCase):
+    def test_rosenbrock(self):
+        x0s = np.array([0.8, 1.0, 1.2])
+        x1s = np.array([0.6, 1.0, 1.5])
+        r = batch.minimize(rosenbrock, x0s, x1s, lr=1e-3, max_iter=50000, tol=1e-1)
+        self.assertTrue(r.converged.all())
+        _, grads = batch.vmap(rosenbrock)(*r.x)
+        self.assertTrue((np.hypot(*grads) < 1e-1).all())
+        # 最初から最小値にある問題は更新されない
+        self.assertEqual(0, r.iterations[1])
+        self.assertEqual((1.0, 1.0), (r.x[0][1], r.x[1][1]))
+        self.assertTrue(np.array_equal([0.8, 1.0, 1.2], x0s))
+
+    def test_masking(self):
+        '収束した問題はその時点の値で固定される'
+        x0s = np.array([1.0, 0.0])
+        x1s = np.array([1.0 + 1e-9, 2.0])
+        r = batch.minimize(rosenbrock, x0s, x1s, lr=1e-3, max_iter=10, tol=1e-4)
+        self.assertEqual([True, False], list(r.converged))
+        self.assertEqual([0, 10], list(r.iterations))
+        self.assertEqual(1.0 + 1e-9, r.x[1][0])
+
+    def test_compact(self):
+        '作業用の配列を詰め直しても、詰め直さない場合と同じ結果になる'
+        x0s = np.array([1.0, 0.0, 1.0, -1.0, 1.0])
+        x1s = np.array([1.0, 2.0, 1.0, 1.0, 1.0])
+        r = batch.minimize(rosenbrock, x0s, x1s, lr=1e-3, max_iter=300, tol=1e-2)
+        masked = batch.minimize(rosenbrock, x0s, x1s, lr=1e-3, max_iter=300, tol=1e-2, compact=0)
+        self.assertEqual([True, False, True, False, True], list(r.converged))
+        self.assertEqual([0, 300, 0, 300, 0], list(r.iterations))
+        self.assertEqual(list(masked.iterations), list(r.iterations))
+        for x, y in zip(r.x, masked.x):
+            self.assertTrue(np.array_equal(x, y))
+        single = batch.minimize(rosenbrock, x0s[1:2], x1s[1:2], lr=1e-3, max_iter=300, tol=1e-2)
+        self.assertEqual(single.x[0][0], r.x[0][1])
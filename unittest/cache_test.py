@@ -0,0 +1,120 @@
+import unittest
+from dezero import *
+from dezero import cache
+from dezero.cache import InferenceCache
+import dezero.functions as F
+import dezero.layers as L
+import numpy as np
+
+class InferenceCacheTest(unittest.TestCase):
+    def test_function(self):
+        '同じ内容の入力では順伝播を行わずに記憶した結果を返す'
+        c = InferenceCache()
+        with cache.using_cache(c), no_grad():
+            y0 = F.tanh(Variable(np.arange(4.0)))
+            y1 = F.tanh(Variable(np.arange(4.0)))
+            y2 = F.tanh(Variable(np.arange(4.0) + 1))
+        self.assertTrue(np.array_equal(y0.data, y1.data))
+        # 計算した時の出力は書き換えられ、記憶した結果には影響しない。ヒットした時の結果は書き込み禁止
+        y0.data += 1
+        self.assertFalse(y1.data.flags.writeable)
+        self.assertTrue(np.allclose(np.tanh(np.arange(4.0)), y1.data))
+        self.assertTrue(np.allclose(np.tanh(np.arange(4.0) + 1), y2.data))
+        self.assertEqual({'entries': 2, 'bytes': 64, 'hits': 1, 'misses': 2, 'evictions': 0}, c.stats())
+
+    def test_params(self):
+        '関数のパラメータもキーに含める'
+        c = InferenceCache()
+        x = Variable(np.arange(6.0).reshape(2, 3))
+        with cache.using_cache(c), no_grad():
+            y0 = F.sum(x, axis=0)
+            y1 = F.sum(x, axis=1)
+            y2 = x ** 2
+            y3 = x ** 3
+        self.assertEqual((3,), y0.shape)
+        self.assertEqual((2,), y1.shape)
+        self.assertTrue(np.allclose(x.data ** 3, y3.data))
+        self.assertEqual(0, c.hits)
+
+    def test_recording(self):
+        '逆伝播を記録している時と逆伝播の計算中は使われない'
+        c = InferenceCache()
+        with cache.using_cache(c):
+            x = Variable(np.arange(4.0))
+            y = F.sin(x) * F.sin(x)
+            y.backward()
+        self.assertEqual({'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0, 'evictions': 0}, c.stats())
+        self.assertTrue(np.allclose(np.sin(2 * x.data), x.gradient.data))
+
+    def test_stateful(self):
+        '乱数を使う関数と、学習時に状態を更新する関数は記憶しない'
+        c = InferenceCache()
+        x = Variable(np.ones(1000))
+        with cache.using_cache(c), no_grad():
+            y0 = F.dropout(x, 0.5)
+            y1 = F.dropout(x, 0.5)
+        self.assertFalse(np.array_equal(y0.data, y1.data))
+        self.assertEqual(0, len(c))
+
+        layer = L.BatchNorm(decay=0.5)
+        x = np.random.randn(10, 3) + 2
+        with cache.using_cache(c), no_grad():
+            layer(x)
+            mean = layer.avg_mean.copy()
+            layer(x)
+        self.assertFalse(np.allclose(mean, layer.avg_mean))
+        self.assertEqual(0, len(c))
+        with cache.using_cache(c), no_grad(), dezero.test_mode():
+            y0 = layer(x)
+            y1 = layer(x)
+        self.assertEqual(1, c.hits)
+        self.assertTrue(np.array_equal(y0.data, y1.data))
+
+    def test_views(self):
+        '入力とメモリを共有する出力は記憶しない'
+        c = InferenceCache()
+        x = Variable(np.arange(6.0))
+        with cache.using_cache(c), no_grad():
+            y = F.reshape(x, (2, 3))
+        self.assertEqual(0, len(c))
+        self.assertTrue(x.data.flags.writeable)
+
+    def test_bounds(self):
+        '件数とバイト数の上限を超えた時は最も古く使われた結果から破棄する'
+        c = InferenceCache(max_entries=2)
+        with cache.using_cache(c), no_grad():
+            for i in range(3):
+                F.exp(Variable(np.full(10, float(i))))
+            F.exp(Variable(np.full(10, 1.0)))
+            F.exp(Variable(np.full(10, 3.0)))
+            F.exp(Variable(np.full(10, 1.0)))
+        self.assertEqual(2, len(c))
+        self.assertEqual(2, c.evictions)
+        self.assertEqual(2, c.hits)
+
+        c = InferenceCache(max_bytes=200)
+        with cache.using_cache(c), no_grad():
+            for i in range(3):
+                F.exp(Variable(np.full(10, float(i))))
+            F.exp(Variable(np.zeros(100)))
+        self.assertEqual(160, c.nbytes)
+        self.assertEqual(1, c.evictions)
+
+    def test_wrap(self):
+        'モデル全体の結果を記憶する'
+        model = L.Linear(3, in_size=4)
+        calls = []
+        def predict(x):
+            calls.append(x)
+            return F.tanh(model(x))
+        c = InferenceCache()
+        f = c.wrap(predict)
+        x = np.ones((2, 4), dtype=np.float32)
+        with no_grad():
+            y0 = f(x)
+            y1 = f(x.copy())
+        self.assertEqual(1, len(calls))
+        self.assertTrue(np.array_equal(y0.data, y1.data))
+        y2 = f(x)
+        self.assertEqual(2, len(calls))
+        self.assertIsNotNone(y2.creator)
@@ -0,0 +1,440 @@
+import threading
+import unittest
+from dezero import *
+from dezero import utils
+from dezero.utils import numerical_grad
+import numpy as np
+import dezero.functions as F
+
+def naive_conv2d(x, W, b, stride, pad):
+    '画素ごとにループする畳み込み（確認用）'
+    N, C, H, W_ = x.shape
+    OC, _, KH, KW = W.shape
+    x = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)))
+    OH = (H + 2 * pad - KH) // stride + 1
+    OW = (W_ + 2 * pad - KW) // stride + 1
+    y = np.zeros((N, OC, OH, OW))
+    for n in range(N):
+        for oc in range(OC):
+            for i in range(OH):
+                for j in range(OW):
+                    window = x[n, :, i * stride:i * stride + KH, j * stride:j * stride + KW]
+                    y[n, oc, i, j] = np.sum(window * W[oc]) + b[oc]
+    return y
+
+def naive_pooling(x, k, stride, reduce):
+    N, C, H, W = x.shape
+    OH, OW = (H - k) // stride + 1, (W - k) // stride + 1
+    y = np.zeros((N, C, OH, OW))
+    for i in range(OH):
+        for j in range(OW):
+            y[:, :, i, j] = reduce(x[:, :, i * stride:i * stride + k, j * stride:j * stride + k], axis=(2, 3))
+    return y
+
+class ConvTest(unittest.TestCase):
+    def test_conv2d_forward(self):
+        x, W, b = np.random.randn(2, 3, 7, 6), np.random.randn(4, 3, 3, 2), np.random.randn(4)
+        for stride, pad in [(1, 0), (2, 1), (3, 2)]:
+            y = F.conv2d(x, W, b, stride=stride, pad=pad)
+            self.assertTrue(np.allclose(naive_conv2d(x, W, b, stride, pad), y.data))
+
+    def test_conv2d_backward(self):
+        x, W, b = np.random.randn(2, 2, 5, 5), np.random.randn(3, 2, 3, 3), np.random.randn(3)
+        args = [x, W, b]
+        vs = [Variable(a) for a in args]
+        y = F.conv2d(*vs, stride=2, pad=1)
+        y.backward()
+        for i in range(3):
+            def f(a):
+                return F.conv2d(*(args[:i] + [a] + args[i + 1:]), stride=2, pad=1)
+            self.assertTrue(np.allclose(vs[i].gradient.data, numerical_grad(f, args[i].copy()), atol=1e-6))
+
+    def test_conv2d_nobias(self):
+        x, W = Variable(np.random.randn(1, 2, 4, 4)), Variable(np.random.randn(3, 2, 2, 2))
+        y = F.conv2d(x, W)
+        y.backward()
+        self.assertEqual((1, 3, 3, 3), y.shape)
+        self.assertEqual(W.shape, W.gradient.shape)
+
+    def test_pooling_forward(self):
+        x = np.random.randn(2, 3, 8, 7)
+        for stride in [1, 2, 3]:
+            y = F.max_pooling(x, 3, stride)
+            self.assertTrue(np.allclose(naive_pooling(x, 3, stride, np.max), y.data))
+            y = F.average_pooling(x, 3, stride)
+            self.assertTrue(np.allclose(naive_pooling(x, 3, stride, np.mean), y.data))
+
+    def test_pooling_integer(self):
+        '整数の入力もパディングして最大値を取れる'
+        x = -np.arange(2 * 3 * 6 * 5, dtype=np.int32).reshape(2, 3, 6, 5)
+        y = F.max_pooling(x, 3, 2, 1)
+        expected = F.max_pooling(x.astype(np.float64), 3, 2, 1)
+        self.assertEqual(np.int32, y.dtype)
+        self.assertTrue(np.array_equal(expected.data, y.data))
+        self.assertTrue(np.array_equal(F.max_pooling(x.astype(np.uint8), 3, 2, 1).data,
+                                       F.max_pooling(x.astype(np.uint8).astype(np.float64), 3, 2, 1).data))
+
+    def test_pooling_backward(self):
+        x = np.random.randn(2, 2, 6, 6)
+        for func in [F.max_pooling, F.average_pooling]:
+            for stride, pad in [(1, 0), (2, 0), (2, 1)]:
+                v = Variable(x.copy())
+                y = func(v, 3, stride, pad)
+                y.backward()
+                expected = numerical_grad(lambda a: func(a, 3, stride, pad), x.copy())
+                self.assertTrue(np.allclose(expected, v.gradient.data, atol=1e-6))
+
+class ActivationTest(unittest.TestCase):
+    activations = [F.relu, F.sigmoid, F.leaky_relu, F.gelu, F.softplus]
+
+    def test_forward(self):
+        x = np.linspace(-5, 5, 11)
+        expected = [np.maximum(x, 0), 1 / (1 + np.exp(-x)), np.where(x > 0, x, 0.2 * x),
+                    0.5 * x * (1 + np.tanh(np.sqrt(2 / np.pi) * (x + 0.044715 * x ** 3))), np.log1p(np.exp(x))]
+        for func, y in zip(self.activations, expected):
+            self.assertTrue(np.allclose(y, func(Variable(x)).data))
+        # 大きな値でもオーバーフローしない
+        self.assertTrue(np.allclose([0, 1000], F.softplus(np.array([-1000.0, 1000.0])).data))
+
+    def test_backward(self):
+        x = np.random.randn(3, 4)
+        w = np.random.randn(3, 4)
+        for func in self.activations:
+            v = Variable(x)
+            F.sum(func(v) * w).backward()
+            self.assertTrue(np.allclose(numerical_grad(lambda a: func(a).data * w, x.copy()), v.gradient.data))
+
+    def test_sigmoid_double_backprop(self):
+        x = Variable(np.array(0.5))
+        y = F.sigmoid(x)
+        y.backward(create_graph=True)
+        gx = x.gradient
+        x.cleargradient()
+        gx.backward()
+        s = 1 / (1 + np.exp(-0.5))
+        self.assertTrue(np.allclose(s * (1 - s) * (1 - 2 * s), x.gradient.data))
+
+    def test_inplace(self):
+        '推論時だけ入力の配列に上書きし、逆伝播を記録する時と書き込み禁止の配列は上書きしない'
+        for func in self.activations:
+            x = np.random.randn(10)
+            expected = func(x).data
+            y = func(Variable(x), inplace=True)
+            self.assertFalse(np.shares_memory(x, y.data))
+            with no_grad():
+                y = func(Variable(x), inplace=True)
+                self.assertIs(x, y.data)
+                self.assertTrue(np.allclose(expected, x))
+                x = np.random.randn(10)
+                x.flags.writeable = False
+                self.assertFalse(np.shares_memory(x, func(Variable(x), inplace=True).data))
+
+    def test_linear_activation(self):
+        '全結合層と活性化関数を1つのノードで計算し、組み合わせた場合と同じ結果になる'
+        x, W, b = np.random.randn(5, 3), np.random.randn(3, 4), np.random.randn(4)
+        for name in ('relu', 'sigmoid', 'tanh', 'gelu', 'softplus'):
+            for bias in (b, None):
+                vs = [Variable(a) for a in (x, W, bias) if a is not None]
+                y = F.linear(*vs, activation=name) if bias is not None else F.linear(vs[0], vs[1], activation=name)
+                self.assertIsNone(y.creator.inputs[0].creator)
+                y.backward()
+                us = [Variable(a) for a in (x, W, bias) if a is not None]
+                z = getattr(F, name)(F.linear(*us))
+                z.backward()
+                self.assertTrue(np.allclose(z.data, y.data))
+                for v, u in zip(vs, us):
+                    self.assertTrue(np.allclose(u.gradient.data, v.gradient.data))
+        with self.assertRaises(ValueError):
+            F.linear(x, W, activation='swish')
+
+class DropoutTest(unittest.TestCase):
+    def test_train(self):
+        x = Variable(np.random.rand(100, 100) + 1)
+        y = F.dropout(x, 0.3, np.random.default_rng(0))
+        keep = y.data != 0
+        self.assertAlmostEqual(0.7, keep.mean(), places=1)
+        self.assertTrue(np.allclose(x.data[keep] / 0.7, y.data[keep]))
+        w = np.random.rand(100, 100)
+        F.sum(y * w).backward()
+        self.assertTrue(np.allclose(np.where(keep, w / 0.7, 0), x.gradient.data))
+        # マスクは1要素1ビットで保持する
+        self.assertEqual(100 * 100 // 8, y.creator.mask.nbytes)
+
+    def test_rng(self):
+        '同じシードのGeneratorなら同じマスクになる'
+        x = np.ones((7, 9))
+        y0 = F.dropout(x, 0.5, np.random.default_rng(1))
+        F.dropout(np.ones(1000), 0.5)
+        y1 = F.dropout(x, 0.5, np.random.default_rng(1))
+        self.assertTrue(np.array_equal(y0.data, y1.data))
+        self.assertFalse(np.array_equal(y0.data, F.dropout(x, 0.5, np.random.default_rng(2)).data))
+        with self.assertRaises(ValueError):
+            F.dropout(x, 1.0)
+
+    def test_integer(self):
+        '整数の入力は浮動小数点数にしてから落とす'
+        x = np.arange(12).reshape(3, 4)
+        y = F.dropout(x, 0.5, np.random.default_rng(0))
+        self.assertEqual(np.float64, y.dtype)
+        keep = np.unpackbits(y.creator.mask, count=12).reshape(3, 4).astype(bool)
+        self.assertTrue(np.allclose(np.where(keep, x * 2.0, 0), y.data))
+
+    def test_threads(self):
+        '複数のスレッドで同時に作ったマスクも、1つずつ作った場合と同じになる'
+        x = np.ones((256, 256))
+        def masks(rng):
+            return [F.dropout(x, 0.5, rng).creator.mask for _ in range(10)]
+        expected = [masks(np.random.default_rng(i)) for i in range(4)]
+        results = [None] * 4
+        barrier = threading.Barrier(4)
+        def run(i):
+            rng = np.random.default_rng(i)
+            barrier.wait()
+            results[i] = masks(rng)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for e, r in zip(expected, results):
+            self.assertTrue(all(np.array_equal(a, b) for a, b in zip(e, r)))
+
+    def test_test_mode(self):
+        '推論時はノードを作らずに入力のVariableをそのまま返す'
+        x = Variable(np.random.rand(3, 4))
+        with dezero.test_mode():
+            y = F.dropout(x)
+        self.assertIs(x, y)
+        self.assertIsNone(y.creator)
+
+class SoftmaxTest(unittest.TestCase):
+    def test_logsumexp(self):
+        x = np.array([[1000.0, 1000.0], [-1.0, 2.0]])
+        y = utils.logsumexp(x, axis=1)
+        self.assertTrue(np.allclose([[1000 + np.log(2)], [np.log(np.exp(-1) + np.exp(2))]], y))
+
+    def test_softmax(self):
+        x = np.random.randn(3, 4)
+        y = F.softmax(Variable(x))
+        expected = np.exp(x) / np.exp(x).sum(axis=1, keepdims=True)
+        self.assertTrue(np.allclose(expected, y.data))
+        # 大きな値でもオーバーフローしない
+        y = F.softmax(Variable(x + 1000))
+        self.assertTrue(np.allclose(expected, y.data))
+
+    def test_softmax_backward(self):
+        x, w = np.random.randn(3, 4), np.random.randn(3, 4)
+        for func in [F.softmax, F.log_softmax]:
+            v = Variable(x.copy())
+            y = func(v) * w
+            y.backward()
+            expected = numerical_grad(lambda a: func(a).data * w, x.copy())
+            self.assertTrue(np.allclose(expected, v.gradient.data))
+
+    def test_log_softmax(self):
+        x = np.random.randn(3, 4)
+        y = F.log_softmax(Variable(x))
+        self.assertTrue(np.allclose(np.log(F.softmax(x).data), y.data))
+
+    def test_softmax_cross_entropy(self):
+        x, t = np.random.randn(5, 3), np.array([0, 2, 1, 1, 0])
+        v = Variable(x.copy())
+        y = F.softmax_cross_entropy(v, t)
+        p = F.softmax(x).data
+        self.assertTrue(np.allclose(-np.log(p[np.arange(5), t]).mean(), y.data))
+
+        y.backward()
+        expected = numerical_grad(lambda a: F.softmax_cross_entropy(a, t), x.copy())
+        self.assertTrue(np.allclose(expected, v.gradient.data))
+
+    def test_softmax_cross_entropy_dtype(self):
+        x = Variable(np.random.randn(4, 3).astype(np.float32))
+        y = F.softmax_cross_entropy(x, np.array([0, 1, 2, 0]))
+        y.backward()
+        self.assertEqual(np.float32, y.dtype)
+        self.assertEqual(np.float32, x.gradient.dtype)
+
+class LossTest(unittest.TestCase):
+    def check(self, func, expected, x0, x1, grad_x1=True):
+        v0, v1 = Variable(x0), Variable(x1)
+        y = func(v0, v1)
+        y.backward()
+        self.assertEqual((), y.shape)
+        self.assertTrue(np.allclose(expected, y.data))
+        self.assertIsNone(y.creator.inputs[0].creator)
+        self.assertTrue(np.allclose(numerical_grad(lambda a: func(a, x1), x0.copy()), v0.gradient.data))
+        if grad_x1:
+            self.assertTrue(np.allclose(numerical_grad(lambda a: func(x0, a), x1.copy()), v1.gradient.data))
+        else:
+            self.assertIsNone(v1.gradient)
+
+    def test_regression(self):
+        x0, x1 = np.random.randn(6, 2) * 2, np.random.randn(6, 2)
+        d = x0 - x1
+        self.check(F.mean_squared_error, (d ** 2).sum() / 6, x0, x1)
+        self.check(F.mean_absolute_error, np.abs(d).sum() / 6, x0, x1)
+        huber = np.where(np.abs(d) <= 1, 0.5 * d ** 2, np.abs(d) - 0.5)
+        self.check(F.huber_loss, huber.sum() / 6, x0, x1)
+        self.check(lambda a, b: F.huber_loss(a, b, delta=0.5),
+                   np.where(np.abs(d) <= 0.5, 0.5 * d ** 2, 0.5 * (np.abs(d) - 0.25)).sum() / 6, x0, x1)
+
+    def test_binary_cross_entropy(self):
+        x = np.random.randn(8, 1)
+        t = (np.random.rand(8, 1) > 0.5).astype(np.float64)
+        p = 1 / (1 + np.exp(-x))
+        expected = -(t * np.log(p) + (1 - t) * np.log(1 - p)).sum() / 8
+        self.check(F.binary_cross_entropy, expected, p, t, grad_x1=False)
+        self.check(lambda a, b: F.binary_cross_entropy(a, b, from_logits=True), expected, x, t, grad_x1=False)
+        # ロジットが大きくてもオーバーフローしない
+        y = F.binary_cross_entropy(np.array([[1000.0], [-1000.0]]), np.array([[0.0], [0.0]]), from_logits=True)
+        self.assertTrue(np.allclose(500, y.data))
+
+    def test_shape_mismatch(self):
+        '形状の異なる入力はブロードキャストせずにエラーにする'
+        for func in (F.mean_squared_error, F.mean_absolute_error, F.huber_loss, F.binary_cross_entropy):
+            with self.assertRaises(ValueError):
+                func(np.random.rand(4, 1), np.random.rand(4))
+
+    def test_dtype(self):
+        x0, x1 = np.random.randn(4, 3).astype(np.float32), np.random.randn(4, 3).astype(np.float32)
+        for func in (F.mean_squared_error, F.mean_absolute_error, F.huber_loss):
+            v = Variable(x0)
+            y = func(v, x1)
+            y.backward()
+            self.assertEqual(np.float32, y.dtype)
+            self.assertEqual(np.float32, v.gradient.dtype)
+
+class ReductionTest(unittest.TestCase):
+    cases = [(None, False), (None, True), (0, False), (1, True), (-1, False), ((0, 2), False), ((0, 2), True)]
+
+    def check(self, func, np_func, x):
+        for axis, keepdims in self.cases:
+            v = Variable(x.copy())
+            y = func(v, axis=axis, keepdims=keepdims)
+            self.assertTrue(np.allclose(np_func(x, axis=axis, keepdims=keepdims), y.data))
+            w = np.random.randn(*y.shape)
+            (y * w).backward()
+            expected = numerical_grad(lambda a: func(a, axis=axis, keepdims=keepdims).data * w, x.copy())
+            self.assertEqual(x.shape, v.gradient.shape)
+            self.assertTrue(np.allclose(expected, v.gradient.data))
+
+    def test_sum(self):
+        self.check(F.sum, np.sum, np.random.randn(2, 3, 4))
+
+    def test_mean(self):
+        self.check(F.mean, np.mean, np.random.randn(2, 3, 4))
+
+    def test_max(self):
+        self.check(F.max, np.max, np.random.randn(2, 3, 4))
+
+    def test_min(self):
+        self.check(F.min, np.min, np.random.randn(2, 3, 4))
+
+    def test_method(self):
+        x = Variable(np.array([[1.0, 5.0], [3.0, 2.0]]))
+        self.assertEqual(5, x.max().data)
+        self.assertEqual(1, x.min().data)
+        self.assertEqual(2.75, x.mean().data)
+        self.assertTrue(np.array_equal([3.0, 5.0], x.max(axis=0).data))
+
+    def test_sum_double_backprop(self):
+        x = Variable(np.array([1.0, 2.0, 3.0]))
+        y = (x ** 3).sum()
+        y.backward(create_graph=True)
+        gx = x.gradient
+        x.cleargradient()
+        gx.sum().backward()
+        self.assertTrue(np.allclose([6.0, 12.0, 18.0], x.gradient.data))
+
+class BroadcastTest(unittest.TestCase):
+    def test_binary_backward(self):
+        '2項演算の逆伝播でブロードキャストした入力の勾配を縮約する'
+        shapes = [((2, 3), (3,)), ((3,), (2, 3)), ((2, 1, 4), (3, 1)), ((2, 3), ()), ((4, 1), (1, 5))]
+        ops = [lambda a, b: a + b, lambda a, b: a - b, lambda a, b: a * b, lambda a, b: a / b]
+        for s0, s1 in shapes:
+            for op in ops:
+                x0, x1 = np.array(np.random.rand(*s0) + 1), np.array(np.random.rand(*s1) + 1)
+                v0, v1 = Variable(x0.copy()), Variable(x1.copy())
+                y = op(v0, v1)
+                w = np.random.randn(*y.shape)
+                (y * w).backward()
+                self.assertTrue(np.allclose(numerical_grad(lambda a: op(a, x1) * w, x0.copy()), v0.gradient.data))
+                self.assertTrue(np.allclose(numerical_grad(lambda a: op(x0, a) * w, x1.copy()), v1.gradient.data))
+
+    def test_plan_cache(self):
+        '同じ形状の組では計画をキャッシュから取り出す'
+        x, b = Variable(np.random.randn(7, 11)), Variable(np.random.randn(11))
+        y = x + b
+        y.backward()
+        hits = utils.broadcast_plan.cache_info().hits
+        y = x + b
+        y.backward()
+        self.assertEqual(hits + 1, utils.broadcast_plan.cache_info().hits)
+        self.assertEqual((None, ((0,), ())), y.creator.plan)
+
+    def test_sum_to(self):
+        x = np.random.randn(2, 3, 4)
+        self.assertTrue(np.allclose(x.sum(axis=(0, 2)).reshape(3, 1), utils.sum_to(x, (3, 1))))
+        self.assertTrue(np.allclose(x.sum(axis=0), utils.sum_to(x, (3, 4))))
+        self.assertTrue(np.allclose(x.sum(axis=(0, 2), keepdims=True), utils.sum_to(x, (1, 3, 1))))
+        self.assertTrue(np.allclose(x.sum(axis=0), utils.sum_to(x, (3, 4), utils.sum_to_axis((2, 3, 4), (3, 4)))))
+
+class IndexingTest(unittest.TestCase):
+    def test_get_item_view(self):
+        'スライスの順伝播はコピーせずビューを返す'
+        x = Variable(np.random.randn(4, 5))
+        y = x[1:3, ::2]
+        self.assertTrue(np.shares_memory(x.data, y.data))
+        self.assertTrue(np.array_equal(x.data[1:3, ::2], y.data))
+
+    def test_get_item_backward(self):
+        x = np.random.randn(5, 3)
+        for slices in [1, (slice(1, 4), 2), (Ellipsis, 0), np.array([0, 2, 2, 4, 0, 2]),
+                       [3, -2, 3], (np.array([0, 0, 1]), np.array([1, 1, 2])), x > 0]:
+            v = Variable(x.copy())
+            y = v[slices]
+            w = np.random.randn(*y.shape)
+            (y * w).backward()
+            expected = numerical_grad(lambda a: a[slices] * w, x.copy())
+            self.assertTrue(np.allclose(expected, v.gradient.data))
+
+    def test_get_item_double_backprop(self):
+        x = Variable(np.array([1.0, 2.0, 3.0]))
+        y = (x[np.array([0, 0, 2])] ** 3).sum()
+        y.backward(create_graph=True)
+        gx = x.gradient
+        x.cleargradient()
+        gx.sum().backward()
+        self.assertTrue(np.allclose([12.0, 0.0, 18.0], x.gradient.data))
+
+    def test_concat(self):
+        a, b = np.random.randn(2, 3), np.random.randn(2, 4)
+        va, vb = Variable(a), Variable(b)
+        y = F.concat([va, vb], axis=1)
+        self.assertTrue(np.array_equal(np.concatenate([a, b], axis=1), y.data))
+        w = np.random.randn(2, 7)
+        (y * w).backward()
+        self.assertTrue(np.array_equal(w[:, :3], va.gradient.data))
+        self.assertTrue(np.array_equal(w[:, 3:], vb.gradient.data))
+
+    def test_split(self):
+        x = np.random.randn(6, 2)
+        v = Variable(x)
+        y0, y1, y2 = F.split(v, [1, 4])
+        self.assertTrue(np.shares_memory(x, y1.data))
+        self.assertEqual([(1, 2), (3, 2), (2, 2)], [y0.shape, y1.shape, y2.shape])
+        # 使わない出力があっても逆伝播できる
+        z = y0 * 2 + y2.sum()
+        del y1
+        z.backward()
+        expected = np.zeros_like(x)
+        expected[0] = 2
+        expected[4:] = 2
+        self.assertTrue(np.array_equal(expected, v.gradient.data))
+
+    def test_split_sections(self):
+        v = Variable(np.arange(6.0))
+        ys = F.split(v, 3)
+        self.assertEqual(3, len(ys))
+        (ys[0] * 1 + ys[1] * 2 + ys[2] * 3).backward()
+        self.assertTrue(np.array_equal([1, 1, 2, 2, 3, 3], v.gradient.data))
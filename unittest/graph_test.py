@@ -0,0 +1,151 @@
+import math
+import unittest
+from dezero import *
+from dezero import graph
+from dezero import cache
+from dezero import memory
+from dezero import mixed_precision
+from dezero.core import rosenbrock
+import dezero.functions as F
+import numpy as np
+
+def naive_sin(x, n=6):
+    '定数をVariableで作り、x ** kを毎回掛け算でやり直すテイラー展開'
+    y = 0
+    for i in range(n):
+        c = Variable(np.array(-1.0)) ** i / Variable(np.array(float(math.factorial(2 * i + 1))))
+        t = x
+        for _ in range(2 * i):
+            t = t * x
+        y = y + c * t
+    return y
+
+class GraphTest(unittest.TestCase):
+    def test_replay(self):
+        '記録したグラフで別の入力の順伝播と逆伝播ができる'
+        g = graph.trace(rosenbrock, np.array(0.0), np.array(2.0))
+        self.assertEqual(7, len(g))
+        for a, b in [(1.0, 1.0), (-1.0, 0.5)]:
+            y = g(np.array(a), np.array(b))
+            y.backward()
+            x0, x1 = Variable(np.array(a)), Variable(np.array(b))
+            z = rosenbrock(x0, x1)
+            z.backward()
+            self.assertEqual(z.data, y.data)
+            self.assertEqual(x0.gradient.data, g.inputs[0].gradient.data)
+            self.assertEqual(x1.gradient.data, g.inputs[1].gradient.data)
+
+    def test_optimize(self):
+        g = graph.trace(naive_sin, np.array(0.5))
+        stats = g.optimize()
+        self.assertEqual(len(g), stats['nodes_after'])
+        self.assertEqual(stats['nodes_before'] - stats['nodes_after'], stats['folded'] + stats['merged'])
+        # 係数の計算（累乗と割り算）は全て畳み込まれ、x * x ...の重複はまとめられる
+        self.assertEqual(12, stats['folded'])
+        self.assertEqual(2 * 5 + 6 + 6, len(g))
+        for a in (0.3, 1.0, 2.0):
+            y = g(np.array(a))
+            y.backward()
+            x = Variable(np.array(a))
+            z = naive_sin(x)
+            z.backward()
+            self.assertTrue(np.allclose(z.data, y.data))
+            self.assertTrue(np.allclose(x.gradient.data, g.inputs[0].gradient.data))
+
+    def test_constants(self):
+        '内容が同じ定数は同じ入力とみなす。Parameterは定数として扱わない'
+        W = Parameter(np.ones((3, 2)))
+        def f(x):
+            return F.matmul(x * 2.0, W) + F.matmul(x * 2.0, W) + F.sum(W * 3.0)
+        g = graph.trace(f, np.ones((4, 3)))
+        stats = g.optimize()
+        self.assertEqual(2, stats['merged'])
+        self.assertEqual(0, stats['folded'])
+        y = g(np.full((4, 3), 2.0))
+        F.sum(y).backward()
+        self.assertTrue(np.allclose(f(Variable(np.full((4, 3), 2.0))).data, y.data))
+        self.assertTrue(np.allclose(np.full((3, 2), 8 * 2 * 2 + 4 * 2 * 3.0), W.gradient.data))
+
+    def test_static(self):
+        '形状が同じ間は同じノードと出力を使い回し、形状が変わると記録し直す'
+        np.random.seed(0)
+        l1, l2 = L.Linear(5, in_size=3), L.Linear(1, in_size=5)
+        def loss(x, t):
+            return F.sum((l2(F.tanh(l1(x))) - t) ** 2)
+        step = graph.static(loss)
+        x, t = np.random.rand(4, 3), np.random.rand(4, 1)
+        first = step(x, t)
+        nodes = list(step.graphs.values())[0].nodes
+        for _ in range(3):
+            l1.cleargradients()
+            eager = loss(Variable(x), Variable(t))
+            eager.backward()
+            expected = l1.W.gradient.data.copy()
+            l1.cleargradients()
+            y = step(x, t)
+            y.backward()
+            self.assertIs(first, y)
+            self.assertEqual(nodes, list(step.graphs.values())[0].nodes)
+            self.assertTrue(np.allclose(eager.data, y.data))
+            self.assertTrue(np.allclose(expected, l1.W.gradient.data))
+            # パラメータの更新は記録したグラフにそのまま反映される
+            l1.W.data -= 0.1 * l1.W.gradient.data
+        step(np.random.rand(2, 3), np.random.rand(2, 1))
+        self.assertEqual(2, len(step.graphs))
+        with no_grad():
+            self.assertIsNone(step(x, t).creator)
+
+    def test_reuse_arrays(self):
+        '途中の変数の配列は上書きして使い回し、グラフの出力の配列は毎回新しくする'
+        x = np.random.rand(4, 3)
+        g = graph.trace(lambda v: F.sum(F.tanh(v * 2.0 + 1.0)), x)
+        h = g.nodes[-2].outputs[0]()
+        data, y = h.data, g.outputs[0].data
+        for _ in range(2):
+            x = np.random.rand(4, 3)
+            z = g(x)
+            self.assertIs(data, h.data)
+            self.assertIsNot(y, z.data)
+            self.assertTrue(np.allclose(np.tanh(x * 2.0 + 1.0), h.data))
+            self.assertTrue(np.allclose(np.tanh(x * 2.0 + 1.0).sum(), z.data))
+        # 形状が変わった時は上書きしない
+        z = g(np.random.rand(2, 3))
+        self.assertIsNot(data, h.data)
+        self.assertEqual((2, 3), h.shape)
+
+    def test_reuse_view_output(self):
+        'グラフの出力が途中の変数のビューの時は、その配列を上書きしない'
+        W = Variable(np.random.randn(3, 2))
+        step = graph.static(lambda x: F.transpose(F.tanh(F.matmul(x, W))))
+        a, b = np.full((4, 3), 3.0), np.zeros((4, 3))
+        held = step(a).data
+        expected = held.copy()
+        for x in (a, b):
+            y = step(x)
+            self.assertTrue(np.allclose(np.tanh(x.dot(W.data)).T, y.data))
+        self.assertTrue(np.array_equal(expected, held))
+
+    def test_hooks(self):
+        '型の方針とメモリ計測はやり直しにも効き、推論キャッシュはno_gradで使われる'
+        layer = L.Linear(3, in_size=4)
+        x = np.random.randn(2, 4).astype(np.float32)
+        step = graph.static(lambda x: F.sum(F.tanh(layer(x))))
+        with mixed_precision.policy(mixed_precision.mixed_float16):
+            step(x)
+            y = step(x)
+            self.assertEqual(np.float16, y.creator.inputs[0].dtype)
+            y.backward()
+            self.assertEqual(np.float32, layer.W.gradient.dtype)
+
+        with memory.trace() as tracker:
+            for _ in range(3):
+                layer.cleargradients()
+                step(x).backward()
+                self.assertEqual([], tracker.step())
+            self.assertEqual(len(list(step.graphs.values())[0]), tracker.stats()['functions'])
+
+        c = cache.InferenceCache()
+        with cache.using_cache(c), no_grad():
+            step(x)
+            step(x)
+        self.assertGreater(c.hits, 0)
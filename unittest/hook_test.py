@@ -0,0 +1,81 @@
+import unittest
+from dezero import *
+from dezero import memory
+from dezero import optimizers
+import dezero.functions as F
+import dezero.layers as L
+import numpy as np
+
+class GradientHookTest(unittest.TestCase):
+    def test_final_gradient(self):
+        '全ての消費者から勾配を受け取った後に1回だけ呼ばれる'
+        x = Variable(np.array(2.0))
+        seen = []
+        x.register_hook(lambda v: seen.append(v.gradient.data.copy()))
+        a = x * x
+        y = a * x + F.sin(x) + a
+        y.backward()
+        self.assertEqual(1, len(seen))
+        self.assertTrue(np.allclose(x.gradient.data, seen[0]))
+
+    def test_order(self):
+        '逆伝播の途中で、勾配が確定した変数から順に呼ばれる'
+        x = Variable(np.array(1.0))
+        h = x * 2.0
+        order = []
+        x.register_hook(lambda v: order.append('x'))
+        h.register_hook(lambda v: order.append('h'))
+        y = h * h + h
+        y.register_hook(lambda v: order.append('y'))
+        y.backward()
+        self.assertEqual(['y', 'h', 'x'], order)
+
+    def test_remove(self):
+        x = Variable(np.array(1.0))
+        calls = []
+        hook = x.register_hook(lambda v: calls.append(v))
+        x.remove_hook(hook)
+        (x * 3.0).backward()
+        self.assertEqual([], calls)
+
+class UpdateInBackwardTest(unittest.TestCase):
+    def model(self):
+        np.random.seed(0)
+        class Model(L.Layer):
+            def __init__(self):
+                super().__init__()
+                self.l1 = L.Linear(8, in_size=4)
+                self.l2 = L.Linear(1, in_size=8)
+
+            def forward(self, x):
+                return self.l2(F.tanh(self.l1(x)))
+        return Model()
+
+    def test_update(self):
+        '逆伝播の中で更新した結果は、逆伝播の後にまとめて更新した結果と一致する'
+        x = np.random.rand(5, 4).astype(np.float32)
+        m0, m1 = self.model(), self.model()
+        o0 = optimizers.MomentumSGD(lr=0.1).setup(m0)
+        o1 = optimizers.MomentumSGD(lr=0.1).setup(m1).update_in_backward()
+        for _ in range(3):
+            m0.cleargradients()
+            F.sum(m0(x) ** 2).backward()
+            o0.update()
+            F.sum(m1(x) ** 2).backward()
+        for p0, p1 in zip(m0.params(), m1.params()):
+            self.assertTrue(np.allclose(p0.data, p1.data))
+            self.assertIsNone(p1.gradient)
+
+    def test_peak_memory(self):
+        '勾配をその場で捨てるので、逆伝播中の最大使用メモリが減る'
+        x = np.random.rand(2, 4).astype(np.float32)
+        peaks = []
+        for in_backward in (False, True):
+            m = self.model()
+            o = optimizers.SGD().setup(m)
+            if in_backward:
+                o.update_in_backward()
+            with memory.trace() as tracker:
+                F.sum(m(x)).backward()
+                peaks.append(tracker.stats()['peak_backward_bytes'])
+        self.assertLess(peaks[1], peaks[0])
@@ -0,0 +1,125 @@
+import unittest
+from dezero import *
+import numpy as np
+import dezero.functions as F
+
+class ArrayUfuncTest(unittest.TestCase):
+    def test_ndarray_operand(self):
+        'ndarrayが左側にあってもdezeroの関数で計算し、グラフを作る'
+        x = Variable(np.array([1.0, 2.0, 3.0]))
+        a = np.array([2.0, 3.0, 4.0])
+        y = a * x + a - x / a
+        self.assertIsInstance(y, Variable)
+        y.backward()
+        self.assertTrue(np.allclose(a * x.data + a - x.data / a, y.data))
+        self.assertTrue(np.allclose(a - 1 / a, x.gradient.data))
+
+    def test_numpy_scalar(self):
+        x = Variable(np.array([1.0, 2.0], dtype=np.float32))
+        y = np.float64(2.0) * x
+        self.assertIsInstance(y, Variable)
+        self.assertEqual(np.float32, y.dtype)
+
+    def test_ufuncs(self):
+        x = Variable(np.array([0.5, 1.5]))
+        for ufunc, func in [(np.sin, F.Sin), (np.cos, F.Cos), (np.tanh, F.Tanh), (np.exp, F.Exp),
+                            (np.log, F.Log), (np.negative, Function)]:
+            y = ufunc(x)
+            self.assertIsInstance(y.creator, func)
+            self.assertTrue(np.allclose(ufunc(x.data), y.data))
+        y = np.power(x, 3)
+        y.backward()
+        self.assertTrue(np.allclose(3 * x.data ** 2, x.gradient.data))
+
+    def test_no_copy(self):
+        '入力のndarrayはコピーせずにそのまま関数に渡す'
+        a = np.ones(3)
+        x = Variable(np.ones(3))
+        y = a + x
+        self.assertIs(a, y.creator.inputs[0].data)
+
+    def test_fallback(self):
+        '対応していないufuncはグラフを作らずに計算する'
+        x = Variable(np.array([1.0, -2.0]))
+        y = np.abs(x)
+        self.assertIsInstance(y, Variable)
+        self.assertIsNone(y.creator)
+        self.assertTrue(np.array_equal([1.0, 2.0], y.data))
+        self.assertTrue(np.array_equal([True, True], np.isfinite(x).data))
+        out = Variable(np.zeros(2))
+        self.assertIs(out, np.abs(x, out=out))
+        self.assertTrue(np.array_equal([1.0, 2.0], out.data))
+
+class ArrayFunctionTest(unittest.TestCase):
+    def test_reductions(self):
+        x = Variable(np.array([[1.0, 5.0], [3.0, 2.0]]))
+        y = np.sum(x, axis=0)
+        self.assertIsInstance(y.creator, F.Sum)
+        self.assertIsInstance(np.mean(x).creator, F.Mean)
+        self.assertIsInstance(np.max(x, axis=1).creator, F.Max)
+        self.assertIsInstance(np.min(x).creator, F.Min)
+        y.backward()
+        self.assertTrue(np.array_equal(np.ones((2, 2)), x.gradient.data))
+
+    def test_unsupported_arguments(self):
+        'dezeroの関数にない引数や値はnumpyでそのまま計算する'
+        x = Variable(np.array([[-1.0, -5.0], [3.0, -2.0]]))
+        mask = np.array([[True, False], [True, True]])
+        self.assertEqual(3.0, np.max(x, initial=0))
+        y = np.max(x, axis=1, initial=-3.0)
+        self.assertIsNone(y.creator)
+        self.assertTrue(np.array_equal([-1.0, 3.0], y.data))
+        self.assertEqual(0.0, np.sum(x, where=mask))
+        self.assertIsNone(np.broadcast_to(x, (2, 2), True).creator)
+        self.assertEqual(np.float32, np.sum(x, dtype=np.float32).dtype)
+        # 位置引数で指定してもdezeroの関数で扱える値ならグラフを作る
+        y = np.sum(x, 0, None, None, True)
+        self.assertIsInstance(y.creator, F.Sum)
+        self.assertTrue(np.array_equal([[2.0, -7.0]], y.data))
+        self.assertIsInstance(np.sum(x, where=True).creator, F.Sum)
+        self.assertIsInstance(np.concatenate([x, x], casting='same_kind').creator, F.Concat)
+
+    def test_shape_functions(self):
+        x = Variable(np.arange(6.0).reshape(2, 3))
+        self.assertEqual((3, 2), np.reshape(x, (3, 2)).shape)
+        self.assertEqual((3, 2), np.transpose(x).shape)
+        y = np.concatenate([x, x], axis=0)
+        self.assertIsInstance(y.creator, F.Concat)
+        ys = np.split(x, 3, axis=1)
+        self.assertEqual(3, len(ys))
+        self.assertIsInstance(ys[0].creator, F.Split)
+        z = np.dot(x, np.ones((3, 1)))
+        self.assertIsInstance(z.creator, F.MatMul)
+
+    def test_matmul_dims(self):
+        '3次元以上の行列積はnumpyで計算し、1次元の入力は行列に直してグラフを作る'
+        a, b = np.random.randn(2, 3, 4), np.random.randn(2, 4, 5)
+        y = np.matmul(Variable(a), Variable(b))
+        self.assertEqual((2, 3, 5), y.shape)
+        self.assertIsNone(y.creator)
+        self.assertTrue(np.allclose(np.matmul(a, b), y.data))
+        self.assertIsInstance(np.matmul(Variable(a[0]), Variable(b[0])).creator, F.MatMul)
+        x, v = Variable(np.random.randn(3, 4)), Variable(np.random.randn(4))
+        y = np.dot(x, v)
+        self.assertEqual((3,), y.shape)
+        self.assertTrue(np.allclose(x.data.dot(v.data), y.data))
+        y.backward()
+        self.assertTrue(np.allclose(np.tile(v.data, (3, 1)), x.gradient.data))
+        self.assertTrue(np.allclose(x.data.sum(axis=0), v.gradient.data))
+        x.cleargradient()
+        y = np.dot(v, x.T)
+        self.assertEqual((3,), y.shape)
+        y.backward()
+        self.assertTrue(np.allclose(np.tile(v.data, (3, 1)), x.gradient.data))
+        y = np.matmul(v, v)
+        self.assertEqual((), y.shape)
+        self.assertTrue(np.allclose(v.data.dot(v.data), y.data))
+
+    def test_fallback(self):
+        x = Variable(np.array([[1.0, 5.0], [3.0, 2.0]]))
+        self.assertEqual(1, np.argmax(x))
+        self.assertEqual((2, 2), np.shape(x))
+        self.assertTrue(np.allclose(x, x.data))
+        y = np.sort(x, axis=1)
+        self.assertIsInstance(y, Variable)
+        self.assertTrue(np.array_equal([[1.0, 5.0], [2.0, 3.0]], y.data))
@@ -0,0 +1,205 @@
+import unittest
+from dezero import *
+from dezero import memory
+from dezero.utils import truncated_bptt
+from dezero.utils import numerical_grad
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+import dezero.optimizers as optimizers
+
+class RecurrentTest(unittest.TestCase):
+    def test_rnn_cell_gradient(self):
+        x, h = np.random.randn(2, 3), np.random.randn(2, 4)
+        W, b = np.random.randn(7, 4), np.random.randn(4)
+        args = [x, h, W, b]
+        vs = [Variable(a) for a in args]
+        y = F.rnn_cell(*vs)
+        y.backward()
+        for i in range(4):
+            def f(a):
+                return F.rnn_cell(*(args[:i] + [a] + args[i + 1:])).data
+            self.assertTrue(np.allclose(vs[i].gradient.data, numerical_grad(f, args[i].copy())))
+
+    def test_lstm_cell_gradient(self):
+        x, h, c = np.random.randn(2, 3), np.random.randn(2, 4), np.random.randn(2, 4)
+        W, b = np.random.randn(7, 16), np.random.randn(16)
+        args = [x, h, c, W, b]
+        vs = [Variable(a) for a in args]
+        h_new, c_new = F.lstm_cell(*vs)
+        y = h_new * c_new
+        y.backward()
+        for i in range(5):
+            def f(a):
+                h_new, c_new = F.lstm_cell(*(args[:i] + [a] + args[i + 1:]))
+                return h_new.data * c_new.data
+            self.assertTrue(np.allclose(vs[i].gradient.data, numerical_grad(f, args[i].copy())))
+
+    def test_lstm_unused_cell_state(self):
+        'セル状態を使わない場合も逆伝播できる'
+        x = Variable(np.random.randn(2, 3))
+        layer = L.LSTM(4, dtype=np.float64)
+        y = layer(x)
+        y.backward()
+        self.assertEqual((7, 16), layer.W.gradient.shape)
+        self.assertEqual((2, 3), x.gradient.shape)
+
+    def test_params(self):
+        class Model(L.Layer):
+            def __init__(self):
+                super().__init__()
+                self.rnn = L.LSTM(8, in_size=1)
+                self.fc = L.Linear(1, in_size=8)
+
+        model = Model()
+        self.assertEqual([(9, 32), (32,), (8, 1), (1,)], [p.shape for p in model.params()])
+
+    def test_truncated_bptt(self):
+        '長い系列でもグラフのサイズはbptt_lengthで抑えられ、損失が下がる'
+        np.random.seed(0)
+
+        class Model(L.Layer):
+            def __init__(self):
+                super().__init__()
+                self.rnn = L.LSTM(16, dtype=np.float64)
+                self.fc = L.Linear(1, dtype=np.float64)
+
+            def forward(self, x):
+                return self.fc(self.rnn(x))
+
+        seq = np.sin(np.linspace(0, 8 * np.pi, 200)).reshape(-1, 1, 1)
+        xs, ts = seq[:-1], seq[1:]
+        model = Model()
+        optimizer = optimizers.SGD(lr=0.05).setup(model)
+
+        def loss_func(y, t):
+            return (y - t) ** 2
+
+        losses = []
+        with memory.trace() as tracker:
+            for epoch in range(20):
+                model.reset_state()
+                losses.append(np.mean(truncated_bptt(model, optimizer, xs, ts, loss_func, 10)))
+                self.assertLess(tracker.stats()['functions'], 10)
+        self.assertLess(losses[-1], losses[0] / 2)
+
+class EmbeddingTest(unittest.TestCase):
+    def test_sparse_gradient(self):
+        '埋め込みの勾配は参照された行だけを持つ'
+        W = Variable(np.random.randn(1000, 4))
+        ids = np.array([[3, 7], [3, 999]])
+        y = F.embedding(ids, W)
+        self.assertTrue(np.array_equal(W.data[ids], y.data))
+        w = np.random.randn(2, 2, 4)
+        (y * w).backward()
+        self.assertIsInstance(W.gradient, SparseRowGradient)
+        self.assertLess(W.gradient.nbytes, W.data.nbytes / 10)
+
+        expected = np.zeros_like(W.data)
+        np.add.at(expected, ids, w)
+        self.assertTrue(np.allclose(expected, W.gradient.to_dense()))
+        g = W.gradient.coalesce()
+        self.assertTrue(np.array_equal([3, 7, 999], g.indices))
+
+    def test_negative_ids(self):
+        '負のidは末尾から数えた行と同じ行として勾配をまとめる'
+        W = Variable(np.ones((5, 2)))
+        F.embedding(np.array([-1, 4]), W).backward()
+        self.assertTrue(np.array_equal([4], W.gradient.coalesce().indices))
+        self.assertTrue(np.allclose([2, 2], W.gradient.to_dense()[4]))
+        optimizers.SGD(lr=0.5).update_one(W)
+        self.assertTrue(np.allclose([0, 0], W.data[4]))
+
+    def test_accumulate(self):
+        '疎な勾配同士、疎な勾配と密な勾配を足し合わせる'
+        W = Variable(np.random.randn(5, 2))
+        y = F.embedding(np.array([1]), W) + F.embedding(np.array([1, 2]), W).sum(axis=0)
+        y.backward()
+        self.assertIsInstance(W.gradient, SparseRowGradient)
+        self.assertTrue(np.allclose([[0, 0], [2, 2], [1, 1], [0, 0], [0, 0]], W.gradient.to_dense()))
+
+        W.cleargradient()
+        y = F.embedding(np.array([0, 4]), W) * W[1]
+        y.backward()
+        expected = np.zeros((5, 2))
+        expected[[0, 4]] = W.data[1]
+        expected[1] = W.data[[0, 4]].sum(axis=0)
+        self.assertTrue(np.allclose(expected, W.gradient.data))
+
+    def test_non_leaf(self):
+        '途中の変数を経由する場合は密な勾配に戻して逆伝播する'
+        x = Variable(np.random.randn(4, 3))
+        W = x * 2
+        y = F.embedding(np.array([0, 0, 3]), W)
+        y.backward()
+        expected = np.zeros((4, 3))
+        expected[0], expected[3] = 4, 2
+        self.assertTrue(np.allclose(expected, x.gradient.data))
+
+    def test_optimizer(self):
+        '勾配のある行だけを更新する'
+        for optimizer in [optimizers.SGD(lr=0.1), optimizers.MomentumSGD(lr=0.1)]:
+            layer = L.Embedding(100, 3, dtype=np.float64)
+            optimizer.setup(layer)
+            before = layer.W.data.copy()
+            ids = np.array([5, 5, 42])
+            for i in range(2):
+                layer.cleargradients()
+                layer(ids).backward()
+                optimizer.update()
+            changed = np.flatnonzero(np.any(before != layer.W.data, axis=1))
+            self.assertTrue(np.array_equal([5, 42], changed))
+            if type(optimizer) is optimizers.SGD:
+                expected = before.copy()
+                expected[5] -= 0.1 * 2 * 2
+                expected[42] -= 0.1 * 2
+                self.assertTrue(np.allclose(expected, layer.W.data))
+
+class BatchNormTest(unittest.TestCase):
+    def composed(self, x, gamma, beta, eps=2e-5):
+        '基本的な関数の組み合わせで書いたバッチ正規化（確認用）'
+        axes = (0,) + tuple(range(2, x.ndim))
+        shape = (1, -1) + (1,) * (x.ndim - 2)
+        mean = F.mean(x, axis=axes, keepdims=True)
+        xc = x - mean
+        var = F.mean(xc ** 2, axis=axes, keepdims=True)
+        return F.reshape(gamma, shape) * (xc / (var + eps) ** 0.5) + F.reshape(beta, shape)
+
+    def test_gradient(self):
+        for shape in [(8, 3), (4, 3, 2, 5)]:
+            x = np.random.randn(*shape) * 3 + 2
+            gamma, beta = np.random.randn(3), np.random.randn(3)
+            w = np.random.randn(*shape)
+            vs = [Variable(a) for a in (x, gamma, beta)]
+            y = F.batch_norm(*vs, np.zeros(3), np.ones(3))
+            F.sum(y * w).backward()
+            us = [Variable(a) for a in (x, gamma, beta)]
+            z = self.composed(*us)
+            F.sum(z * w).backward()
+            self.assertTrue(np.allclose(z.data, y.data))
+            for v, u in zip(vs, us):
+                self.assertTrue(np.allclose(u.gradient.data, v.gradient.data))
+
+    def test_running_stats(self):
+        '学習時は移動平均をその場で更新し、推論時はそれで正規化する'
+        x = np.random.randn(100, 2) * np.array([1.0, 4.0]) + np.array([3.0, -1.0])
+        layer = L.BatchNorm(decay=0.5)
+        for _ in range(30):
+            layer(x)
+        self.assertTrue(np.allclose(x.mean(axis=0), layer.avg_mean))
+        self.assertTrue(np.allclose(x.var(axis=0, ddof=1), layer.avg_var))
+        mean = layer.avg_mean
+        with dezero.test_mode():
+            y = layer(Variable(x))
+            F.sum(y * x).backward()
+        self.assertIs(mean, layer.avg_mean)
+        self.assertTrue(np.allclose((x - x.mean(axis=0)) / np.sqrt(x.var(axis=0, ddof=1) + 2e-5), y.data))
+        self.assertTrue(np.allclose(x.mean(axis=0), layer.avg_mean))
+        self.assertEqual((2,), layer.gamma.gradient.shape)
+
+    def test_float32(self):
+        '和をfloat64で取るので、平均が大きい入力でもfloat32の分散が桁落ちしない'
+        x = (np.random.randn(1000, 4) + 1000).astype(np.float32)
+        y = F.batch_norm(x, np.ones(4, np.float32), np.zeros(4, np.float32), np.zeros(4), np.ones(4))
+        self.assertEqual(np.float32, y.dtype)
+        self.assertTrue(np.allclose(1.0, y.data.std(axis=0), atol=1e-3))
@@ -0,0 +1,66 @@
+import unittest
+import warnings
+from dezero import *
+from dezero import memory
+import numpy as np
+
+class MemoryTraceTest(unittest.TestCase):
+    def test_stats(self):
+        '生存数とバイト数を計測する'
+        with memory.trace() as tracker:
+            x = Variable(np.ones(100))
+            y = x * x + x
+            stats = tracker.stats()
+            self.assertEqual(3, stats['variables'])
+            self.assertEqual(2, stats['functions'])
+            self.assertEqual(3 * 800, stats['data_bytes'])
+            self.assertEqual(0, stats['gradient_bytes'])
+
+            y.backward()
+            stats = tracker.stats()
+            self.assertEqual(800, stats['gradient_bytes'])
+            self.assertGreaterEqual(stats['peak_backward_bytes'], 3 * 800)
+
+    def test_release(self):
+        '参照がなくなった変数は計測対象から外れる'
+        with memory.trace() as tracker:
+            x = Variable(np.ones(10))
+            y = x ** 2
+            del y
+            self.assertEqual(1, tracker.stats()['variables'])
+            self.assertEqual(0, tracker.stats()['functions'])
+            self.assertEqual(80, tracker.current_bytes)
+
+    def test_no_leak(self):
+        '毎回lossを上書きする場合は警告しない'
+        x = Variable(np.array(2.0))
+        with memory.trace(debug=True) as tracker:
+            for i in range(3):
+                loss = x ** 2
+                loss.backward()
+                x.cleargradient()
+                self.assertEqual([], tracker.step())
+
+    def test_leak(self):
+        'ステップを跨いでlossを保持している場合は根の変数を報告する'
+        x = Variable(np.array(2.0))
+        with memory.trace(debug=True) as tracker:
+            total_loss = 0
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                for i in range(3):
+                    loss = x ** 2
+                    total_loss = total_loss + loss
+                    leaks = tracker.step()
+            self.assertEqual(1, len(leaks))
+            self.assertIs(total_loss, leaks[0].root)
+            self.assertEqual(0, leaks[0].step)
+            self.assertTrue(any('step 0' in str(m.message) for m in w))
+
+    def test_disabled(self):
+        '計測していない時は何も記録しない'
+        self.assertIsNone(memory.get_tracker())
+        x = Variable(np.ones(10))
+        y = x * 2
+        y.backward()
+        self.assertIsNone(memory.get_tracker())
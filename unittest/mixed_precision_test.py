@@ -0,0 +1,122 @@
+import unittest
+from dezero import *
+from dezero import mixed_precision
+from dezero.core import Configuration
+import numpy as np
+import dezero.functions as F
+import dezero.layers as L
+import dezero.optimizers as optimizers
+
+class ScalarDtypeTest(unittest.TestCase):
+    def test_scalar_keeps_dtype(self):
+        'Pythonのスカラとの演算でfloat32がfloat64にならない'
+        x = Variable(np.array([1.0, 2.0], dtype=np.float32))
+        y = (2 * x + 1.5) / 3 - 0.5
+        y = 1 - y
+        self.assertEqual(np.float32, y.dtype)
+        y.backward()
+        self.assertEqual(np.float32, x.gradient.dtype)
+
+    def test_int_variable(self):
+        '整数のVariableとfloatのスカラは従来どおりfloatになる'
+        x = Variable(np.array([1, 2]))
+        y = x * 0.5
+        self.assertTrue(np.array_equal([0.5, 1.0], y.data))
+
+class PolicyTest(unittest.TestCase):
+    def test_compute_dtype(self):
+        x = Variable(np.array([1.0, 2.0]))
+        with mixed_precision.policy(mixed_precision.Policy(np.float32)):
+            y = F.sin(x) * x
+        self.assertEqual(np.float32, y.dtype)
+        self.assertEqual(np.float64, x.dtype)
+
+    def test_storage_dtype(self):
+        '記録される活性はfloat16、パラメータはfloat32のまま'
+        layer = L.Linear(3, in_size=4)
+        x = np.random.randn(2, 4).astype(np.float32)
+        with mixed_precision.policy(mixed_precision.mixed_float16):
+            h = F.tanh(layer(x))
+            y = F.sum(h * h)
+            self.assertEqual(np.float16, h.dtype)
+            y.backward()
+            # 推論時（グラフを作らない時）は計算用の型のまま
+            with no_grad():
+                self.assertEqual(np.float32, F.tanh(layer(x)).dtype)
+        self.assertEqual(np.float32, layer.W.dtype)
+        self.assertEqual(np.float32, layer.W.gradient.dtype)
+
+        with no_grad():
+            h32 = F.tanh(layer(x))
+        self.assertTrue(np.allclose(h32.data, h.data, atol=1e-3))
+        self.assertIsNone(Configuration.dtype_policy)
+
+    def test_saved_state(self):
+        '関数が逆伝播のために保持する途中の値も保存用の型になり、損失のスカラは計算用の型のまま'
+        np.random.seed(0)
+        x = np.random.randn(4, 3).astype(np.float32)
+        h = np.random.randn(4, 2).astype(np.float32)
+        W = np.random.randn(5, 8).astype(np.float32)
+        b = np.zeros(8, dtype=np.float32)
+        gamma, beta = np.ones(3, dtype=np.float32), np.zeros(3, dtype=np.float32)
+
+        def run():
+            v = Variable(x)
+            hn, cn = F.lstm_cell(v, h, h, W, b)
+            y = F.batch_norm(v, gamma, beta, np.zeros(3), np.ones(3))
+            loss = F.mean_squared_error(y, np.zeros((4, 3), dtype=np.float32)) + F.sum(hn * cn)
+            loss.backward()
+            return v.gradient.data, hn.creator, y.creator, loss
+        expected = run()[0]
+        with mixed_precision.policy(mixed_precision.mixed_float16):
+            gx, cell, bn, loss = run()
+        self.assertEqual(np.float16, cell.gates.dtype)
+        self.assertEqual(np.float16, bn.xhat.dtype)
+        self.assertEqual(np.float16, loss.creator.inputs[0].creator.diff.dtype)
+        self.assertEqual(np.float32, loss.dtype)
+        self.assertEqual(np.float32, gx.dtype)
+        self.assertTrue(np.allclose(expected, gx, atol=1e-2))
+
+class LossScalerTest(unittest.TestCase):
+    def test_step(self):
+        layer = L.Linear(1, in_size=2)
+        W = layer.W.data.copy()
+        optimizer = optimizers.SGD(lr=0.1).setup(layer)
+        scaler = mixed_precision.LossScaler(scale=1024.0, growth_interval=2)
+        x = np.array([[1.0, 2.0]], dtype=np.float32)
+
+        layer.cleargradients()
+        scaler.backward(layer(x))
+        self.assertTrue(np.allclose(x.T * 1024, layer.W.gradient.data))
+        self.assertTrue(scaler.step(optimizer))
+        self.assertTrue(np.allclose(W - 0.1 * x.T, layer.W.data))
+
+        layer.cleargradients()
+        scaler.backward(layer(x))
+        scaler.step(optimizer)
+        self.assertEqual(2048.0, scaler.scale)
+
+    def test_overflow(self):
+        'float16でオーバーフローした時は更新せずに倍率を下げる'
+        layer = L.Linear(1, in_size=2, dtype=np.float16)
+        W = layer.W.data.copy()
+        optimizer = optimizers.SGD(lr=0.1).setup(layer)
+        scaler = mixed_precision.LossScaler(scale=2.0 ** 15)
+        layer.cleargradients()
+        scaler.backward(layer(np.array([[1000.0, 1000.0]], dtype=np.float16)))
+        self.assertFalse(scaler.step(optimizer))
+        self.assertEqual(2.0 ** 14, scaler.scale)
+        self.assertTrue(np.array_equal(W, layer.W.data))
+
+    def test_growth_past_float16(self):
+        'float16の最大値（65504）を超える倍率でも起点の勾配がinfにならず、倍率を上げ続けられる'
+        layer = L.Linear(1, in_size=2)
+        optimizer = optimizers.SGD(lr=1e-3).setup(layer)
+        scaler = mixed_precision.LossScaler(scale=2.0 ** 15, growth_interval=1)
+        x = np.array([[0.01, 0.02]], dtype=np.float32)
+        with mixed_precision.policy(mixed_precision.mixed_float16):
+            for _ in range(3):
+                layer.cleargradients()
+                scaler.backward(F.sum(layer(x)))
+                self.assertTrue(scaler.step(optimizer))
+        self.assertEqual(2.0 ** 18, scaler.scale)
@@ -0,0 +1,52 @@
+import unittest
+from dezero import *
+from dezero import optimizers
+from dezero.core import rosenbrock
+import dezero.functions as F
+import numpy as np
+
+def f2(x):
+    return rosenbrock(x[0], x[1])
+
+def extended(x):
+    '2要素ずつ独立なrosenbrockの和'
+    return F.sum(rosenbrock(x[::2], x[1::2]))
+
+class HessianVectorProductTest(unittest.TestCase):
+    def test_rosenbrock(self):
+        x = np.array([-1.2, 1.0])
+        y, g, hvp = optimizers.hessian_vector_product(f2, x)
+        a, b = x
+        H = np.array([[1200 * a ** 2 - 400 * b + 2, -400 * a],
+                      [-400 * a, 200]])
+        self.assertAlmostEqual(24.2, y)
+        self.assertTrue(np.allclose([-215.6, -88.0], g))
+        for v in (np.array([1.0, 0.0]), np.array([0.0, 1.0]), np.array([0.3, -2.0])):
+            self.assertTrue(np.allclose(H @ v, hvp(v)))
+
+class SecondOrderTest(unittest.TestCase):
+    def test_newton(self):
+        r = optimizers.newton(f2, np.array([-1.2, 1.0]))
+        self.assertTrue(r.converged)
+        self.assertLess(r.iterations, 50)
+        self.assertTrue(np.allclose([1.0, 1.0], r.x))
+
+    def test_lbfgs(self):
+        x0 = np.tile([-1.2, 1.0], 50)
+        r = optimizers.lbfgs(extended, x0, m=5)
+        self.assertTrue(r.converged)
+        self.assertLess(r.iterations, 100)
+        self.assertTrue(np.allclose(1.0, r.x))
+        self.assertTrue(np.array_equal(np.tile([-1.2, 1.0], 50), x0))
+
+    def test_history(self):
+        '履歴はm組を超えると古いものから上書きされる'
+        h = optimizers._History(3, 2, np.float64)
+        for i in range(5):
+            h.push(np.array([i, 0.0]), np.array([1.0, 0.0]), float(i + 1))
+        self.assertEqual(3, h.size)
+        self.assertEqual(2, h.head)
+        self.assertEqual([3.0, 4.0, 2.0], list(h.s[:, 0]))
+        # 履歴がない時は最急降下方向
+        h = optimizers._History(3, 2, np.float64)
+        self.assertTrue(np.array_equal([-1.0, -2.0], h.direction(np.array([1.0, 2.0]))))
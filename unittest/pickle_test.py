@@ -0,0 +1,58 @@
+import pickle
+import unittest
+from dezero import *
+from dezero import utils
+import dezero.functions as F
+import numpy as np
+
+class PickleTest(unittest.TestCase):
+    def test_variable(self):
+        x = Variable(np.arange(6.0).reshape(2, 3), name='x')
+        x.gradient = Variable(np.ones((2, 3)))
+        z = pickle.loads(pickle.dumps(x, protocol=5))
+        self.assertEqual('x', z.name)
+        self.assertTrue(np.array_equal(x.data, z.data))
+        self.assertTrue(np.array_equal(x.gradient.data, z.gradient.data))
+        self.assertIsInstance(pickle.loads(pickle.dumps(Parameter(np.ones(2)))), Parameter)
+
+    def test_graph(self):
+        '記録された計算グラフを復元して逆伝播できる'
+        x = Variable(np.array([0.5, 1.0]))
+        y = F.sin(x) * x + x ** 2
+        x2, y2 = pickle.loads(pickle.dumps((x, y)))
+        y2.backward()
+        y.backward()
+        self.assertIsNot(x, x2)
+        self.assertTrue(np.allclose(x.gradient.data, x2.gradient.data))
+        self.assertEqual(y.generation, y2.generation)
+        self.assertIsInstance(y2.creator, type(y.creator))
+
+    def test_deep_graph(self):
+        '深いグラフでも再帰の上限に達しない'
+        x = Variable(np.ones(2))
+        y = x
+        for _ in range(5000):
+            y = y * 1.0
+        y2 = pickle.loads(pickle.dumps(y))
+        y2.backward()
+        self.assertEqual(5000, y2.generation)
+
+    def test_dead_output(self):
+        '破棄済みの出力は勾配Noneとして扱われる'
+        x = Variable(np.arange(4.0))
+        y0, _ = F.split(x, 2)
+        y = pickle.loads(pickle.dumps(y0))
+        y.backward()
+        x2 = y.creator.inputs[0]
+        self.assertTrue(np.array_equal([1.0, 1.0, 0.0, 0.0], x2.gradient.data))
+
+    def test_out_of_band(self):
+        'ndarrayの中身はバッファとして別に渡され、コピーされない'
+        x = Variable(np.random.rand(1000))
+        y = F.tanh(x)
+        data, buffers = utils.dumps(y)
+        self.assertLess(len(data), 1000)
+        self.assertEqual(2, len(buffers))
+        y2 = utils.loads(data, buffers)
+        self.assertTrue(np.shares_memory(y.data, y2.data))
+        self.assertTrue(np.shares_memory(x.data, y2.creator.inputs[0].data))
@@ -0,0 +1,77 @@
+import unittest
+from dezero import *
+from dezero import pool
+import dezero.functions as F
+import numpy as np
+
+class MemoryPoolTest(unittest.TestCase):
+    def test_reuse(self):
+        '配列とそのビューが全て破棄されるとバッファはプールに戻り、同じ区分の要求で使い回される'
+        p = pool.MemoryPool(min_bytes=0)
+        a = p.empty((10, 10), np.float32)
+        view = a.T[1]
+        address = a.__array_interface__['data'][0]
+        del a
+        self.assertEqual(0, p.stats()['bytes_pooled'])
+        del view
+        self.assertEqual(416, p.stats()['bytes_pooled'])
+        # 400バイトは416バイトの区分に切り上げられる。同じ区分の大きさなら型と形状が違っても使い回す
+        b = p.empty(99, np.float32)
+        self.assertEqual(address, b.__array_interface__['data'][0])
+        stats = p.stats()
+        self.assertEqual((1, 1, 0.5), (stats['hits'], stats['misses'], stats['hit_rate']))
+        self.assertEqual(416, stats['bytes_in_use'])
+        self.assertAlmostEqual(1 - 396 / 416, stats['fragmentation'])
+
+    def test_cap(self):
+        p = pool.MemoryPool(max_bytes=1000, min_bytes=0)
+        xs = [p.empty(100, np.float32) for _ in range(3)]
+        del xs
+        self.assertEqual(832, p.stats()['bytes_pooled'])
+        self.assertEqual(1, p.stats()['evictions'])
+        p.clear()
+        self.assertEqual(0, p.stats()['bytes_pooled'])
+        # 小さい配列はプールを使わない
+        p = pool.MemoryPool()
+        p.empty(10)
+        self.assertEqual(0, p.stats()['misses'])
+
+    def test_training(self):
+        'プールを使っても結果は同じで、2回目以降の反復では順伝播と逆伝播の配列を使い回す'
+        np.random.seed(0)
+        x = np.random.rand(64, 32)
+        W = Parameter(np.random.rand(32, 16))
+        def step():
+            W.cleargradient()
+            y = F.sum(F.tanh(F.matmul(Variable(x), W)) ** 2 / 2.0)
+            y.backward()
+            return y.data, W.gradient.data.copy()
+        expected = step()
+        p = pool.MemoryPool(min_bytes=0)
+        with pool.using_pool(p):
+            step()
+            misses = p.misses
+            for _ in range(3):
+                y, gW = step()
+        self.assertTrue(np.allclose(expected[0], y))
+        self.assertTrue(np.allclose(expected[1], gW))
+        self.assertEqual(misses, p.misses)
+        self.assertGreater(p.hits, 0)
+        # 勾配を捨てると全てのバッファがプールに戻る
+        W.cleargradient()
+        self.assertEqual(0, p.stats()['bytes_in_use'])
+
+    def test_out(self):
+        '整数の入力でも浮動小数点数の演算は浮動小数点数で、np.memmapの入力にはプールを使わない'
+        with pool.using_pool(pool.MemoryPool(min_bytes=0)):
+            self.assertEqual(np.float64, F.sin(Variable(np.arange(4))).dtype)
+            self.assertEqual(np.float64, (Variable(np.arange(4)) / 2).dtype)
+            self.assertEqual(np.int64, (Variable(np.arange(4)) * 2).dtype)
+            # 小さい整数の型ではnumpyと同じくfloat16になる
+            x = np.arange(4, dtype=np.int8)
+            self.assertEqual(np.sin(x).dtype, F.sin(Variable(x)).dtype)
+            self.assertEqual(np.true_divide(x, x).dtype, (Variable(x) / Variable(x)).dtype)
+            self.assertEqual(np.float32, F.sin(Variable(np.ones(4, dtype=np.float32))).dtype)
+            self.assertIsNone(pool.out(x, floating=True))
+            self.assertIsNone(pool.out(np.ones(10).view(np.memmap)))
+        self.assertIsNone(pool.out(np.ones(10)))
@@ -1,4 +1,6 @@
+import sys
 import unittest
+import weakref
 from dezero import *
 import numpy as np
 
@@ -114,3 +116,45 @@ class CalclateTest(unittest.TestCase):
     def goldstein(self, x, y):
         return (1 + (x + y + 1) ** 2 * (19 - 14 * x + 3 * x ** 2 - 14 * y + 6 * x * y + 3 * y ** 2)) * \
             (30 + (2 * x - 3 * y) ** 2 * (18 - 32 * x + 12 * x ** 2 + 48 * y -36 * x * y + 27 * y ** 2))
+
+class UnchainTest(unittest.TestCase):
+    def test_unchain(self):
+        x = Variable(np.array(2.0))
+        y = x ** 2
+        z = y * 3
+        z.unchain()
+        self.assertIsNone(z.creator)
+        self.assertIsNotNone(y.creator)
+
+    def test_unchain_backward(self):
+        '切り離した関数は入力を手放し、その場で解放される'
+        x = Variable(np.array(2.0))
+        y = x ** 2
+        z = y * 3
+        f = weakref.ref(y.creator)
+        z.unchain_backward()
+        self.assertIsNone(z.creator)
+        self.assertIsNone(y.creator)
+        self.assertIsNone(f())
+
+    def test_deep_graph(self):
+        '再帰の上限より深いグラフでも切り離せる'
+        x = Variable(np.array(1.0))
+        y = x
+        for i in range(sys.getrecursionlimit() * 5):
+            y = y + x
+        last = weakref.ref(y.creator)
+        y.unchain_backward()
+        self.assertIsNone(last())
+        self.assertIsNone(y.creator)
+        self.assertEqual(sys.getrecursionlimit() * 5 + 1, y.data)
+
+    def test_truncated_backward(self):
+        '切り離した位置で逆伝播が止まる'
+        x = Variable(np.array(3.0))
+        h = x * 2
+        h.unchain_backward()
+        y = h ** 2
+        y.backward(retain_gradient=True)
+        self.assertEqual(12, h.gradient.data)
+        self.assertIsNone(x.gradient)